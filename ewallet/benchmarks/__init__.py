@@ -0,0 +1,8 @@
+"""Benchmark scripts for the money API.
+
+Run from the ``ewallet`` directory, e.g.::
+
+    python -m benchmarks.balance_concurrency --threads 1 2 4 8
+
+Every script works on a throwaway database and prints a JSON report.
+"""
@@ -0,0 +1,117 @@
+"""Latency and throughput of the WSGI and ASGI transaction listings.
+
+Both handlers are driven in-process: WSGI with one thread per client
+through ``django.test.Client``, ASGI with one task per client through
+``django.test.AsyncClient`` against the ``money_async`` endpoints. Each
+client requests a page of a wallet's transactions `requests` times.
+"""
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+
+from benchmarks.utils import (
+    benchmark_database,
+    percentile,
+    report,
+    seed_transactions,
+    setup_django,
+)
+
+
+def summary(handler: str, clients: int, latencies: list,
+            seconds: float) -> dict:
+    return {
+        'handler': handler,
+        'clients': clients,
+        'requests': len(latencies),
+        'requests_per_sec': round(len(latencies) / seconds, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def run_wsgi(url: str, clients: int, requests: int) -> dict:
+    from django.db import connection
+    from django.test import Client
+
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        client = Client()
+        timings = []
+        try:
+            for _ in range(requests):
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.status_code
+        finally:
+            connection.close()
+        with lock:
+            latencies.extend(timings)
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summary('wsgi', clients, latencies,
+                   time.perf_counter() - started)
+
+
+def run_asgi(url: str, clients: int, requests: int) -> dict:
+    from django.test import AsyncClient
+
+    latencies = []
+
+    async def worker(client):
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = await client.get(url)
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.status_code
+
+    async def main():
+        client = AsyncClient()
+        await asyncio.gather(*(worker(client) for _ in range(clients)))
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    return summary('asgi', clients, latencies,
+                   time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, nargs='+',
+                        default=[100, 250, 500, 1000])
+    parser.add_argument('--requests', type=int, default=10,
+                        help='requests per client')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--wallets', type=int, default=100)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.urls import reverse
+
+    from money.models import Wallet
+
+    with benchmark_database():
+        wallet_ids = seed_transactions(args.wallets, args.rows)
+        slug = Wallet.objects.get(pk=wallet_ids[0]).slug
+        wsgi_url = reverse('money:get-transactions-by-wallet', args=[slug])
+        asgi_url = reverse('money_async:transactions-by-wallet',
+                           args=[slug])
+        results = []
+        for clients in args.clients:
+            results.append(run_wsgi(wsgi_url, clients, args.requests))
+            results.append(run_asgi(asgi_url, clients, args.requests))
+        report(results)
+
+
+if __name__ == '__main__':
+    main()
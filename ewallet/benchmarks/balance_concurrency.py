@@ -0,0 +1,95 @@
+"""Concurrent ``POST /api/money/transactions`` stress benchmark.
+
+Threads post income and outcome transactions against one wallet and the
+final ``Wallet.balance`` is compared with the accepted requests, so any
+lost update shows up as a non-zero ``lost_updates``.
+"""
+import argparse
+import threading
+import time
+
+from benchmarks.utils import benchmark_database, report, setup_django
+
+
+def run(threads: int, operations: int, initial_balance: int) -> dict:
+    from django.db import connection, utils
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+
+    from money.models import Transaction, Wallet
+
+    Transaction.objects.all().delete()
+    Wallet.objects.all().delete()
+    wallet = Wallet.objects.create(name='Benchmark')
+    Wallet.objects.credit(wallet.pk, initial_balance)
+    url = reverse('money:create-transaction')
+    accepted = {Transaction.TYPE_INCOME: 0, Transaction.TYPE_OUTCOME: 0}
+    counters = {'rejected': 0, 'retries': 0}
+    lock = threading.Lock()
+
+    def worker(index: int):
+        client = APIClient()
+        transaction_type = (Transaction.TYPE_INCOME if index % 2 == 0
+                            else Transaction.TYPE_OUTCOME)
+        data = {'wallet': wallet.name, 'transaction_type': transaction_type,
+                'amount': 1}
+        try:
+            for _ in range(operations):
+                while True:
+                    try:
+                        response = client.post(url, data=data, format='json')
+                        break
+                    except utils.OperationalError:
+                        with lock:
+                            counters['retries'] += 1
+                        time.sleep(0.001)
+                with lock:
+                    if response.status_code == 201:
+                        accepted[transaction_type] += 1
+                    else:
+                        counters['rejected'] += 1
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=worker, args=(i,))
+               for i in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    wallet.refresh_from_db()
+    expected = (initial_balance + accepted[Transaction.TYPE_INCOME]
+                - accepted[Transaction.TYPE_OUTCOME])
+    requests = threads * operations
+    return {
+        'threads': threads,
+        'requests': requests,
+        'accepted': sum(accepted.values()),
+        'rejected': counters['rejected'],
+        'retries': counters['retries'],
+        'seconds': round(elapsed, 3),
+        'transactions_per_sec': round(requests / elapsed, 1),
+        'balance': wallet.balance,
+        'lost_updates': abs(wallet.balance - expected),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--operations', type=int, default=200,
+                        help='requests per thread')
+    parser.add_argument('--initial-balance', type=int, default=100)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        report([run(threads, args.operations, args.initial_balance)
+                for threads in args.threads])
+
+
+if __name__ == '__main__':
+    main()
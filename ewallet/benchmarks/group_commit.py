@@ -0,0 +1,126 @@
+"""Throughput and latency of ``POST /api/money/transactions`` with and
+without group commit.
+
+Concurrent clients post income transactions to wallets of their own.
+The first run commits every request on its own, the next ones go through
+the group commit queue with each `--batches` setting of the maximum
+batch size and the linger time in seconds (``SIZE:LINGER``).
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from benchmarks.utils import (
+    benchmark_database,
+    percentile,
+    report,
+    setup_django,
+)
+
+
+def batch_setting(value: str) -> tuple:
+    size, linger = value.split(':')
+    return int(size), float(linger)
+
+
+def run(clients: int, requests: int, batch: tuple = None) -> dict:
+    from django.db import connection, utils
+    from django.test import Client
+    from django.test.utils import override_settings
+    from django.urls import reverse
+
+    from money import intake
+    from money.models import Transaction, Wallet
+
+    Wallet.objects.bulk_create(
+        [Wallet(name='Client {}'.format(i), slug='client-{}'.format(i))
+         for i in range(clients)]
+    )
+    names = list(Wallet.objects.values_list('name', flat=True))
+    url = reverse('money:create-transaction')
+    latencies = []
+    counters = {'rejected': 0, 'retries': 0}
+    lock = threading.Lock()
+
+    def worker(name: str):
+        client = Client()
+        data = {'wallet': name, 'amount': 1,
+                'transaction_type': Transaction.TYPE_INCOME}
+        timings = []
+        local = {'rejected': 0, 'retries': 0}
+        try:
+            for _ in range(requests):
+                started = time.perf_counter()
+                while True:
+                    try:
+                        response = client.post(
+                            url, data=data, content_type='application/json'
+                        )
+                        break
+                    except utils.OperationalError:
+                        local['retries'] += 1
+                        time.sleep(0.001)
+                timings.append(time.perf_counter() - started)
+                if response.status_code != 201:
+                    local['rejected'] += 1
+        finally:
+            connection.close()
+        with lock:
+            latencies.extend(timings)
+            for key, value in local.items():
+                counters[key] += value
+
+    group_commit = {'MONEY_GROUP_COMMIT': batch is not None}
+    if batch is not None:
+        group_commit.update(MONEY_GROUP_COMMIT_MAX_BATCH=batch[0],
+                            MONEY_GROUP_COMMIT_LINGER=batch[1])
+    with override_settings(**group_commit):
+        threads = [threading.Thread(target=worker, args=(name,))
+                   for name in names]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        intake.reset()
+
+    committed = Transaction.objects.count()
+    return dict(
+        mode='group_commit' if batch else 'per_request',
+        max_batch=batch[0] if batch else 1,
+        linger_ms=batch[1] * 1000 if batch else 0,
+        clients=clients,
+        requests=len(latencies),
+        committed=committed,
+        **counters,
+        seconds=round(elapsed, 3),
+        requests_per_sec=round(len(latencies) / elapsed, 1),
+        p50_ms=round(statistics.median(latencies) * 1000, 3),
+        p99_ms=round(percentile(latencies, 0.99) * 1000, 3),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=50,
+                        help='requests per client')
+    parser.add_argument('--batches', type=batch_setting, nargs='+',
+                        default=[(10, 0.001), (50, 0.002), (200, 0.005)])
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+
+    results = []
+    for batch in [None] + args.batches:
+        connection.close()
+        with benchmark_database():
+            results.append(run(args.clients, args.requests, batch))
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
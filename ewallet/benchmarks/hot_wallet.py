@@ -0,0 +1,104 @@
+"""Concurrent credits of a single hot wallet with and without shards.
+
+Threads provide `income` transactions of one wallet, each in its own
+database transaction like ``POST /api/money/transactions``, once per
+entry of `shards` (0 is the plain single balance row). Database errors
+(lock timeouts) are retried and counted. At the end the wallet balance,
+with its shards, must match its ledger, otherwise ``lost_money`` is
+non-zero.
+
+SQLite takes one write lock for the whole database, so shards can only
+cut row lock waits on a server database (see ``DB_*`` variables).
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from benchmarks.utils import (
+    benchmark_database,
+    percentile,
+    report,
+    setup_django,
+)
+
+
+def run(shards: int, threads: int, operations: int) -> dict:
+    from django.db import connection, transaction, utils
+
+    from money.models import Transaction, Wallet
+
+    Transaction.objects.all().delete()
+    Wallet.objects.all().delete()
+    hot = Wallet.objects.create(name='Merchant')
+    Wallet.objects.shard(hot.pk, shards)
+    hot.refresh_from_db()
+    latencies = []
+    counters = {'retries': 0}
+    lock = threading.Lock()
+
+    def worker():
+        timings = []
+        retries = 0
+        wallet = Wallet.objects.get(pk=hot.pk)
+        try:
+            for _ in range(operations):
+                started = time.perf_counter()
+                while True:
+                    try:
+                        with transaction.atomic():
+                            income, _ = Transaction(
+                                wallet=wallet, amount=1,
+                                transaction_type=Transaction.TYPE_INCOME
+                            ).provide_transaction()
+                            income.save()
+                        break
+                    except utils.OperationalError:
+                        retries += 1
+                        time.sleep(0.001)
+                timings.append(time.perf_counter() - started)
+        finally:
+            connection.close()
+        with lock:
+            latencies.extend(timings)
+            counters['retries'] += retries
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    hot.refresh_from_db()
+    ledger = Transaction.objects.filter(wallet=hot).balance_change()
+    return dict(
+        shards=shards,
+        threads=threads,
+        credits=len(latencies),
+        **counters,
+        seconds=round(elapsed, 3),
+        credits_per_sec=round(len(latencies) / elapsed, 1),
+        p50_ms=round(statistics.median(latencies) * 1000, 3),
+        p99_ms=round(percentile(latencies, 0.99) * 1000, 3),
+        lost_money=abs(hot.total_balance() - ledger),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--shards', type=int, nargs='+', default=[0, 4, 16])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--operations', type=int, default=200,
+                        help='credits per thread')
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        report([run(shards, args.threads, args.operations)
+                for shards in args.shards])
+
+
+if __name__ == '__main__':
+    main()
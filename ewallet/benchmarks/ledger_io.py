@@ -0,0 +1,86 @@
+"""Rows/sec and peak memory of ``export_ledger`` and ``import_ledger``.
+
+For every size the ledger is exported to a file of each format, wiped and
+imported back. Peak traced memory should not grow with the row count.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.utils import (
+    benchmark_database,
+    report,
+    seed_transactions,
+    setup_django,
+)
+
+
+def measure(function) -> (float, float):
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return time.perf_counter() - started, peak
+
+
+def run(rows: int, directory: str) -> list:
+    from money.ledger import export_ledger, import_ledger, open_file
+    from money.models import Transaction, Wallet, WalletDailyRollup
+
+    results = []
+    for name in ('ledger.csv', 'ledger.ndjson', 'ledger.ndjson.gz'):
+        path = os.path.join(directory, name)
+        format = 'csv' if '.csv' in name else 'ndjson'
+
+        def export():
+            with open_file(path, 'w') as file:
+                export_ledger(file, format)
+
+        def import_():
+            with open_file(path, 'r') as file:
+                import_ledger(file, format)
+
+        export_seconds, export_peak = measure(export)
+        WalletDailyRollup.objects.all().delete()
+        Transaction.objects.all().delete()
+        import_seconds, import_peak = measure(import_)
+        assert Transaction.objects.count() == rows
+        results.append({
+            'rows': rows,
+            'file': name,
+            'file_mb': round(os.path.getsize(path) / 2 ** 20, 2),
+            'export_rows_per_sec': round(rows / export_seconds),
+            'export_peak_memory_kb': round(export_peak / 1024),
+            'import_rows_per_sec': round(rows / import_seconds),
+            'import_peak_memory_kb': round(import_peak / 1024),
+            'wallets': Wallet.objects.count(),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+',
+                        default=[10000, 100000])
+    parser.add_argument('--wallets', type=int, default=100)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+
+    results = []
+    for rows in args.rows:
+        connection.close()
+        with benchmark_database(), tempfile.TemporaryDirectory() as path:
+            seed_transactions(args.wallets, rows)
+            results += run(rows, path)
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Throughput and memory of ``reconcile_balances`` over a large ledger.
+
+Seeds the ``Transaction`` table, sets wallet balances to their ledger
+sums and then times a full verification run.
+"""
+import argparse
+import resource
+
+from benchmarks.utils import (
+    benchmark_database,
+    report,
+    seed_transactions,
+    setup_django,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10000000)
+    parser.add_argument('--wallets', type=int, default=10000)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    from money.models import Transaction, Wallet
+    from money.reconciliation import ledger_balances, reconcile_balances
+
+    with benchmark_database():
+        wallet_ids = seed_transactions(args.wallets, args.rows)
+        for wallet_id, (total, _) in ledger_balances(wallet_ids).items():
+            Wallet.objects.filter(pk=wallet_id).update(balance=total)
+        # One drifted wallet to be found.
+        Wallet.objects.filter(pk=wallet_ids[0]).update(balance=0)
+
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        result = reconcile_balances(chunk_size=args.chunk_size)
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        result.update({
+            'rows': Transaction.objects.count(),
+            'chunk_size': args.chunk_size,
+            'peak_rss_kb': rss_after,
+            'peak_rss_growth_kb': rss_after - rss_before,
+        })
+        report(result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Rows/sec of the model serializers vs the ``values_list()`` fast path.
+
+Both paths fetch and render the whole listing to JSON bytes, and the
+outputs are checked to be identical.
+"""
+import argparse
+import time
+
+from benchmarks.utils import (
+    benchmark_database,
+    report,
+    seed_transactions,
+    setup_django,
+)
+
+
+def timed(render) -> (bytes, float):
+    started = time.perf_counter()
+    content = render()
+    return content, time.perf_counter() - started
+
+
+def run(rows: int, repeat: int) -> list:
+    from rest_framework.renderers import JSONRenderer
+
+    from money.api.serializers import (
+        TransactionGetSerializer,
+        TransactionListSerializer,
+        WalletGetSerializer,
+        WalletListSerializer,
+    )
+    from money.models import Transaction, Wallet
+
+    renderer = JSONRenderer()
+    listings = [
+        ('transactions', Transaction.objects.all()[:rows],
+         TransactionGetSerializer, TransactionListSerializer),
+        ('wallets', Wallet.objects.all()[:rows],
+         WalletGetSerializer, WalletListSerializer),
+    ]
+    results = []
+    for name, queryset, model_serializer, fast_serializer in listings:
+        count = queryset.count()
+        model_best = fast_best = float('inf')
+        for _ in range(repeat):
+            expected, seconds = timed(lambda: renderer.render(
+                model_serializer(queryset.all(), many=True).data
+            ))
+            model_best = min(model_best, seconds)
+            content, seconds = timed(lambda: renderer.render(
+                fast_serializer(queryset.all()).data
+            ))
+            fast_best = min(fast_best, seconds)
+            assert content == expected, 'Outputs differ.'
+        results.append({
+            'listing': name,
+            'rows': count,
+            'model_serializer_rows_per_sec': round(count / model_best),
+            'values_list_rows_per_sec': round(count / fast_best),
+            'speedup': round(model_best / fast_best, 2),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+',
+                        default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        seed_transactions(max(args.rows), max(args.rows))
+        results = []
+        for rows in args.rows:
+            results += run(rows, args.repeat)
+        report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Write throughput of concurrent writers on stock vs tuned SQLite.
+
+Each profile gets a fresh file database with its ``MONEY_SQLITE_PRAGMAS``.
+Threads provide income transactions to wallets of their own, so only the
+database lock is contended. Writes failing with "database is locked" are
+retried and counted as ``lock_errors``.
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from benchmarks.utils import (
+    benchmark_database,
+    percentile,
+    report,
+    setup_django,
+)
+
+
+def run(profile: str, threads: int, operations: int) -> dict:
+    from django.db import connection, transaction, utils
+
+    from money.models import Transaction, Wallet
+
+    Wallet.objects.bulk_create(
+        [Wallet(name='Writer {}'.format(i), slug='writer-{}'.format(i))
+         for i in range(threads)]
+    )
+    wallets = list(Wallet.objects.all())
+    latencies = []
+    counters = {'lock_errors': 0}
+    lock = threading.Lock()
+
+    def worker(wallet):
+        timings = []
+        errors = 0
+        try:
+            for _ in range(operations):
+                started = time.perf_counter()
+                while True:
+                    try:
+                        with transaction.atomic():
+                            transaction_, success = Transaction(
+                                wallet=wallet, amount=1,
+                                transaction_type=Transaction.TYPE_INCOME
+                            ).provide_transaction()
+                            transaction_.save()
+                        break
+                    except utils.OperationalError:
+                        errors += 1
+                        time.sleep(0.001)
+                timings.append(time.perf_counter() - started)
+        finally:
+            connection.close()
+        with lock:
+            latencies.extend(timings)
+            counters['lock_errors'] += errors
+
+    workers = [threading.Thread(target=worker, args=(wallet,))
+               for wallet in wallets]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode')
+        journal_mode = cursor.fetchone()[0]
+    return {
+        'profile': profile,
+        'journal_mode': journal_mode,
+        'threads': threads,
+        'writes': len(latencies),
+        'lock_errors': counters['lock_errors'],
+        'seconds': round(elapsed, 3),
+        'writes_per_sec': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--operations', type=int, default=200,
+                        help='writes per thread')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.db import connection
+
+    results = []
+    for profile, pragmas in settings.SQLITE_PROFILES.items():
+        settings.MONEY_SQLITE_PRAGMAS = pragmas
+        for threads in args.threads:
+            connection.close()
+            with benchmark_database():
+                results.append(run(profile, threads, args.operations))
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Startup time of a worker: boot and time to the first request.
+
+Every run is a fresh interpreter that builds the WSGI application of a
+settings module (settings, apps and middleware) and serves one request,
+which loads the URLconf, the views and DRF. Reported are the medians of
+`runs` runs: ``boot_ms``, ``first_request_ms``, ``process_ms`` (from
+spawning the interpreter until the response, interpreter startup
+included) and the number of loaded modules. One more run under
+``python -X importtime`` lists the modules with the largest cumulative
+import time.
+
+``--env`` adds a variant of every settings module with extra environment
+variables, e.g. ``SETUPTOOLS_USE_DISTUTILS=stdlib``, which skips the
+distutils shim of setuptools that ``django.utils.version`` pulls in.
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.utils import report
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def probe(path: str):
+    """Boots the WSGI application, serves `path` and prints the timings."""
+    started = time.perf_counter()
+    from django.core.wsgi import get_wsgi_application
+    application = get_wsgi_application()
+    booted = time.perf_counter()
+    statuses = []
+    b''.join(application({
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.url_scheme': 'http',
+    }, lambda status, headers: statuses.append(status)))
+    served = time.perf_counter()
+    print(json.dumps({
+        'status': int(statuses[0].split()[0]),
+        'boot_ms': round((booted - started) * 1000, 1),
+        'first_request_ms': round((served - booted) * 1000, 1),
+        'modules': sorted(sys.modules),
+    }))
+
+
+def boot(settings: str, path: str = '/api/money/cache/stats',
+         env: dict = None, importtime: bool = False) -> dict:
+    """Runs `probe` in a new interpreter configured with `settings`."""
+    environ = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings,
+               **(env or {})}
+    environ.setdefault('SECRET_KEY', 'benchmark')
+    command = [sys.executable, '-m', 'benchmarks.startup', 'probe', path]
+    if importtime:
+        command[1:1] = ['-X', 'importtime']
+    started = time.perf_counter()
+    completed = subprocess.run(command, cwd=BASE_DIR, env=environ,
+                               capture_output=True, text=True, check=True)
+    result = json.loads(completed.stdout.splitlines()[-1])
+    result['process_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    if importtime:
+        result['imports'] = slowest_imports(completed.stderr)
+    return result
+
+
+def slowest_imports(log: str) -> list:
+    """Returns the modules of an importtime `log` by cumulative time."""
+    imports = []
+    for line in log.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        imports.append((int(cumulative), name.strip()))
+    imports.sort(reverse=True)
+    return [{'module': name, 'cumulative_ms': round(cumulative / 1000, 1)}
+            for cumulative, name in imports]
+
+
+def run(settings: str, env: dict, runs: int, top: int) -> dict:
+    results = [boot(settings, env=env) for _ in range(runs)]
+    return {
+        'settings': settings,
+        'env': env,
+        'runs': runs,
+        'status': results[-1]['status'],
+        'modules': len(results[-1]['modules']),
+        **{metric: round(statistics.median(
+            result[metric] for result in results
+        ), 1) for metric in ('boot_ms', 'first_request_ms', 'process_ms')},
+        'imports': boot(settings, env=env, importtime=True)['imports'][:top],
+    }
+
+
+def main():
+    if sys.argv[1:2] == ['probe']:
+        probe(sys.argv[2])
+        return
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--settings', nargs='+',
+                        default=['ewallet.settings', 'ewallet.settings_api'])
+    parser.add_argument('--env', nargs='*', default=[],
+                        help='NAME=VALUE variables of an extra variant')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10,
+                        help='slowest imports to report')
+    args = parser.parse_args()
+
+    variants = [{}]
+    if args.env:
+        variants.append(dict(item.split('=', 1) for item in args.env))
+    report([run(settings, env, args.runs, args.top)
+            for settings in args.settings for env in variants])
+
+
+if __name__ == '__main__':
+    main()
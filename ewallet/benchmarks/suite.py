@@ -0,0 +1,344 @@
+"""Benchmark suite of every endpoint of ``money.api.urls``.
+
+``run`` seeds `wallets` wallets with `transactions` transactions each and
+drives every URL name of the ``money`` namespace in-process with
+``django.test.Client``: first sequentially, for latency percentiles,
+SQL queries per request and peak traced memory, then with `clients`
+concurrent threads, for throughput. Results are printed and optionally
+written as JSON.
+
+``compare`` diffs two result files and exits with status 1 if a metric
+of any endpoint got worse by more than `threshold` (a fraction) or an
+endpoint issues more queries than before.
+"""
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+from itertools import count
+
+from benchmarks.utils import (
+    benchmark_database,
+    percentile,
+    report,
+    seed_transactions,
+    setup_django,
+)
+
+
+# `request` returns the method, path and JSON body of the next request.
+Scenario = namedtuple('Scenario', ['name', 'request', 'expected'])
+
+LOWER_IS_BETTER = ('p50_ms', 'p95_ms', 'p99_ms', 'concurrent_p99_ms',
+                   'peak_memory_kb')
+HIGHER_IS_BETTER = ('requests_per_sec', 'concurrent_requests_per_sec')
+
+
+def scenarios(wallets: list) -> list:
+    """Returns scenarios of all ``money`` endpoints over seeded `wallets`.
+
+    Requests cycle through the wallets. Endpoints that destroy data get
+    fresh objects made before each request.
+    """
+    from django.urls import reverse
+
+    from money.models import Transaction, Wallet
+
+    sequence = count()
+
+    def wallet():
+        return wallets[next(sequence) % len(wallets)]
+
+    def create_wallet():
+        return 'POST', reverse('money:create-wallet'), {
+            'name': 'Benchmark {}'.format(next(sequence))
+        }
+
+    def create_wallets_bulk():
+        batch = next(sequence)
+        return 'POST', reverse('money:create-wallets-bulk'), [
+            {'name': 'Benchmark {} {}'.format(batch, index)}
+            for index in range(100)
+        ]
+
+    def update_wallet():
+        target = wallet()
+        return 'PUT', reverse('money:update-wallet', args=[target.slug]), {
+            'name': target.name
+        }
+
+    def delete_wallet():
+        target = Wallet.objects.create(
+            name='Disposable {}'.format(next(sequence))
+        )
+        return 'DELETE', reverse('money:delete-wallet',
+                                 args=[target.slug]), None
+
+    def delete_transaction():
+        transaction, success = Transaction(
+            wallet=wallet(), transaction_type=Transaction.TYPE_INCOME,
+            amount=1
+        ).provide_transaction()
+        transaction.save()
+        return 'DELETE', reverse('money:delete-transactions',
+                                 args=[transaction.pk]), None
+
+    def create_transaction():
+        return 'POST', reverse('money:create-transaction'), {
+            'wallet': wallet().name, 'amount': 1,
+            'transaction_type': Transaction.TYPE_INCOME,
+        }
+
+    def create_transactions_bulk():
+        return 'POST', reverse('money:create-transactions-bulk'), [
+            {'wallet': wallet().name, 'amount': 1,
+             'transaction_type': Transaction.TYPE_INCOME}
+            for _ in range(100)
+        ]
+
+    def create_transfer():
+        return 'POST', reverse('money:create-transfer'), {
+            'source': wallet().name, 'target': wallet().name, 'amount': 1,
+        }
+
+    def get(name, *args, query=''):
+        def request():
+            values = [value(wallet()) for value in args]
+            return 'GET', reverse(name, args=values) + query, None
+        return request
+
+    def slug(wallet_):
+        return wallet_.slug
+
+    return [
+        Scenario('get-wallets', get('money:get-wallets'), 200),
+        Scenario('create-wallet', create_wallet, 201),
+        Scenario('create-wallets-bulk', create_wallets_bulk, 201),
+        Scenario('update-wallet', update_wallet, 200),
+        Scenario('delete-wallet', delete_wallet, 200),
+        Scenario('get-wallet-balance',
+                 get('money:get-wallet-balance', slug), 200),
+        Scenario('get-wallet-balance-at',
+                 get('money:get-wallet-balance', slug,
+                     query='?at=2000-01-01T00:00:00Z'), 200),
+        Scenario('get-wallet-stats',
+                 get('money:get-wallet-stats', slug,
+                     query='?bucket=month'), 200),
+        Scenario('get-transactions', get('money:get-transactions'), 200),
+        Scenario('get-transactions-by-wallet',
+                 get('money:get-transactions-by-wallet', slug), 200),
+        Scenario('create-transaction', create_transaction, 201),
+        Scenario('create-transactions-bulk', create_transactions_bulk, 201),
+        Scenario('create-transfer', create_transfer, 201),
+        Scenario('delete-transactions', delete_transaction, 200),
+        Scenario('get-cache-stats', get('money:get-cache-stats'), 200),
+        Scenario('get-metrics', get('money:get-metrics'), 200),
+    ]
+
+
+def send(client, scenario: Scenario):
+    method, path, data = scenario.request()
+    body = None if data is None else json.dumps(data)
+    response = getattr(client, method.lower())(
+        path, data=body, content_type='application/json'
+    )
+    if response.status_code != scenario.expected:
+        raise AssertionError('{} {}: {}'.format(
+            method, path, response.status_code
+        ))
+    return response
+
+
+def run_sequential(scenario: Scenario, requests: int) -> dict:
+    from django.db import connection
+    from django.test import Client
+
+    from money.metrics import QueryRecorder
+
+    client = Client()
+    send(client, scenario)  # Warm up caches and connections.
+    latencies = []
+    recorder = QueryRecorder()
+    tracemalloc.start()
+    try:
+        with connection.execute_wrapper(recorder):
+            for _ in range(requests):
+                started = time.perf_counter()
+                send(client, scenario)
+                latencies.append(time.perf_counter() - started)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    seconds = sum(latencies)
+    return {
+        'requests': requests,
+        'requests_per_sec': round(requests / seconds, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        # Queries of the fixtures of destructive scenarios are included.
+        'queries': round(recorder.count / requests, 2),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def run_concurrent(scenario: Scenario, clients: int, requests: int) -> dict:
+    from django.db import connection, utils
+    from django.test import Client
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker():
+        client = Client()
+        timings = []
+        failures = 0
+        try:
+            for _ in range(requests):
+                started = time.perf_counter()
+                try:
+                    send(client, scenario)
+                except (utils.OperationalError, AssertionError):
+                    failures += 1
+                    continue
+                timings.append(time.perf_counter() - started)
+        finally:
+            connection.close()
+        with lock:
+            latencies.extend(timings)
+            errors.append(failures)
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+    return {
+        'clients': clients,
+        'concurrent_requests_per_sec': round(len(latencies) / seconds, 1),
+        'concurrent_p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'concurrent_errors': sum(errors),
+    }
+
+
+def run(args) -> dict:
+    setup_django()
+    from money.api.urls import urlpatterns
+    from money.models import Wallet
+
+    with benchmark_database():
+        started = time.perf_counter()
+        seed_transactions(args.wallets, args.wallets * args.transactions)
+        # Seeded rows bypass the balances, make room for outcomes.
+        Wallet.objects.update(balance=10 ** 9)
+        seed_seconds = time.perf_counter() - started
+        wallets = list(Wallet.objects.order_by('pk'))
+
+        suite = scenarios(wallets)
+        missing = {pattern.name for pattern in urlpatterns} \
+            - {scenario.name for scenario in suite}
+        if missing:
+            raise SystemExit('Endpoints without a scenario: {}.'.format(
+                ', '.join(sorted(missing))
+            ))
+
+        results = {}
+        for scenario in suite:
+            if args.only and scenario.name not in args.only:
+                continue
+            result = run_sequential(scenario, args.requests)
+            result.update(
+                run_concurrent(scenario, args.clients, args.requests)
+            )
+            results[scenario.name] = result
+    return {
+        'meta': {
+            'wallets': args.wallets,
+            'transactions_per_wallet': args.transactions,
+            'requests': args.requests,
+            'clients': args.clients,
+            'seed_seconds': round(seed_seconds, 3),
+        },
+        'results': results,
+    }
+
+
+def compare(base: dict, head: dict, threshold: float) -> (dict, list):
+    """Returns relative changes of `head` against `base` and regressions.
+
+    A change is positive when the metric got worse.
+    """
+    changes = {}
+    regressions = []
+    for name, before in base['results'].items():
+        after = head['results'].get(name)
+        if after is None:
+            continue
+        change = {}
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            if not before.get(metric) or metric not in after:
+                continue
+            delta = (after[metric] - before[metric]) / before[metric]
+            change[metric] = round(
+                -delta if metric in HIGHER_IS_BETTER else delta, 3
+            )
+            if change[metric] > threshold:
+                regressions.append('{}: {} {} -> {}'.format(
+                    name, metric, before[metric], after[metric]
+                ))
+        if after['queries'] > before['queries']:
+            regressions.append('{}: queries {} -> {}'.format(
+                name, before['queries'], after['queries']
+            ))
+        change['queries'] = after['queries'] - before['queries']
+        changes[name] = change
+    return changes, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='run the suite')
+    run_parser.add_argument('--wallets', type=int, default=100)
+    run_parser.add_argument('--transactions', type=int, default=1000,
+                            help='transactions per wallet')
+    run_parser.add_argument('--requests', type=int, default=50,
+                            help='requests per endpoint and client')
+    run_parser.add_argument('--clients', type=int, default=8)
+    run_parser.add_argument('--only', nargs='+',
+                            help='run only these scenarios')
+    run_parser.add_argument('--output', help='write results to a file')
+    compare_parser = commands.add_parser('compare',
+                                         help='diff two result files')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('head')
+    compare_parser.add_argument('--threshold', type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        results = run(args)
+        report(results)
+        if args.output:
+            with open(args.output, 'w') as file:
+                json.dump(results, file, indent=2)
+        return
+
+    with open(args.base) as base, open(args.head) as head:
+        changes, regressions = compare(json.load(base), json.load(head),
+                                       args.threshold)
+    report({'changes': changes, 'regressions': regressions})
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
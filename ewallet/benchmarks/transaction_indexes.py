@@ -0,0 +1,101 @@
+"""Query plans and latency of transaction listings with and without indexes.
+
+Seeds the ``Transaction`` table, runs the queries behind the listing
+views with the ``Transaction.Meta.indexes`` dropped and then created, and
+reports the query plan and latency of each query for both runs.
+"""
+import argparse
+import datetime
+import statistics
+import time
+
+from benchmarks.utils import (
+    benchmark_database,
+    percentile,
+    report,
+    seed_transactions,
+    setup_django,
+)
+
+
+def queries(wallet_id: int, page_size: int) -> dict:
+    from django.db.models import Q
+
+    from money.models import Transaction
+
+    ordered = Transaction.objects.order_by('data', 'id')
+    by_wallet = ordered.filter(wallet_id=wallet_id)
+    middle = by_wallet[by_wallet.count() // 2]
+    first = ordered.first().data
+    return {
+        'list_first_page': ordered[:page_size + 1],
+        'wallet_first_page': by_wallet[:page_size + 1],
+        'wallet_deep_page': by_wallet.filter(
+            Q(data__gt=middle.data) | Q(data=middle.data, id__gt=middle.id)
+        )[:page_size + 1],
+        'type_date_range': ordered.filter(
+            transaction_type=Transaction.TYPE_OUTCOME,
+            data__gte=first + datetime.timedelta(hours=1),
+            data__lt=first + datetime.timedelta(hours=2),
+        ),
+    }
+
+
+def measure(named_queries: dict, repeat: int) -> dict:
+    results = {}
+    for name, queryset in named_queries.items():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(queryset.all())
+            timings.append((time.perf_counter() - started) * 1000)
+        results[name] = {
+            'plan': queryset.explain(),
+            'median_ms': round(statistics.median(timings), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--wallets', type=int, default=100)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+
+    from money.models import Transaction
+
+    with benchmark_database():
+        indexes = Transaction._meta.indexes
+        with connection.schema_editor() as editor:
+            for index in indexes:
+                editor.remove_index(Transaction, index)
+        started = time.perf_counter()
+        wallet_ids = seed_transactions(args.wallets, args.rows)
+        seconds = time.perf_counter() - started
+        named_queries = queries(wallet_ids[0], args.page_size)
+
+        before = measure(named_queries, args.repeat)
+        with connection.schema_editor() as editor:
+            for index in indexes:
+                editor.add_index(Transaction, index)
+        after = measure(named_queries, args.repeat)
+
+        report({
+            'rows': args.rows,
+            'wallets': args.wallets,
+            'seed_seconds': round(seconds, 1),
+            'queries': {
+                name: {'before': before[name], 'after': after[name]}
+                for name in named_queries
+            },
+        })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Concurrent transfers between a small hot set of wallets.
+
+Threads move random amounts in random directions between `wallets`
+wallets with ``Transaction.objects.transfer``. Database errors (lock
+timeouts, deadlocks) are retried and counted. At the end the total of
+all balances must be unchanged and every balance must match its ledger,
+otherwise ``lost_money`` or ``ledger_mismatches`` is non-zero.
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+
+from benchmarks.utils import (
+    benchmark_database,
+    percentile,
+    report,
+    setup_django,
+)
+
+
+def run(threads: int, operations: int, wallets: int,
+        initial_balance: int) -> dict:
+    from django.db import connection, utils
+
+    from money.models import Transaction, Wallet
+    from money.reconciliation import reconcile_balances
+
+    Transaction.objects.all().delete()
+    Wallet.objects.all().delete()
+    Wallet.objects.bulk_create(
+        [Wallet(name='Hot {}'.format(i), slug='hot-{}'.format(i))
+         for i in range(wallets)]
+    )
+    hot = list(Wallet.objects.all())
+    for wallet in hot:
+        Transaction.objects.create(
+            wallet=wallet, amount=initial_balance,
+            transaction_type=Transaction.TYPE_INCOME
+        )
+        Wallet.objects.credit(wallet.pk, initial_balance)
+    latencies = []
+    counters = {'accepted': 0, 'rejected': 0, 'retries': 0}
+    lock = threading.Lock()
+
+    def worker():
+        timings = []
+        local = {'accepted': 0, 'rejected': 0, 'retries': 0}
+        try:
+            for _ in range(operations):
+                source, target = random.sample(hot, 2)
+                amount = random.randint(1, initial_balance // 10)
+                started = time.perf_counter()
+                while True:
+                    try:
+                        pair = Transaction.objects.transfer(
+                            source, target, amount
+                        )
+                        break
+                    except utils.OperationalError:
+                        local['retries'] += 1
+                        time.sleep(0.001)
+                timings.append(time.perf_counter() - started)
+                local['accepted' if pair else 'rejected'] += 1
+        finally:
+            connection.close()
+        with lock:
+            latencies.extend(timings)
+            for name, value in local.items():
+                counters[name] += value
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    total = sum(Wallet.objects.values_list('balance', flat=True))
+    mismatches = reconcile_balances()['mismatches']
+    return dict(
+        threads=threads,
+        wallets=wallets,
+        transfers=len(latencies),
+        **counters,
+        seconds=round(elapsed, 3),
+        transfers_per_sec=round(len(latencies) / elapsed, 1),
+        p50_ms=round(statistics.median(latencies) * 1000, 3),
+        p99_ms=round(percentile(latencies, 0.99) * 1000, 3),
+        lost_money=abs(total - wallets * initial_balance),
+        ledger_mismatches=mismatches,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--operations', type=int, default=200,
+                        help='transfers per thread')
+    parser.add_argument('--wallets', type=int, default=4)
+    parser.add_argument('--initial-balance', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        report([run(threads, args.operations, args.wallets,
+                    args.initial_balance)
+                for threads in args.threads])
+
+
+if __name__ == '__main__':
+    main()
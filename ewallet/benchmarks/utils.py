@@ -0,0 +1,104 @@
+"""Shared helpers for the benchmark scripts."""
+import contextlib
+import datetime
+import json
+import os
+import random
+import tempfile
+
+
+def setup_django(settings_module: str = 'ewallet.settings'):
+    """Configures Django for a standalone benchmark run."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    import django
+    django.setup()
+
+
+@contextlib.contextmanager
+def benchmark_database():
+    """Creates a throwaway copy of the ``default`` database.
+
+    SQLite databases are created as a file, not in memory, so that
+    benchmark threads get connections of their own.
+    """
+    from django.db import connection
+    from django.test.utils import (
+        setup_test_environment,
+        teardown_test_environment,
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        if connection.vendor == 'sqlite':
+            connection.settings_dict['TEST']['NAME'] = os.path.join(
+                directory, 'benchmark.sqlite3'
+            )
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True
+        )
+        try:
+            yield connection
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+
+def seed_transactions(wallets: int, rows: int,
+                      batch_size: int = 10000) -> list:
+    """Inserts `wallets` wallets and `rows` transactions between them.
+
+    Rows are inserted with raw ``executemany`` in one database transaction,
+    one second apart and ending now. Outcomes never exceed the running
+    balance of their wallet, so no ledger goes negative at any point.
+    Returns wallet ids.
+    """
+    from django.db import connection, transaction
+    from django.utils import timezone
+
+    from money.models import Transaction, Wallet
+
+    Wallet.objects.bulk_create(
+        [Wallet(name='Wallet {}'.format(i), slug='wallet-{}'.format(i))
+         for i in range(wallets)]
+    )
+    wallet_ids = list(Wallet.objects.values_list('id', flat=True))
+    table = connection.ops.quote_name(Transaction._meta.db_table)
+    sql = ('INSERT INTO {} (wallet_id, transaction_type, data, amount, '
+           'comment) VALUES (%s, %s, %s, %s, %s)').format(table)
+    started = timezone.now() - datetime.timedelta(seconds=rows)
+    balances = dict.fromkeys(wallet_ids, 0)
+
+    def row(i: int) -> tuple:
+        data = connection.ops.adapt_datetimefield_value(
+            started + datetime.timedelta(seconds=i)
+        )
+        wallet_id = random.choice(wallet_ids)
+        amount = min(random.randint(1, 500), balances[wallet_id])
+        if random.random() < 0.5 or not amount:
+            amount = random.randint(1, 1000)
+            balances[wallet_id] += amount
+            return (wallet_id, Transaction.TYPE_INCOME, data, amount, '')
+        balances[wallet_id] -= amount
+        return (wallet_id, Transaction.TYPE_OUTCOME, data, amount, '')
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for offset in range(0, rows, batch_size):
+            cursor.executemany(sql, [
+                row(i) for i in range(offset, min(rows, offset + batch_size))
+            ])
+    return wallet_ids
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Returns the nearest-rank percentile of `values`."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def report(results) -> None:
+    """Prints benchmark results as JSON."""
+    print(json.dumps(results, indent=2, default=str))
@@ -33,6 +33,24 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Request latency and SQL query metrics, see ``/api/money/metrics``.
+if os.getenv('MONEY_METRICS', '0') == '1':
+    MIDDLEWARE.insert(0, 'money.metrics.MetricsMiddleware')
+
+MONEY_SERVER_TIMING = os.getenv('MONEY_SERVER_TIMING', '0') == '1'
+
+# Commit new transactions in batches by a writer thread.
+MONEY_GROUP_COMMIT = os.getenv('MONEY_GROUP_COMMIT', '0') == '1'
+MONEY_GROUP_COMMIT_MAX_BATCH = int(
+    os.getenv('MONEY_GROUP_COMMIT_MAX_BATCH', 100)
+)
+MONEY_GROUP_COMMIT_LINGER = float(
+    os.getenv('MONEY_GROUP_COMMIT_LINGER', 0.002)
+)
+MONEY_GROUP_COMMIT_TIMEOUT = float(
+    os.getenv('MONEY_GROUP_COMMIT_TIMEOUT', 5)
+)
+
 ROOT_URLCONF = 'ewallet.urls'
 
 
@@ -40,11 +58,43 @@ WSGI_APPLICATION = 'ewallet.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.sqlite3'),
+        'NAME': os.getenv('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        'USER': os.getenv('DB_USER', ''),
+        'PASSWORD': os.getenv('DB_PASSWORD', ''),
+        'HOST': os.getenv('DB_HOST', ''),
+        'PORT': os.getenv('DB_PORT', ''),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', '1') == '1',
+    }
+}
+
+# PRAGMAs set on every new SQLite connection, chosen by DB_SQLITE_PROFILE.
+SQLITE_PROFILES = {
+    'stock': {},
+    'tuned': {
+        'journal_mode': 'WAL',
+        'busy_timeout': 5000,
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+    },
+}
+
+MONEY_SQLITE_PRAGMAS = SQLITE_PROFILES[os.getenv('DB_SQLITE_PROFILE', 'tuned')]
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
 
+MONEY_CACHE_ALIAS = 'default'
+MONEY_CACHE_TIMEOUT = 300
+
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
 USE_I18N = True
@@ -0,0 +1,37 @@
+"""Lean settings of API-only workers.
+
+The API serves JSON only, so workers started with
+``DJANGO_SETTINGS_MODULE=ewallet.settings_api`` skip the machinery it
+never uses: template engines, the browsable API, translations, CSRF and
+clickjacking middleware (the API views are CSRF exempt anyway) and apps
+without models or checks the API relies on.
+"""
+from ewallet.settings import *  # noqa: F401,F403
+
+
+INSTALLED_APPS = [
+    'money.apps.MoneyConfig',
+]
+
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if middleware not in (
+        'django.middleware.csrf.CsrfViewMiddleware',
+        'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    )
+]
+
+USE_I18N = False
+
+TEMPLATES = []
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+    ],
+    'DEFAULT_AUTHENTICATION_CLASSES': [],
+}
@@ -1,5 +1,7 @@
 from django.urls import path, include
 
 urlpatterns = [
+    path('api/money/async/', include('money.api.async_urls'),
+         name='money_async_api'),
     path('api/money/', include('money.api.urls'), name='money_api'),
 ]
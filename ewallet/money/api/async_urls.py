@@ -0,0 +1,14 @@
+from django.urls import path
+
+from money.api import async_views
+
+
+app_name = 'money_async'
+
+urlpatterns = [
+    path('wallets', async_views.wallets, name='wallets'),
+    path('transactions', async_views.transactions, name='transactions'),
+    path('transactions/<str:wallet_slug>',
+         async_views.transactions_by_wallet,
+         name='transactions-by-wallet'),
+]
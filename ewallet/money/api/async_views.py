@@ -0,0 +1,139 @@
+"""Module with async API views for running under ASGI.
+
+The views mirror the listing and creation endpoints of ``views``
+without holding a worker thread while waiting for the database. Django
+has no async ORM yet, so database work runs in ``sync_to_async``
+sections: reads in a thread pool, writes thread-sensitively, which keeps
+the transactional write path in one thread and off the event loop. The
+pool threads serve no requests, so read sections clean up connections
+like request boundaries do (``CONN_MAX_AGE``, ``CONN_HEALTH_CHECKS``).
+"""
+import functools
+import json
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+
+from money.cache import get_wallet
+from money.db import check_connections
+from money.models import ArchivedTransaction, Transaction
+from money.api.serializers import WalletCreateUpdateSerializer
+from money.api.views import (
+    create_transaction_response,
+    filter_transactions,
+    list_wallets,
+    paginate_transactions,
+    run_idempotent,
+)
+
+
+def read_section(function):
+    """Runs `function` in the thread pool with a usable connection."""
+    @functools.wraps(function)
+    def section(*args, **kwargs):
+        close_old_connections()
+        check_connections()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(section, thread_sensitive=False)
+
+
+write_section = functools.partial(sync_to_async, thread_sensitive=True)
+
+
+def csrf_exempt(view):
+    """Marks an async view as CSRF exempt, like DRF does for its views."""
+    view.csrf_exempt = True
+    return view
+
+
+def parse_json(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+
+
+def create_wallet(data):
+    serializer = WalletCreateUpdateSerializer(data=data)
+    if serializer.is_valid():
+        serializer.save()
+        return None
+    return serializer.errors
+
+
+def transactions_page(request, wallet_slug: str = None) -> (list, dict):
+    transactions = Transaction.objects.all()
+    archived = ArchivedTransaction.objects.all()
+    if wallet_slug is not None:
+        wallet = get_wallet('slug', wallet_slug)
+        transactions = transactions.filter(wallet=wallet)
+        archived = archived.filter(wallet=wallet)
+    request = Request(request)
+    return paginate_transactions(
+        request, filter_transactions(request, transactions),
+        filter_transactions(request, archived)
+    )
+
+
+def created_or_errors(errors) -> HttpResponse:
+    if errors is None:
+        return HttpResponse(status=201)
+    return JsonResponse(errors, status=400)
+
+
+@csrf_exempt
+async def wallets(request):
+    """GET: list all wallets, POST: create a wallet."""
+    if request.method == 'GET':
+        return JsonResponse(await read_section(list_wallets)(), safe=False)
+    if request.method == 'POST':
+        data = parse_json(request)
+        if data is None:
+            return JsonResponse({'detail': 'JSON parse error.'}, status=400)
+        return created_or_errors(await write_section(create_wallet)(data))
+    return HttpResponseNotAllowed(['GET', 'POST'])
+
+
+@csrf_exempt
+async def transactions(request):
+    """GET: list transactions page by page, POST: create a transaction."""
+    if request.method == 'GET':
+        return await transactions_by_wallet(request, None)
+    if request.method == 'POST':
+        payload = parse_json(request)
+        if payload is None:
+            return JsonResponse({'detail': 'JSON parse error.'}, status=400)
+        status_code, data, headers = await write_section(run_idempotent)(
+            request, payload, lambda: create_transaction_response(payload)
+        )
+        if data is None:
+            response = HttpResponse(status=status_code)
+        else:
+            response = JsonResponse(data, status=status_code, safe=False)
+        for name, value in headers.items():
+            response[name] = value
+        return response
+    return HttpResponseNotAllowed(['GET', 'POST'])
+
+
+async def transactions_by_wallet(request, wallet_slug: str):
+    """GET: list transactions of a wallet page by page."""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        data, headers = await read_section(transactions_page)(
+            request, wallet_slug
+        )
+    except ValidationError as error:
+        return JsonResponse(error.detail, status=400)
+    response = JsonResponse(data, safe=False)
+    for name, value in headers.items():
+        response[name] = value
+    return response
@@ -0,0 +1,140 @@
+"""Module with keyset pagination of transaction listings."""
+import base64
+import binascii
+import heapq
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class TransactionKeysetPagination:
+    """Pages transactions by the ``(field, id)`` key of the ordering.
+
+    A page is read with ``WHERE (field, id) > cursor ORDER BY field, id
+    LIMIT size`` (``<`` and descending for ``-field``), so its cost
+    doesn't depend on how deep the page is. The ordering is chosen with
+    the `ordering` query parameter from `orderings`. The body stays a
+    plain list, the next page is linked in the ``Link`` header with an
+    opaque `cursor` query parameter. Items of the queryset need `id` and
+    the ordering field attributes, named ``values_list()`` rows do.
+    A page of `archived` rows is read and merged in only if the archive
+    reaches into the page.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering_query_param = 'ordering'
+    page_size = getattr(settings, 'MONEY_TRANSACTIONS_PAGE_SIZE', 100)
+    max_page_size = getattr(settings, 'MONEY_TRANSACTIONS_MAX_PAGE_SIZE', 1000)
+    orderings = ('data', '-data', 'amount', '-amount')
+    ordering = ('data', 'id')
+
+    def paginate_queryset(self, queryset, request, archived=None) -> list:
+        self.request = request
+        self.ordering = self.get_ordering(request)
+        size = self.get_page_size(request)
+        cursor = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param), self.ordering
+        )
+        page = self.read(queryset, cursor, size + 1)
+        if archived is not None \
+                and self.reaches(archived.boundary(), page, cursor, size):
+            page = list(heapq.merge(
+                page, self.read(archived, cursor, size + 1),
+                key=self.key, reverse=self.ordering[0].startswith('-')
+            ))[:size + 1]
+        self.has_next = len(page) > size
+        self.page = page[:size]
+        return self.page
+
+    def read(self, queryset, cursor, limit: int) -> list:
+        queryset = queryset.order_by(*self.ordering)
+        if cursor is not None:
+            queryset = queryset.filter(self.after(self.ordering, *cursor))
+        return list(queryset[:limit])
+
+    def key(self, row) -> tuple:
+        return getattr(row, self.ordering[0].lstrip('-')), row.id
+
+    def reaches(self, boundary, page: list, cursor, size: int) -> bool:
+        """Whether rows dated up to `boundary` may be on the page."""
+        if boundary is None:
+            return False
+        if self.ordering[0] == 'data':
+            return cursor is None or cursor[0] <= boundary
+        if self.ordering[0] == '-data':
+            return len(page) <= size or page[-1].data <= boundary
+        return True
+
+    def get_paginated_response(self, data) -> Response:
+        return Response(data, headers=self.get_headers())
+
+    def get_headers(self) -> dict:
+        if not self.has_next:
+            return {}
+        last = self.page[-1]
+        field = self.ordering[0].lstrip('-')
+        url = replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param,
+            self.encode_cursor(getattr(last, field), last.id)
+        )
+        return {'Link': '<{}>; rel="next"'.format(url)}
+
+    def get_page_size(self, request) -> int:
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    @classmethod
+    def get_ordering(cls, request) -> tuple:
+        """Returns the ``order_by()`` fields of ``?ordering=``."""
+        ordering = request.query_params.get(cls.ordering_query_param)
+        if ordering is None:
+            return cls.ordering
+        if ordering not in cls.orderings:
+            raise ValidationError({cls.ordering_query_param: (
+                'Choose one of: {}.'.format(', '.join(cls.orderings))
+            )})
+        if ordering.startswith('-'):
+            return ordering, '-id'
+        return ordering, 'id'
+
+    @staticmethod
+    def after(ordering: tuple, value, id: int) -> Q:
+        """Returns the condition of rows after the key (`value`, `id`)."""
+        field = ordering[0].lstrip('-')
+        lookup = 'lt' if ordering[0].startswith('-') else 'gt'
+        return Q(**{'{}__{}'.format(field, lookup): value}) \
+            | Q(**{field: value, 'id__{}'.format(lookup): id})
+
+    @staticmethod
+    def encode_cursor(value, id: int) -> str:
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        position = '{}|{}'.format(value, id).encode()
+        return base64.urlsafe_b64encode(position).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str, ordering: tuple = ordering):
+        if not cursor:
+            return None
+        try:
+            position = base64.urlsafe_b64decode(cursor.encode()).decode()
+            value, id = position.rsplit('|', 1)
+            id = int(id)
+            if ordering[0].lstrip('-') == 'data':
+                value = parse_datetime(value)
+            else:
+                value = int(value)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            value = None
+        if value is None:
+            raise ValidationError({'cursor': 'Invalid cursor.'})
+        return value, id
@@ -1,6 +1,9 @@
-from rest_framework import serializers
+from django.db import models
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
 
-from money.models import Wallet, Transaction
+from money.models import Wallet, Transaction, validate_wallet_name
 
 
 class WalletGetSerializer(serializers.ModelSerializer):
@@ -15,14 +18,135 @@ class WalletCreateUpdateSerializer(serializers.ModelSerializer):
         fields = ['name']
 
 
+class WalletBulkCreateSerializer(serializers.Serializer):
+    # No unique validators, collisions are checked for the whole batch.
+    name = serializers.CharField(max_length=100, required=False,
+                                 allow_blank=True, default='',
+                                 validators=[validate_wallet_name])
+
+
 class TransactionGetSerializer(serializers.ModelSerializer):
     class Meta:
         model = Transaction
         fields = ['id', 'wallet', 'transaction_type', 'data',
-                  'amount', 'comment']
+                  'amount', 'comment', 'reversal_of']
 
 
 class TransactionCreateUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Transaction
         fields = ['wallet', 'transaction_type', 'amount', 'comment']
+
+
+class TransactionBulkCreateSerializer(serializers.ModelSerializer):
+    wallet = serializers.CharField(max_length=100)
+
+    class Meta:
+        model = Transaction
+        fields = ['wallet', 'transaction_type', 'amount', 'comment']
+
+
+class TransferSerializer(serializers.Serializer):
+    source = serializers.CharField(max_length=100)
+    target = serializers.CharField(max_length=100)
+    amount = serializers.IntegerField(min_value=1)
+    comment = serializers.CharField(max_length=2500, required=False,
+                                    allow_blank=True, default='')
+
+    def validate(self, data):
+        if data['source'] == data['target']:
+            raise serializers.ValidationError(
+                'Source and target wallets must differ.'
+            )
+        return data
+
+
+class ValuesListSerializer:
+    """Fast read-only counterpart of a ``ModelSerializer`` for listings.
+
+    Rows are fetched with ``values_list()`` and zipped into dicts in the
+    order of the serializer fields, only fields whose representation
+    differs from the database value go through ``to_representation``.
+    The output is the same as of `serializer_class` with ``many=True``
+    without building field objects per row.
+    """
+    serializer_class = None
+    # Columns read instead of the `source` of some fields.
+    sources = {}
+    plain_fields = (
+        serializers.IntegerField,
+        serializers.CharField,
+        serializers.ChoiceField,
+        serializers.PrimaryKeyRelatedField,
+    )
+
+    def __init__(self, rows):
+        """`rows` is a queryset or rows fetched with ``values()``."""
+        fields = self.serializer_class().fields
+        self.names = list(fields)
+        self.converters = [
+            (index, self.get_converter(field))
+            for index, field in enumerate(fields.values())
+            if not isinstance(field, self.plain_fields)
+        ]
+        if isinstance(rows, models.QuerySet):
+            rows = self.values(rows)
+        self.rows = rows
+
+    @classmethod
+    def values(cls, queryset) -> models.QuerySet:
+        fields = cls.serializer_class().fields.values()
+        return queryset.values_list(
+            *[cls.sources.get(field.source, field.source) for field in fields],
+            named=True
+        )
+
+    @staticmethod
+    def get_converter(field):
+        """Returns a function turning a database value into its output."""
+        if not isinstance(field, serializers.DateTimeField):
+            return field.to_representation
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        field_timezone = getattr(field, 'timezone', field.default_timezone())
+        if field_timezone is None or output_format is None \
+                or output_format.lower() != ISO_8601:
+            return field.to_representation
+
+        # ``DateTimeField.to_representation`` with the timezone looked up
+        # once instead of per row.
+        def convert(value):
+            if timezone.is_naive(value):
+                return field.to_representation(value)
+            value = value.astimezone(field_timezone).isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        return convert
+
+    def __iter__(self):
+        names = self.names
+        converters = self.converters
+        for row in self.rows:
+            if converters:
+                row = list(row)
+                for index, convert in converters:
+                    if row[index] is not None:
+                        row[index] = convert(row[index])
+            yield dict(zip(names, row))
+
+    @property
+    def data(self) -> list:
+        return list(self)
+
+
+class WalletListSerializer(ValuesListSerializer):
+    serializer_class = WalletGetSerializer
+    sources = {'balance': 'total_balance'}
+
+    @classmethod
+    def values(cls, queryset) -> models.QuerySet:
+        return super().values(queryset.with_balance())
+
+
+class TransactionListSerializer(ValuesListSerializer):
+    serializer_class = TransactionGetSerializer
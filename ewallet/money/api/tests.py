@@ -1,9 +1,51 @@
+import datetime
+import io
+import json
+import os
+import re
+import threading
+import time
+
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.test import (
+    AsyncClient,
+    TestCase,
+    TransactionTestCase,
+    modify_settings,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
-from rest_framework.test import APITestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
 from rest_framework.views import status
 
-from money.models import Wallet, Transaction
+from money import cache, intake, metrics
+from money.archive import archive_transactions
+from money.api import async_views
+from money.api.async_urls import urlpatterns as async_urlpatterns
+from money.api.urls import urlpatterns
+from money.api.serializers import (
+    TransactionGetSerializer,
+    TransactionListSerializer,
+    WalletGetSerializer,
+    WalletListSerializer,
+)
+from money.ledger import recompute_balances
+from money.models import (
+    ArchivedTransaction,
+    IdempotencyKey,
+    Wallet,
+    Transaction,
+    WalletDailyRollup,
+)
+from money.testing import FileDatabaseTestCase
 
 
 class WalletAPIView(APITestCase):
@@ -26,6 +68,34 @@ class WalletAPIView(APITestCase):
         self.assertEquals(first_wallet_data['balance'], wallet.balance)
         self.assertEquals(first_wallet_data['slug'], wallet.slug)
 
+    def test_get_after_update(self):
+        self.client.get(self.get_url)
+        wallet = Wallet.objects.first()
+        Wallet.objects.credit(wallet.pk, 10)
+        response = self.client.get(self.get_url)
+        self.assertEquals(response.json()[0]['balance'], 10)
+
+    def test_get_cache_stats(self):
+        url = reverse('money:get-wallet-stats',
+                      args=[Wallet.objects.first().slug])
+        self.client.get(url)
+        self.client.get(url)
+        response = self.client.get(reverse('money:get-cache-stats'))
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertGreaterEqual(response.json()['wallet_hits'], 1)
+
+    def test_balance_written_by_another_process(self):
+        wallet = Wallet.objects.first()
+        balance_url = reverse('money:get-wallet-balance', args=[wallet.slug])
+        self.client.get(self.get_url)
+        self.client.get(balance_url)
+        # The cache of this process is not invalidated.
+        Wallet.objects.filter(pk=wallet.pk).update(balance=F('balance') + 7)
+        self.assertEquals(self.client.get(balance_url).json()['balance'],
+                          wallet.balance + 7)
+        self.assertEquals(self.client.get(self.get_url).json()[0]['balance'],
+                          wallet.balance + 7)
+
     def test_get_zero_wallets(self):
         Wallet.objects.all().delete()
         response = self.client.get(self.get_url)
@@ -49,6 +119,20 @@ class WalletAPIView(APITestCase):
         self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEquals(Wallet.objects.count(), 1)
 
+    def test_create_reserved_slug(self):
+        for name in ('Bulk', 'transfer'):
+            response = self.client.post(self.create_url, data={'name': name},
+                                        format='json')
+            self.assertEquals(response.status_code,
+                              status.HTTP_400_BAD_REQUEST)
+        wallet = Wallet.objects.first()
+        response = self.client.put(
+            reverse('money:update-wallet', args=[wallet.slug]),
+            data={'name': 'Bulk'}, format='json'
+        )
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(Wallet.objects.count(), 1)
+
     def test_update(self):
         self.assertEquals(Wallet.objects.count(), 1)
         data = {'name': 'Wallet Updated'}
@@ -68,6 +152,65 @@ class WalletAPIView(APITestCase):
         self.assertEquals(response.status_code, status.HTTP_200_OK)
         self.assertEquals(Wallet.objects.count(), 0)
 
+    def test_get_balance(self):
+        wallet = Wallet.objects.first()
+        Transaction.objects.create(
+            wallet=wallet, transaction_type=Transaction.TYPE_INCOME,
+            amount=100
+        )
+        url = reverse('money:get-wallet-balance', args=[wallet.slug])
+        response = self.client.get(url)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.json()['balance'], wallet.balance)
+        response = self.client.get(url, {'at': '2000-01-01T00:00:00Z'})
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.json()['balance'], 0)
+        response = self.client.get(url, {'at': '3000-01-01T00:00:00'})
+        self.assertEquals(response.json()['balance'], 100)
+
+    def test_get_balance_invalid_at(self):
+        wallet = Wallet.objects.first()
+        url = reverse('money:get-wallet-balance', args=[wallet.slug])
+        response = self.client.get(url, {'at': 'yesterday'})
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class WalletStatsAPIView(APITestCase):
+
+    def setUp(self):
+        self.wallet = Wallet.objects.create(name='Wallet Test')
+        self.url = reverse('money:get-wallet-stats', args=[self.wallet.slug])
+        day = datetime.date(2021, 1, 1)
+        WalletDailyRollup.objects.bulk_create([
+            WalletDailyRollup(wallet=self.wallet, day=day, income=10,
+                              income_count=1),
+            WalletDailyRollup(wallet=self.wallet, day=day.replace(day=2),
+                              outcome=4, outcome_count=2),
+            WalletDailyRollup(wallet=self.wallet, day=day.replace(month=2),
+                              income=7, income_count=1),
+        ])
+
+    def test_day(self):
+        response = self.client.get(self.url, {'from': '2021-01-02'})
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals([row['period'] for row in response.json()['stats']],
+                          ['2021-01-02', '2021-02-01'])
+
+    def test_month(self):
+        response = self.client.get(
+            self.url, {'to': '2021-01-31', 'bucket': 'month'}
+        )
+        self.assertEquals(response.json()['stats'], [{
+            'period': '2021-01-01', 'income': 10, 'income_count': 1,
+            'outcome': 4, 'outcome_count': 2,
+        }])
+
+    def test_invalid(self):
+        response = self.client.get(self.url, {'from': '2021-13-01',
+                                              'bucket': 'year'})
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(set(response.json()), {'from', 'bucket'})
+
 
 class TransactionAPIView(APITestCase):
 
@@ -158,6 +301,22 @@ class TransactionAPIView(APITestCase):
             wallet.balance, wallet_balance_before + transaction.amount
         )
 
+    def test_create_hits_cache(self):
+        cache.get_cache().clear()
+        before = cache.stats()
+        data = {'wallet': 'Wallet Test', 'amount': 1,
+                'transaction_type': Transaction.TYPE_OUTCOME}
+        for _ in range(5):
+            response = self.client.post(self.create_url, data=data,
+                                        format='json')
+            self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        after = cache.stats()
+        self.assertEquals(
+            [after.get(key, 0) - before.get(key, 0)
+             for key in ('wallet_hits', 'wallet_misses')],
+            [4, 1]
+        )
+
     def test_create_outcome(self):
         self.assertEquals(Transaction.objects.count(), 1)
         wallet = Wallet.objects.first()
@@ -205,3 +364,1049 @@ class TransactionAPIView(APITestCase):
         )
         response = self.client.delete(delete_url)
         self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(MONEY_APPEND_ONLY_LEDGER=True)
+class ReversalAPIView(APITestCase):
+
+    def setUp(self):
+        self.wallet = Wallet.objects.create(name='Wallet Test', balance=30)
+        self.transaction = Transaction.objects.create(
+            wallet=self.wallet, transaction_type=Transaction.TYPE_OUTCOME,
+            amount=20
+        )
+        Transaction.objects.create(
+            wallet=self.wallet, transaction_type=Transaction.TYPE_INCOME,
+            amount=50
+        )
+        self.list_url = reverse('money:get-transactions-by-wallet',
+                                args=[self.wallet.slug])
+
+    def test_delete(self):
+        url = reverse('money:delete-transactions', args=[self.transaction.pk])
+        response = self.client.delete(url)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        reversal = Transaction.objects.get(pk=response.json()['reversal'])
+        self.assertEquals(reversal.reversal_of, self.transaction)
+        self.wallet.refresh_from_db()
+        self.assertEquals(self.wallet.balance, 50)
+        response = self.client.delete(url)
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(self.list_url)
+        self.assertEquals(
+            [row['reversal_of'] for row in response.json()],
+            [None, None, self.transaction.pk]
+        )
+        with self.assertNumQueries(3):
+            # The wallet version, reversals are a join on an index, the
+            # empty archive is probed once.
+            response = self.client.get(self.list_url,
+                                       {'reversals': 'exclude'})
+        self.assertEquals([row['amount'] for row in response.json()], [50])
+
+    def test_delete_wallet(self):
+        url = reverse('money:delete-wallet', args=[self.wallet.slug])
+        response = self.client.delete(url)
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(Transaction.objects.count(), 2)
+        empty = Wallet.objects.create(name='Empty')
+        response = self.client.delete(
+            reverse('money:delete-wallet', args=[empty.slug])
+        )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+
+
+class WalletBulkAPIView(APITestCase):
+
+    def setUp(self):
+        self.create_url = reverse('money:create-wallets-bulk')
+        Wallet.objects.create(name='Wallet Test')
+
+    def test_create(self):
+        data = [{'name': 'First'}, {'name': 'Wallet Test'},
+                {'name': 'first'}, {}]
+        response = self.client.post(self.create_url, data=data,
+                                    format='json')
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        body = response.json()
+        self.assertEquals((body['created'], body['conflicts']), (2, 2))
+        self.assertEquals(
+            [result['status'] for result in body['results']],
+            ['created', 'conflict', 'conflict', 'created']
+        )
+        self.assertEquals(body['results'][0]['slug'], 'first')
+        self.assertEquals(Wallet.objects.count(), 3)
+        response = self.client.get(reverse('money:get-wallets'))
+        self.assertEquals(len(response.json()), 3)
+
+    def test_invalid(self):
+        for name in ('x' * 101, 'Bulk'):
+            response = self.client.post(self.create_url,
+                                        data=[{'name': name}], format='json')
+            self.assertEquals(response.status_code,
+                              status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(Wallet.objects.count(), 1)
+
+
+class TransactionBulkAPIView(APITestCase):
+
+    def setUp(self):
+        self.create_url = reverse('money:create-transactions-bulk')
+        self.wallet = Wallet.objects.create(name='Wallet Test', balance=100)
+        self.other_wallet = Wallet.objects.create(name='Wallet Other')
+
+    def test_create(self):
+        data = [
+            {'wallet': self.wallet.name, 'amount': 150,
+             'transaction_type': Transaction.TYPE_OUTCOME},
+            {'wallet': self.other_wallet.name, 'amount': 10,
+             'transaction_type': Transaction.TYPE_INCOME},
+            {'wallet': self.wallet.name, 'amount': 100,
+             'transaction_type': Transaction.TYPE_INCOME, 'comment': 'Hi!'},
+            {'wallet': self.wallet.name, 'amount': 150,
+             'transaction_type': Transaction.TYPE_OUTCOME},
+            {'wallet': 'Unknown', 'amount': 1,
+             'transaction_type': Transaction.TYPE_INCOME},
+        ]
+        response = self.client.post(self.create_url, data=data, format='json')
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        response_json = response.json()
+        self.assertEquals(response_json['accepted'], 3)
+        self.assertEquals(response_json['rejected'], 2)
+        self.assertEquals(
+            [result['status'] for result in response_json['results']],
+            ['rejected', 'accepted', 'accepted', 'accepted', 'rejected']
+        )
+        self.wallet.refresh_from_db()
+        self.other_wallet.refresh_from_db()
+        self.assertEquals(self.wallet.balance, 50)
+        self.assertEquals(self.other_wallet.balance, 10)
+        self.assertEquals(
+            list(Transaction.objects.filter(wallet=self.wallet)
+                 .order_by('id').values_list('amount', 'comment')),
+            [(100, 'Hi!'), (150, '')]
+        )
+
+    def test_create_one_update_per_wallet(self):
+        data = [{'wallet': self.wallet.name, 'amount': 1,
+                 'transaction_type': Transaction.TYPE_INCOME}] * 50
+        with self.assertNumQueries(9):
+            # Wallets, savepoint, balance update, insert, daily rollup
+            # update, rollup insert in a savepoint, savepoint release.
+            response = self.client.post(self.create_url, data=data,
+                                        format='json')
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        self.wallet.refresh_from_db()
+        self.assertEquals(self.wallet.balance, 150)
+
+    def test_create_invalid(self):
+        data = [
+            {'wallet': self.wallet.name, 'amount': 10,
+             'transaction_type': Transaction.TYPE_INCOME},
+            {'wallet': self.wallet.name, 'amount': 10,
+             'transaction_type': 'gift'},
+        ]
+        response = self.client.post(self.create_url, data=data, format='json')
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(Transaction.objects.count(), 0)
+        self.wallet.refresh_from_db()
+        self.assertEquals(self.wallet.balance, 100)
+
+
+class TransferAPIView(APITestCase):
+
+    def setUp(self):
+        self.create_url = reverse('money:create-transfer')
+        self.source = Wallet.objects.create(name='Wallet Test', balance=100)
+        self.target = Wallet.objects.create(name='Wallet Other')
+
+    def test_create(self):
+        data = {'source': self.source.name, 'target': self.target.name,
+                'amount': 70, 'comment': 'Hi!'}
+        response = self.client.post(self.create_url, data=data, format='json')
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        outcome = Transaction.objects.get(pk=response.json()['outcome'])
+        income = Transaction.objects.get(pk=response.json()['income'])
+        self.assertEquals(outcome.wallet, self.source)
+        self.assertEquals(income.wallet, self.target)
+        self.assertEquals(income.comment, 'Hi!')
+        self.source.refresh_from_db()
+        self.target.refresh_from_db()
+        self.assertEquals(self.source.balance, 30)
+        self.assertEquals(self.target.balance, 70)
+
+    def test_create_insufficient(self):
+        data = {'source': self.source.name, 'target': self.target.name,
+                'amount': 101}
+        response = self.client.post(self.create_url, data=data, format='json')
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(Transaction.objects.count(), 0)
+
+    def test_create_invalid(self):
+        for data in [
+            {'source': self.source.name, 'target': self.source.name,
+             'amount': 1},
+            {'source': self.source.name, 'target': self.target.name,
+             'amount': 0},
+        ]:
+            response = self.client.post(self.create_url, data=data,
+                                        format='json')
+            self.assertEquals(response.status_code,
+                              status.HTTP_400_BAD_REQUEST)
+        data = {'source': self.source.name, 'target': 'Unknown', 'amount': 1}
+        response = self.client.post(self.create_url, data=data, format='json')
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.source.refresh_from_db()
+        self.assertEquals(self.source.balance, 100)
+
+
+class TransferConcurrencyAPIView(FileDatabaseTestCase):
+    """Opposing transfers of concurrent clients between two wallets."""
+    THREADS = 4
+    TRANSFERS = 30
+
+    def setUp(self):
+        self.wallets = [Wallet.objects.create(name=name, balance=1000)
+                        for name in ('Wallet A', 'Wallet B')]
+
+    def _worker(self, source, target, statuses):
+        client = APIClient(raise_request_exception=False)
+        data = {'source': source.name, 'target': target.name, 'amount': 1}
+        try:
+            for _ in range(self.TRANSFERS):
+                response = client.post(reverse('money:create-transfer'),
+                                       data=data, format='json')
+                statuses.append(response.status_code)
+        finally:
+            connection.close()
+
+    def test_no_errors(self):
+        statuses = []
+        first, second = self.wallets
+        threads = [
+            threading.Thread(target=self._worker,
+                             args=(first, second, statuses) if i % 2 == 0
+                             else (second, first, statuses))
+            for i in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEquals(statuses, [status.HTTP_201_CREATED]
+                          * self.THREADS * self.TRANSFERS)
+        for wallet in self.wallets:
+            wallet.refresh_from_db()
+        self.assertEquals([wallet.balance for wallet in self.wallets],
+                          [1000, 1000])
+        self.assertEquals(Transaction.objects.count(),
+                          2 * self.THREADS * self.TRANSFERS)
+
+
+class TransactionListAPIView(APITestCase):
+
+    def setUp(self):
+        self.get_url = reverse('money:get-transactions')
+        self.wallet = Wallet.objects.create(name='Wallet Test', balance=500)
+        Transaction.objects.bulk_create([
+            Transaction(wallet=self.wallet, amount=amount,
+                        transaction_type=Transaction.TYPE_INCOME)
+            for amount in range(1, 6)
+        ])
+        # Equal dates have to be ordered by id.
+        Transaction.objects.filter(amount__in=[2, 3, 4]).update(
+            data=Transaction.objects.get(amount=2).data
+        )
+
+    def test_pages(self):
+        amounts = []
+        url = self.get_url + '?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEquals(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.json()), 2)
+            amounts += [item['amount'] for item in response.json()]
+            link = response.get('Link')
+            url = link[1:link.index('>')] if link else None
+        self.assertEquals(amounts, [1, 2, 3, 4, 5])
+
+    def test_pages_by_wallet(self):
+        url = reverse('money:get-transactions-by-wallet',
+                      args=[self.wallet.slug])
+        response = self.client.get(url, {'page_size': 3})
+        self.assertEquals(
+            [item['amount'] for item in response.json()], [1, 2, 3]
+        )
+        self.assertIn('rel="next"', response['Link'])
+
+    def test_last_page(self):
+        response = self.client.get(self.get_url, {'page_size': 5})
+        self.assertEquals(len(response.json()), 5)
+        self.assertFalse(response.has_header('Link'))
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.get_url, {'cursor': 'invalid'})
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def amounts(self, params: dict) -> list:
+        amounts = []
+        url = self.get_url
+        while url:
+            response = self.client.get(url, params)
+            self.assertEquals(response.status_code, status.HTTP_200_OK)
+            amounts += [item['amount'] for item in response.json()]
+            link = response.get('Link')
+            url = link[1:link.index('>')] if link else None
+            params = {}
+        return amounts
+
+    def test_filters(self):
+        self.assertEquals(
+            self.amounts({'min_amount': 2, 'max_amount': 4}), [2, 3, 4]
+        )
+        self.assertEquals(self.amounts({'transaction_type': 'outcome'}), [])
+        today = timezone.localdate()
+        self.assertEquals(self.amounts({'to': today.isoformat()}),
+                          [1, 2, 3, 4, 5])
+        self.assertEquals(
+            self.amounts({'to': (today - datetime.timedelta(days=1))
+                          .isoformat()}), []
+        )
+        start = Transaction.objects.get(amount=2).data
+        self.assertEquals(
+            self.amounts({'from': start.isoformat(),
+                          'to': start.isoformat(), 'page_size': 1}),
+            [2, 3, 4]
+        )
+
+    def test_ordering(self):
+        for ordering in ('-amount', '-data'):
+            self.assertEquals(
+                self.amounts({'ordering': ordering, 'page_size': 2}),
+                [5, 4, 3, 2, 1]
+            )
+        Transaction.objects.filter(amount=5).update(amount=1)
+        self.assertEquals(
+            self.amounts({'ordering': 'amount', 'page_size': 1}),
+            [1, 1, 2, 3, 4]
+        )
+
+    def test_invalid_filters(self):
+        response = self.client.get(self.get_url, {
+            'from': '2021-13-01', 'min_amount': 'x',
+            'transaction_type': 'gift', 'ordering': 'comment',
+        })
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(
+            set(response.json()),
+            {'from', 'min_amount', 'transaction_type'}
+        )
+        response = self.client.get(self.get_url, {'ordering': 'comment'})
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_stream(self):
+        response = self.client.get(self.get_url, {'stream': 'ndjson'})
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).splitlines()
+        paginated = self.client.get(self.get_url).json()
+        self.assertEquals([json.loads(line) for line in lines], paginated)
+
+
+class AsyncAPIView(FileDatabaseTestCase):
+    """Reads run in other threads, so data has to be committed."""
+
+    def setUp(self):
+        # Flushes between the tests don't drop cached wallets.
+        cache.get_cache().clear()
+        self.client = AsyncClient()
+        self.wallet = Wallet.objects.create(name='Wallet Test', balance=100)
+        Transaction.objects.create(
+            wallet=self.wallet, transaction_type=Transaction.TYPE_INCOME,
+            amount=100
+        )
+
+    async def test_get_wallets(self):
+        response = await self.client.get(reverse('money_async:wallets'))
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.json()[0]['name'], 'Wallet Test')
+
+    async def test_create_wallet(self):
+        response = await self.client.post(
+            reverse('money_async:wallets'), data={'name': 'Wallet Async'},
+            content_type='application/json'
+        )
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+
+    async def test_get_transactions(self):
+        url = reverse('money_async:transactions-by-wallet',
+                      args=[self.wallet.slug])
+        response = await self.client.get(url)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.json()[0]['amount'], 100)
+        response = await self.client.get(url + '?cursor=invalid')
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = await self.client.get(
+            reverse('money_async:transactions-by-wallet', args=['missing'])
+        )
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_read_section_closes_old_connection(self):
+        def expire():
+            wrapper = connections['default']
+            Wallet.objects.exists()
+            # As if ``CONN_MAX_AGE`` had passed.
+            wrapper.close_at = time.monotonic()
+            return wrapper
+
+        wrapper = await async_views.read_section(expire)()
+        self.assertIsNone(wrapper.connection)
+
+    async def test_create_transaction(self):
+        data = {'wallet': self.wallet.name, 'amount': 150,
+                'transaction_type': Transaction.TYPE_OUTCOME}
+        url = reverse('money_async:transactions')
+        response = await self.client.post(url, data=data,
+                                          content_type='application/json')
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        data['amount'] = 50
+        response = await self.client.post(url, data=data,
+                                          content_type='application/json')
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+
+
+@override_settings(MONEY_GROUP_COMMIT=True)
+class GroupCommitAPIView(FileDatabaseTestCase):
+    """Transactions are committed by the writer thread."""
+
+    def setUp(self):
+        # Flushes between the tests don't drop cached wallets.
+        cache.get_cache().clear()
+        self.create_url = reverse('money:create-transaction')
+        self.wallet = Wallet.objects.create(name='Wallet Test', balance=10)
+        self.addCleanup(intake.reset)
+
+    def post(self, transaction_type: str, amount: int, **headers):
+        data = {'wallet': self.wallet.name, 'amount': amount,
+                'transaction_type': transaction_type}
+        return self.client.post(self.create_url, data=data,
+                                content_type='application/json', **headers)
+
+    def test_create(self):
+        response = self.post(Transaction.TYPE_OUTCOME, 4)
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        response = self.post(Transaction.TYPE_OUTCOME, 7)
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.post(Transaction.TYPE_INCOME, 1,
+                             HTTP_IDEMPOTENCY_KEY='key')
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        self.wallet.refresh_from_db()
+        self.assertEquals(self.wallet.balance, 7)
+        self.assertEquals(Transaction.objects.count(), 2)
+
+    def test_concurrent_credit(self):
+        self.post(Transaction.TYPE_OUTCOME, 4)
+        cache.get_wallet('name', self.wallet.name)
+        self.addCleanup(cache.get_cache().clear)
+        # A credit of another worker doesn't reach the wallet cache.
+        Wallet.objects.filter(pk=self.wallet.pk).update(
+            balance=F('balance') + 50, version=F('version') + 1
+        )
+        response = self.post(Transaction.TYPE_OUTCOME, 30)
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        self.wallet.refresh_from_db()
+        self.assertEquals(self.wallet.balance, 26)
+
+    @override_settings(MONEY_GROUP_COMMIT_TIMEOUT=0.1)
+    def test_commit_timeout(self):
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            # Another writer keeps the wallet locked, the commit waits.
+            try:
+                with transaction.atomic():
+                    Wallet.objects.filter(pk=self.wallet.pk).update(
+                        version=F('version') + 1
+                    )
+                    locked.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        self.assertTrue(locked.wait(5))
+        try:
+            response = self.post(Transaction.TYPE_INCOME, 1)
+        finally:
+            release.set()
+            thread.join()
+        self.assertEquals(response.status_code,
+                          status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+class ListSerializerTestCase(TestCase):
+
+    def setUp(self):
+        wallet = Wallet.objects.create(name='Кошелёк \u2028', balance=10)
+        Wallet.objects.create(name='Wallet Test')
+        Transaction.objects.create(
+            wallet=wallet, transaction_type=Transaction.TYPE_INCOME,
+            amount=10, comment='Привет "world"\n'
+        )
+        Transaction.objects.create(
+            wallet=wallet, transaction_type=Transaction.TYPE_OUTCOME
+        )
+
+    def test_wallets(self):
+        wallets = Wallet.objects.all()
+        renderer = JSONRenderer()
+        self.assertEquals(
+            renderer.render(WalletListSerializer(wallets).data),
+            renderer.render(WalletGetSerializer(wallets, many=True).data)
+        )
+
+    def test_transactions(self):
+        transactions = Transaction.objects.all()
+        renderer = JSONRenderer()
+        self.assertEquals(
+            renderer.render(TransactionListSerializer(transactions).data),
+            renderer.render(
+                TransactionGetSerializer(transactions, many=True).data
+            )
+        )
+
+    def test_transactions_in_timezone(self):
+        with timezone.override('Europe/Moscow'):
+            self.test_transactions()
+
+
+class ConditionalGetAPIView(APITestCase):
+
+    def setUp(self):
+        self.wallet = Wallet.objects.create(name='Wallet Test', balance=100)
+        self.wallets_url = reverse('money:get-wallets')
+        self.transactions_url = reverse('money:get-transactions-by-wallet',
+                                        args=[self.wallet.slug])
+
+    def assertNotModified(self, url, etag, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code,
+                          status.HTTP_304_NOT_MODIFIED)
+        self.assertEquals(response['ETag'], etag)
+
+    def assertModified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertNotEquals(response['ETag'], etag)
+
+    def test_wallets(self):
+        etag = self.client.get(self.wallets_url)['ETag']
+        # One aggregate of the wallet versions, no list.
+        self.assertNotModified(self.wallets_url, etag, 1)
+        response = self.client.get(self.wallets_url,
+                                   HTTP_IF_NONE_MATCH='W/' + etag)
+        self.assertEquals(response.status_code,
+                          status.HTTP_304_NOT_MODIFIED)
+        self.wallet.name = 'Renamed'
+        self.wallet.save()
+        self.assertModified(self.wallets_url, etag)
+
+    def test_transactions(self):
+        etag = self.client.get(self.transactions_url)['ETag']
+        # One read of the wallet version, no page.
+        self.assertNotModified(self.transactions_url, etag, 1)
+        transaction, _ = Transaction(
+            wallet=self.wallet, transaction_type=Transaction.TYPE_OUTCOME,
+            amount=10
+        ).provide_transaction()
+        transaction.save()
+        self.assertModified(self.transactions_url, etag)
+        etag = self.client.get(self.transactions_url)['ETag']
+        transaction.delete()
+        self.assertModified(self.transactions_url, etag)
+
+    def test_write_of_another_process(self):
+        """Writes that bypass the cache of this process change the ETags."""
+        wallets_etag = self.client.get(self.wallets_url)['ETag']
+        etag = self.client.get(self.transactions_url)['ETag']
+        Wallet.objects.filter(pk=self.wallet.pk) \
+            .update(version=F('version') + 1)
+        Transaction.objects.bulk_create([Transaction(
+            wallet=self.wallet, transaction_type=Transaction.TYPE_INCOME,
+            amount=1
+        )])
+        self.assertModified(self.transactions_url, etag)
+        self.assertModified(self.wallets_url, wallets_etag)
+
+    def test_same_in_every_process(self):
+        etag = self.client.get(self.wallets_url)['ETag']
+        cache.get_cache().clear()
+        self.assertNotModified(self.wallets_url, etag, 1)
+
+    def test_query_params(self):
+        etag = self.client.get(self.transactions_url)['ETag']
+        self.assertModified(self.transactions_url + '?page_size=1', etag)
+
+    def test_missing_wallet(self):
+        url = reverse('money:get-transactions-by-wallet', args=['missing'])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='*')
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ShardedWalletAPIView(APITestCase):
+
+    def setUp(self):
+        self.wallet = Wallet.objects.create(name='Wallet Test')
+        Wallet.objects.shard(self.wallet.pk, 4)
+        self.data = {'wallet': self.wallet.name, 'amount': 10,
+                     'transaction_type': Transaction.TYPE_INCOME}
+        self.client.post(reverse('money:create-transaction'),
+                         data=self.data, format='json')
+
+    def test_balance(self):
+        response = self.client.get(reverse('money:get-wallet-balance',
+                                           args=[self.wallet.slug]))
+        self.assertEquals(response.json()['balance'], 10)
+        response = self.client.get(reverse('money:get-wallets'))
+        self.assertEquals(response.json()[0]['balance'], 10)
+
+    def test_etag(self):
+        url = reverse('money:get-transactions-by-wallet',
+                      args=[self.wallet.slug])
+        etag = self.client.get(url)['ETag']
+        self.client.post(reverse('money:create-transaction'),
+                         data=self.data, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(len(response.json()), 2)
+
+    def test_bulk_debit(self):
+        response = self.client.post(
+            reverse('money:create-transactions-bulk'),
+            data=[dict(self.data, transaction_type=Transaction.TYPE_OUTCOME,
+                       amount=5)],
+            format='json'
+        )
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        self.assertEquals(response.json()['results'][0]['status'],
+                          'accepted')
+        self.wallet.refresh_from_db()
+        self.assertEquals(self.wallet.total_balance(), 5)
+
+
+class ArchiveAPIView(APITestCase):
+
+    def setUp(self):
+        self.wallet = Wallet.objects.create(name='Wallet Test')
+        now = timezone.now()
+        for days in (400, 300, 200, 10, 0):
+            transaction_, _ = Transaction(
+                wallet=self.wallet, transaction_type=Transaction.TYPE_INCOME,
+                amount=days
+            ).provide_transaction()
+            transaction_.data = now - datetime.timedelta(days=days)
+            transaction_.save()
+        archive_transactions(now - datetime.timedelta(days=100))
+        self.url = reverse('money:get-transactions-by-wallet',
+                           args=[self.wallet.slug])
+
+    def amounts(self, url, params):
+        amounts = []
+        while url:
+            response = self.client.get(url, params)
+            params = None
+            amounts += [item['amount'] for item in response.json()]
+            link = response.get('Link')
+            url = link[1:link.index('>')] if link else None
+        return amounts
+
+    def test_pages(self):
+        self.assertEquals(ArchivedTransaction.objects.count(), 3)
+        self.assertEquals(self.amounts(self.url, {'page_size': 2}),
+                          [400, 300, 200, 10, 0])
+        self.assertEquals(
+            self.amounts(reverse('money:get-transactions'),
+                         {'page_size': 2, 'ordering': '-amount'}),
+            [400, 300, 200, 10, 0]
+        )
+
+    def test_recent_page_skips_archive(self):
+        params = {'page_size': 1, 'ordering': '-data'}
+        self.client.get(self.url, params)
+        with self.assertNumQueries(3):
+            # The wallet version, the page and the archive date, no
+            # archived rows.
+            response = self.client.get(self.url, params)
+        self.assertEquals([item['amount'] for item in response.json()], [0])
+        self.assertEquals(self.amounts(self.url, params),
+                          [0, 10, 200, 300, 400])
+
+    def test_range_after_archive(self):
+        response = self.client.get(self.url, {
+            'from': (timezone.now() - datetime.timedelta(days=50))
+            .isoformat()
+        })
+        self.assertEquals([item['amount'] for item in response.json()],
+                          [10, 0])
+
+    def test_stream(self):
+        response = self.client.get(self.url, {'stream': 'ndjson'})
+        rows = [json.loads(line) for line
+                in b''.join(response.streaming_content).splitlines()]
+        self.assertEquals([row['amount'] for row in rows],
+                          [400, 300, 200, 10, 0])
+
+
+class IdempotencyAPIView(APITestCase):
+
+    def setUp(self):
+        self.create_url = reverse('money:create-transaction')
+        self.wallet = Wallet.objects.create(name='Wallet Test', balance=100)
+        self.data = {'wallet': self.wallet.name, 'amount': 60,
+                     'transaction_type': Transaction.TYPE_OUTCOME}
+
+    def post(self, data, key='key-1', url=None):
+        return self.client.post(url or self.create_url, data=data,
+                                format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay(self):
+        response = self.post(self.data)
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        response = self.post(self.data)
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        self.assertEquals(response['Idempotent-Replayed'], 'true')
+        self.assertEquals(Transaction.objects.count(), 1)
+        self.wallet.refresh_from_db()
+        self.assertEquals(self.wallet.balance, 40)
+
+    def test_replay_error(self):
+        self.data['amount'] = 1000
+        response = self.post(self.data)
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        Wallet.objects.credit(self.wallet.pk, 1000)
+        response = self.post(self.data)
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(Transaction.objects.count(), 0)
+
+    def test_different_keys(self):
+        self.post(self.data, key='key-1')
+        response = self.post(self.data, key='key-2')
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(Transaction.objects.count(), 1)
+
+    def test_reused_key(self):
+        self.post(self.data)
+        self.data['amount'] = 10
+        response = self.post(self.data)
+        self.assertEquals(response.status_code, 422)
+        self.assertEquals(Transaction.objects.count(), 1)
+
+    def test_expired_key(self):
+        self.data['amount'] = 10
+        self.post(self.data)
+        IdempotencyKey.objects.update(
+            created=timezone.now() - datetime.timedelta(days=2)
+        )
+        response = self.post(self.data)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEquals(Transaction.objects.count(), 2)
+        call_command('purge_idempotency_keys', stdout=io.StringIO())
+        self.assertEquals(IdempotencyKey.objects.count(), 1)
+
+    def test_bulk(self):
+        url = reverse('money:create-transactions-bulk')
+        first = self.post([self.data, self.data], url=url)
+        second = self.post([self.data, self.data], url=url)
+        self.assertEquals(first.json(), second.json())
+        self.assertEquals(second['Idempotent-Replayed'], 'true')
+        self.assertEquals(Transaction.objects.count(), 1)
+
+
+@modify_settings(MIDDLEWARE={'prepend': 'money.metrics.MetricsMiddleware'})
+class MetricsAPIView(APITestCase):
+
+    def setUp(self):
+        metrics.registry.reset()
+        self.wallet = Wallet.objects.create(name='Wallet Test')
+
+    def test_metrics(self):
+        data = {'wallet': self.wallet.name, 'amount': 10,
+                'transaction_type': Transaction.TYPE_INCOME}
+        response = self.client.post(reverse('money:create-transaction'),
+                                    data=data, format='json')
+        self.assertFalse(response.has_header('Server-Timing'))
+        response = self.client.get(reverse('money:get-metrics'))
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        labels = 'method="POST",endpoint="/api/money/transactions"'
+        lines = response.content.decode().splitlines()
+        self.assertIn(
+            'ewallet_http_requests_total{{{},status="201"}} 1'.format(labels),
+            lines
+        )
+        self.assertIn(
+            'ewallet_http_request_duration_seconds_count{{{}}} 1'
+            .format(labels), lines
+        )
+        queries = [line for line in lines if line.startswith(
+            'ewallet_db_queries_per_request_sum{{{}}}'.format(labels)
+        )]
+        self.assertEquals(len(queries), 1)
+        self.assertGreater(int(queries[0].split()[-1]), 1)
+
+    @override_settings(MONEY_SERVER_TIMING=True)
+    def test_server_timing(self):
+        response = self.client.get(reverse('money:get-wallets'))
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^db;dur=[0-9.]+;desc="[0-9]+ queries", app;dur=[0-9.]+$'
+        )
+
+    def test_histogram(self):
+        histogram = metrics.Histogram((1, 2))
+        for value in (0, 1, 2, 3):
+            histogram.observe(value)
+        self.assertEquals(list(histogram.samples('h', 'a="b"')), [
+            'h_bucket{a="b",le="1"} 2',
+            'h_bucket{a="b",le="2"} 3',
+            'h_bucket{a="b",le="+Inf"} 4',
+            'h_sum{a="b"} 6',
+            'h_count{a="b"} 4',
+        ])
+
+
+class QueryCountMixin:
+    """Guards the number of SQL queries of endpoints.
+
+    Each endpoint is requested over databases of ``sizes`` wallets with
+    as many transactions each, with a cold wallet cache. Its query count
+    must not change with the size and its normalized SQL must match
+    ``query_baselines.json``. Run with ``MONEY_UPDATE_QUERY_BASELINES=1``
+    to rewrite the baselines after an intended change.
+    """
+    sizes = (2, 20)
+    baselines_path = os.path.join(os.path.dirname(__file__),
+                                  'query_baselines.json')
+
+    @staticmethod
+    def seed(size: int) -> list:
+        Wallet.objects.provision(
+            ['Wallet {}'.format(index) for index in range(size)]
+        )
+        wallets = list(Wallet.objects.order_by('pk'))
+        Transaction.objects.bulk_create(
+            Transaction(wallet=wallet, amount=100,
+                        transaction_type=Transaction.TYPE_INCOME)
+            for wallet in wallets for _ in range(size)
+        )
+        recompute_balances([wallet.pk for wallet in wallets])
+        return wallets
+
+    @staticmethod
+    def normalize(sql: str) -> str:
+        """Replaces literals, parameters and savepoint names with ``?``."""
+        sql = re.sub(r'"s\d+_x\d+"', '?', sql)
+        sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+        sql = sql.replace('%s', '?')
+        return re.sub(r'\b\d+\b', '?', sql)
+
+    @staticmethod
+    def explain(expected: list, actual: list) -> str:
+        lines = ['Expected:'] + expected + ['Actual:'] + actual
+        return '\n'.join(lines)
+
+    def check_scenarios(self, scenarios: dict, names: set):
+        """Records `scenarios` and compares them with the baselines.
+
+        `names` are the URL names which must all have a scenario, the
+        first word of a scenario name is its URL name.
+        """
+        missing = names - {name.split()[0] for name in scenarios}
+        self.assertFalse(missing, 'Endpoints without a scenario.')
+        with open(self.baselines_path) as file:
+            baselines = json.load(file)
+
+        update = os.getenv('MONEY_UPDATE_QUERY_BASELINES')
+        for name, scenario in sorted(scenarios.items()):
+            with self.subTest(endpoint=name):
+                small, large = (self.record(scenario, size)
+                                for size in self.sizes)
+                self.assertEquals(
+                    len(small), len(large),
+                    'Queries grow with rows.\n'
+                    + self.explain(small, large)
+                )
+                if update:
+                    baselines[name] = large
+                    continue
+                baseline = baselines.get(name, [])
+                self.assertEquals(
+                    baseline, large,
+                    'Queries differ from the baseline.\n'
+                    + self.explain(baseline, large)
+                )
+
+        if update:
+            with open(self.baselines_path, 'w') as file:
+                json.dump(baselines, file, indent=2, sort_keys=True)
+                file.write('\n')
+
+
+class QueryCountAPIView(QueryCountMixin, APITestCase):
+    """Guards the queries of every ``money`` endpoint."""
+
+    @staticmethod
+    def scenarios() -> dict:
+        """Returns a function per URL name building its request.
+
+        Functions take the seeded wallets and return the method, path and
+        JSON body of a request. Payloads don't grow with the size.
+        """
+        def get(name, slug=False):
+            return lambda wallets: (
+                'GET', reverse(name, args=[wallets[0].slug] if slug else []),
+                None
+            )
+
+        def delete_transaction(wallets):
+            transaction_ = Transaction.objects.filter(wallet=wallets[0]) \
+                .first()
+            return 'DELETE', reverse('money:delete-transactions',
+                                     args=[transaction_.pk]), None
+
+        def transaction_data(wallet, amount=10):
+            return {'wallet': wallet.name, 'amount': amount,
+                    'transaction_type': Transaction.TYPE_INCOME}
+
+        return {
+            'get-wallets': get('money:get-wallets'),
+            'create-wallet': lambda wallets: (
+                'POST', reverse('money:create-wallet'), {'name': 'New'}
+            ),
+            'create-wallets-bulk': lambda wallets: (
+                'POST', reverse('money:create-wallets-bulk'),
+                [{'name': 'New 1'}, {'name': 'New 2'}, {'name': 'New 2'}]
+            ),
+            'update-wallet': lambda wallets: (
+                'PUT', reverse('money:update-wallet', args=[wallets[0].slug]),
+                {'name': 'Renamed'}
+            ),
+            'delete-wallet': lambda wallets: (
+                'DELETE',
+                reverse('money:delete-wallet', args=[wallets[0].slug]), None
+            ),
+            'get-wallet-balance': get('money:get-wallet-balance', slug=True),
+            'get-wallet-stats': get('money:get-wallet-stats', slug=True),
+            'get-transactions': get('money:get-transactions'),
+            'get-transactions-by-wallet': get(
+                'money:get-transactions-by-wallet', slug=True
+            ),
+            'delete-transactions': delete_transaction,
+            'create-transaction': lambda wallets: (
+                'POST', reverse('money:create-transaction'),
+                transaction_data(wallets[0])
+            ),
+            'create-transactions-bulk': lambda wallets: (
+                'POST', reverse('money:create-transactions-bulk'),
+                [transaction_data(wallets[0]), transaction_data(wallets[1]),
+                 transaction_data(wallets[0], 5)]
+            ),
+            'create-transfer': lambda wallets: (
+                'POST', reverse('money:create-transfer'),
+                {'source': wallets[0].name, 'target': wallets[1].name,
+                 'amount': 10}
+            ),
+            'get-cache-stats': get('money:get-cache-stats'),
+            'get-metrics': get('money:get-metrics'),
+        }
+
+    def record(self, scenario, size: int) -> list:
+        """Returns the SQL of the request of `scenario` at `size`."""
+        with transaction.atomic():
+            method, path, data = scenario(self.seed(size))
+            cache.get_cache().clear()
+            with CaptureQueriesContext(connection) as queries:
+                getattr(self.client, method.lower())(path, data=data,
+                                                     format='json')
+            transaction.set_rollback(True)
+        return [self.normalize(query['sql']) for query in queries]
+
+    def test_query_counts(self):
+        self.check_scenarios(
+            self.scenarios(), {pattern.name for pattern in urlpatterns}
+        )
+
+
+class AsyncQueryCountAPIView(QueryCountMixin, TransactionTestCase):
+    """Guards the queries of every ``money_async`` endpoint.
+
+    Reads run in other threads with their own connections, so the data
+    is committed and the queries of every new connection are recorded.
+    """
+
+    @staticmethod
+    def scenarios() -> dict:
+        """Returns a function per URL name and method building a request.
+
+        Functions take the seeded wallets and return the method, path and
+        JSON body of a request. Payloads don't grow with the size.
+        """
+        return {
+            'money_async:wallets GET': lambda wallets: (
+                'GET', reverse('money_async:wallets'), None
+            ),
+            'money_async:wallets POST': lambda wallets: (
+                'POST', reverse('money_async:wallets'), {'name': 'New'}
+            ),
+            'money_async:transactions GET': lambda wallets: (
+                'GET', reverse('money_async:transactions'), None
+            ),
+            'money_async:transactions POST': lambda wallets: (
+                'POST', reverse('money_async:transactions'),
+                {'wallet': wallets[0].name, 'amount': 10,
+                 'transaction_type': Transaction.TYPE_INCOME}
+            ),
+            'money_async:transactions-by-wallet GET': lambda wallets: (
+                'GET', reverse('money_async:transactions-by-wallet',
+                               args=[wallets[0].slug]), None
+            ),
+        }
+
+    def record(self, scenario, size: int) -> list:
+        """Returns the SQL of the request of `scenario` at `size`."""
+        method, path, data = scenario(self.seed(size))
+        cache.get_cache().clear()
+        queries = []
+
+        def recorder(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        def wrap(sender, connection, **kwargs):
+            connection.execute_wrappers.append(recorder)
+
+        async def request():
+            return await AsyncClient().generic(
+                method, path, json.dumps(data) if data else '',
+                content_type='application/json'
+            )
+
+        connection_created.connect(wrap)
+        try:
+            with connection.execute_wrapper(recorder):
+                async_to_sync(request)()
+        finally:
+            connection_created.disconnect(wrap)
+            call_command('flush', verbosity=0, interactive=False)
+        return [self.normalize(sql) for sql in queries]
+
+    def test_query_counts(self):
+        self.check_scenarios(
+            self.scenarios(),
+            {'money_async:' + pattern.name for pattern in async_urlpatterns}
+        )
@@ -1,6 +1,11 @@
 from django.urls import path
 
-from money.api.views import WalletView, TransactionView
+from money.api.views import (
+    WalletView,
+    TransactionView,
+    get_cache_stats,
+    get_metrics,
+)
 
 
 app_name = 'money'
@@ -8,12 +13,23 @@ app_name = 'money'
 urlpatterns = [
     path('wallets', WalletView.as_view(), name='get-wallets'),
     path('wallets', WalletView.as_view(), name='create-wallet'),
+    path('wallets/bulk', WalletView.post_bulk, name='create-wallets-bulk'),
     path('wallets/<str:slug>', WalletView.as_view(), name='update-wallet'),
     path('wallets/<str:slug>', WalletView.as_view(), name='delete-wallet'),
+    path('wallets/<str:slug>/balance', WalletView.get_balance,
+         name='get-wallet-balance'),
+    path('wallets/<str:slug>/stats', WalletView.get_stats,
+         name='get-wallet-stats'),
     path('transactions', TransactionView.as_view(), name='get-transactions'),
     path('transactions/<int:id>', TransactionView.as_view(),
          name='delete-transactions'),
+    path('transactions/bulk', TransactionView.post_bulk,
+         name='create-transactions-bulk'),
+    path('transactions/transfer', TransactionView.post_transfer,
+         name='create-transfer'),
     path('transactions/<str:wallet_slug>', TransactionView.get_by_wallet,
          name='get-transactions-by-wallet'),
     path('transactions', TransactionView.as_view(), name='create-transaction'),
+    path('cache/stats', get_cache_stats, name='get-cache-stats'),
+    path('metrics', get_metrics, name='get-metrics'),
 ]
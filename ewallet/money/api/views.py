@@ -1,28 +1,388 @@
 """Module with API views."""
-from django.db import transaction as transaction_decorators, utils
+import datetime
+import hashlib
+import heapq
+import json
+from concurrent import futures
+
+from django.conf import settings
+from django.db import (
+    connection as db_connection,
+    transaction as transaction_decorators,
+    utils,
+)
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import parse_etags, quote_etag
 from rest_framework import status
 from rest_framework.decorators import api_view
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from money.models import Wallet, Transaction
+from money import intake
+from money.cache import (
+    get_wallet,
+    stats as cache_stats,
+)
+from money.metrics import registry as metrics_registry
+from money.models import (
+    ArchivedTransaction,
+    IdempotencyKey,
+    Wallet,
+    Transaction,
+)
+from money.api.pagination import TransactionKeysetPagination
 from money.api.serializers import (
-    WalletGetSerializer,
+    WalletBulkCreateSerializer,
     WalletCreateUpdateSerializer,
-    TransactionGetSerializer,
+    WalletListSerializer,
     TransactionCreateUpdateSerializer,
+    TransactionBulkCreateSerializer,
+    TransactionListSerializer,
+    TransferSerializer,
 )
 
 
+BULK_TRANSACTIONS_LIMIT = getattr(
+    settings, 'MONEY_BULK_TRANSACTIONS_LIMIT', 50000
+)
+BULK_WALLETS_LIMIT = getattr(settings, 'MONEY_BULK_WALLETS_LIMIT', 10000)
+STREAM_CHUNK_SIZE = getattr(settings, 'MONEY_STREAM_CHUNK_SIZE', 2000)
+IDEMPOTENCY_TTL = getattr(settings, 'MONEY_IDEMPOTENCY_TTL', 86400)
+IDEMPOTENCY_KEY_MAX_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+
+def parse_bound(value: str) -> (datetime.datetime, bool):
+    """Parses an ISO 8601 datetime or date `value` of a ``data`` range.
+
+    A date is parsed as the start of its day. Returns the datetime, or
+    ``None`` for invalid values, and whether `value` is a date.
+    """
+    try:
+        day = parse_date(value)
+        bound = parse_datetime(value) if day is None else \
+            datetime.datetime.combine(day, datetime.time())
+    except ValueError:
+        return None, False
+    if bound is not None and timezone.is_naive(bound):
+        bound = timezone.make_aware(bound)
+    return bound, day is not None
+
+
+def filter_transactions(request, transactions):
+    """Applies the query parameters of a listing to `transactions`.
+
+        * ``from``, ``to``: range of `data`, ISO 8601 datetimes or dates
+          (a `to` date includes its day)
+        * ``transaction_type``: ``income`` or ``outcome``
+        * ``min_amount``, ``max_amount``: inclusive range of `amount`
+        * ``reversals=exclude``: drop reversed transactions and their
+          reversals, following the unique `reversal_of` index both ways
+
+    All filters are conditions of the listing query. Raises
+    ``ValidationError`` for invalid values.
+    """
+    params = request.query_params
+    filters = {}
+    errors = {}
+    for param in ('from', 'to'):
+        if param not in params:
+            continue
+        bound, is_date = parse_bound(params[param])
+        if bound is None:
+            errors[param] = 'Enter a valid ISO 8601 date or datetime.'
+        elif param == 'from':
+            filters['data__gte'] = bound
+        elif is_date:
+            filters['data__lt'] = bound + datetime.timedelta(days=1)
+        else:
+            filters['data__lte'] = bound
+    if 'transaction_type' in params:
+        filters['transaction_type'] = params['transaction_type']
+        if filters['transaction_type'] not in dict(Transaction.TYPE_CHOICES):
+            errors['transaction_type'] = 'Choose one of: {}.'.format(
+                ', '.join(dict(Transaction.TYPE_CHOICES))
+            )
+    for param, lookup in (('min_amount', 'amount__gte'),
+                          ('max_amount', 'amount__lte')):
+        if param in params:
+            try:
+                filters[lookup] = int(params[param])
+            except ValueError:
+                errors[param] = 'A valid integer is required.'
+    if errors:
+        raise ValidationError(errors)
+    if params.get('reversals') == 'exclude':
+        filters.update(reversal_of__isnull=True, reversal__isnull=True)
+    return transactions.filter(**filters)
+
+
+def list_transactions(request, transactions, archived=None):
+    """Returns a page of `transactions` or streams all of them.
+
+    With ``?stream=ndjson`` every transaction is rendered as a JSON line
+    while rows are fetched in chunks, so memory stays flat for exports.
+    Otherwise a keyset-paginated list is returned. The matching `archived`
+    transactions are merged in where the requested range reaches them.
+    """
+    transactions = filter_transactions(request, transactions)
+    if archived is not None:
+        archived = filter_transactions(request, archived)
+    if request.query_params.get('stream') == 'ndjson':
+        renderer = JSONRenderer()
+        ordering = TransactionKeysetPagination.get_ordering(request)
+        sources = [transactions]
+        if archived is not None and archived.boundary() is not None:
+            sources.append(archived)
+        rows = heapq.merge(
+            *(TransactionListSerializer.values(source).order_by(*ordering)
+              .iterator(chunk_size=STREAM_CHUNK_SIZE) for source in sources),
+            key=lambda row: (getattr(row, ordering[0].lstrip('-')), row.id),
+            reverse=ordering[0].startswith('-')
+        )
+        lines = (
+            renderer.render(transaction) + b'\n'
+            for transaction in TransactionListSerializer(rows)
+        )
+        return StreamingHttpResponse(lines,
+                                     content_type='application/x-ndjson')
+    data, headers = paginate_transactions(request, transactions, archived)
+    return Response(data, headers=headers)
+
+
+def paginate_transactions(request, transactions,
+                          archived=None) -> (list, dict):
+    """Returns a serialized page of `transactions` and its headers."""
+    paginator = TransactionKeysetPagination()
+    if archived is not None:
+        archived = TransactionListSerializer.values(archived)
+    page = paginator.paginate_queryset(
+        TransactionListSerializer.values(transactions), request, archived
+    )
+    return TransactionListSerializer(page).data, paginator.get_headers()
+
+
+def conditional(request, etag: str, respond):
+    """Returns 304 if `etag` matches ``If-None-Match``, else `respond()`.
+
+    `respond` builds the response only when it is needed, so a client
+    polling an unchanged resource costs no more than the `etag` does.
+    """
+    etag = quote_etag(etag)
+    matches = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    if '*' in matches or etag in matches or 'W/' + etag in matches:
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = respond()
+    response['ETag'] = etag
+    return response
+
+
+def listing_etag(request, *versions) -> str:
+    """Returns the ETag of a listing at `versions` with request params."""
+    key = ':'.join(map(str, versions + (request.META.get('QUERY_STRING'),)))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def list_wallets() -> list:
+    """Returns all wallets serialized, balances read from the database."""
+    return WalletListSerializer(Wallet.objects.all()).data
+
+
+def create_wallets_bulk(data) -> (int, object):
+    """Creates a list of wallets with one collision check per chunk.
+
+    Items whose name or slug is taken by a wallet or an earlier item are
+    reported as conflicts, the result list matches the input. Returns a
+    status code and response data.
+    """
+    if isinstance(data, list) and len(data) > BULK_WALLETS_LIMIT:
+        errors = {'details': 'Ensure this list has no more than {} items.'
+                  .format(BULK_WALLETS_LIMIT)}
+        return status.HTTP_400_BAD_REQUEST, errors
+    serializer = WalletBulkCreateSerializer(data=data, many=True)
+    if not serializer.is_valid():
+        return status.HTTP_400_BAD_REQUEST, serializer.errors
+
+    results = []
+    for name, slug, created in Wallet.objects.provision(
+        [item['name'] for item in serializer.validated_data]
+    ):
+        result = {'name': name, 'slug': slug, 'status': 'created'}
+        if not created:
+            result.update(status='conflict', details=(
+                'Wallet with this name or slug already exists.'
+            ))
+        results.append(result)
+    data = {
+        'created': sum(r['status'] == 'created' for r in results),
+        'conflicts': sum(r['status'] == 'conflict' for r in results),
+        'results': results,
+    }
+    return status.HTTP_201_CREATED, data
+
+
+def create_transaction(data):
+    """Creates a transaction from request `data`.
+
+    With group commit the transaction is committed in a batch by the
+    writer thread, unless the caller is inside a database transaction
+    that the writer would have to wait for (e.g. of an idempotency key).
+    Returns ``None`` on success or validation errors otherwise, raises
+    ``futures.TimeoutError`` if the writer doesn't commit in time.
+    """
+    wallet = get_wallet('name', data['wallet'])
+    transaction = Transaction(wallet=wallet)
+    serializer = TransactionCreateUpdateSerializer(transaction, data=data)
+    if not serializer.is_valid():
+        return serializer.errors
+    if intake.enabled() and not db_connection.in_atomic_block:
+        transaction = Transaction(**serializer.validated_data)
+        transaction.wallet = wallet
+        future = intake.submit(transaction)
+        try:
+            success = future.result(timeout=intake.timeout())
+        except futures.TimeoutError:
+            # Not committed if cancelled before the writer takes it up.
+            future.cancel()
+            raise
+        if success:
+            return None
+        return serializer.errors
+    # Only the writes are atomic: the balance is checked and changed
+    # by a single conditional UPDATE, no read is needed to lock on.
+    with transaction_decorators.atomic():
+        transaction = Transaction(**serializer.validated_data)
+        transaction.wallet = wallet
+        transaction, success = transaction.provide_transaction()
+        if success:
+            serializer.save()
+            return None
+    return serializer.errors
+
+
+def create_transaction_response(data) -> (int, object):
+    """Creates a transaction, returns a status code and response data."""
+    try:
+        errors = create_transaction(data)
+    except futures.TimeoutError:
+        errors = {'details': 'The transaction was not committed in time.'}
+        return status.HTTP_503_SERVICE_UNAVAILABLE, errors
+    if errors is None:
+        return status.HTTP_201_CREATED, None
+    return status.HTTP_400_BAD_REQUEST, errors
+
+
+def create_transactions_bulk(data) -> (int, object):
+    """Creates a list of transactions with one balance update per wallet.
+
+    The whole payload is validated first, then every item is accepted
+    or rejected in arrival order, so the result list matches the input.
+    Returns a status code and response data.
+    """
+    if isinstance(data, list) and len(data) > BULK_TRANSACTIONS_LIMIT:
+        errors = {'details': 'Ensure this list has no more than {} items.'
+                  .format(BULK_TRANSACTIONS_LIMIT)}
+        return status.HTTP_400_BAD_REQUEST, errors
+    serializer = TransactionBulkCreateSerializer(data=data, many=True)
+    if not serializer.is_valid():
+        return status.HTTP_400_BAD_REQUEST, serializer.errors
+
+    wallets = Wallet.objects.in_bulk(
+        {item['wallet'] for item in serializer.validated_data},
+        field_name='name'
+    )
+    results = []
+    transactions = []
+    for item in serializer.validated_data:
+        wallet = wallets.get(item['wallet'])
+        if wallet is None:
+            results.append({'status': 'rejected',
+                            'details': 'Wallet not found.'})
+            continue
+        transactions.append(Transaction(**dict(item, wallet=wallet)))
+        results.append(None)
+
+    accepted = iter(Transaction.objects.provide_bulk(transactions))
+    for index, result in enumerate(results):
+        if result is None:
+            results[index] = (
+                {'status': 'accepted'} if next(accepted)
+                else {'status': 'rejected',
+                      'details': 'Insufficient balance.'}
+            )
+    data = {
+        'accepted': sum(r['status'] == 'accepted' for r in results),
+        'rejected': sum(r['status'] == 'rejected' for r in results),
+        'results': results,
+    }
+    return status.HTTP_201_CREATED, data
+
+
+def create_transfer(data) -> (int, object):
+    """Moves money between two wallets in one database transaction.
+
+    Returns a status code and response data with ids of the outcome and
+    income transactions.
+    """
+    serializer = TransferSerializer(data=data)
+    if not serializer.is_valid():
+        return status.HTTP_400_BAD_REQUEST, serializer.errors
+    data = serializer.validated_data
+    source = get_wallet('name', data['source'])
+    target = get_wallet('name', data['target'])
+    pair = Transaction.objects.transfer(source, target, data['amount'],
+                                        data['comment'])
+    if pair is None:
+        errors = {'details': 'Insufficient balance.'}
+        return status.HTTP_400_BAD_REQUEST, errors
+    outcome, income = pair
+    return status.HTTP_201_CREATED, {'outcome': outcome.id,
+                                     'income': income.id}
+
+
+def run_idempotent(request, data, action) -> (int, object, dict):
+    """Runs `action` once per ``Idempotency-Key`` header of `request`.
+
+    Retries with the same key get the stored status and data of the first
+    run without running `action` again, the key may not be reused with
+    other request `data`. Returns the status code, data and headers.
+    """
+    key = request.headers.get('Idempotency-Key')
+    if key is None:
+        status_code, data = action()
+        return status_code, data, {}
+    if not 0 < len(key) <= IDEMPOTENCY_KEY_MAX_LENGTH:
+        data = {'details': 'Idempotency-Key must have 1 to {} characters.'
+                .format(IDEMPOTENCY_KEY_MAX_LENGTH)}
+        return status.HTTP_400_BAD_REQUEST, data, {}
+    fingerprint = hashlib.sha256(json.dumps(
+        [request.method, request.path, data],
+        sort_keys=True, default=str
+    ).encode()).hexdigest()
+    status_code, data, replayed = IdempotencyKey.objects.execute(
+        key, fingerprint, action, ttl=IDEMPOTENCY_TTL
+    )
+    headers = {'Idempotent-Replayed': 'true'} if replayed else {}
+    return status_code, data, headers
+
+
 class WalletView(APIView):
     """Views for operating ``Wallet`` model.
 
         * GET: list all wallets
         * POST: create a wallet
+        * POST (post_bulk): create a batch of wallets
         * PUT: update a wallet
         * DELETE: delete a wallet
+        * GET (get_balance): balance of a wallet at a moment
+        * GET (get_stats): income/outcome totals of a wallet per day/month
 
+        The list carries an ``ETag``, ``If-None-Match`` with it gets 304.
         Only `name` can be set for a wallet,
         `balance` and `slug` have default values.
         Operations Update/Delete require `slug` of a wallet
@@ -30,9 +390,10 @@ class WalletView(APIView):
     """
 
     def get(self, request):
-        wallets = Wallet.objects.all()
-        serializer = WalletGetSerializer(wallets, many=True)
-        return Response(serializer.data)
+        return conditional(
+            request, listing_etag(request, Wallet.objects.listing_version()),
+            lambda: Response(list_wallets())
+        )
 
     def post(self, request):
         wallet = Wallet()
@@ -42,8 +403,16 @@ class WalletView(APIView):
             return Response(status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @staticmethod
+    @api_view(['POST', ])
+    def post_bulk(request):
+        status_code, data, headers = run_idempotent(
+            request, request.data, lambda: create_wallets_bulk(request.data)
+        )
+        return Response(data, status=status_code, headers=headers)
+
     def put(self, request, slug: str):
-        wallet = get_object_or_404(Wallet, slug=slug)
+        wallet = get_wallet('slug', slug)
         serializer = WalletCreateUpdateSerializer(wallet, data=request.data)
         if serializer.is_valid():
             serializer.save()
@@ -51,12 +420,90 @@ class WalletView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, slug: str):
-        wallet = get_object_or_404(Wallet, slug=slug)
-        operation = wallet.delete()
+        wallet = get_wallet('slug', slug)
+        try:
+            operation = wallet.delete()
+        except utils.IntegrityError:
+            data = {'details': 'The wallet cannot be deleted.'}
+            return Response(status=status.HTTP_400_BAD_REQUEST, data=data)
         if operation:
             return Response(status=status.HTTP_200_OK)
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
+    @staticmethod
+    @api_view(['GET', ])
+    def get_balance(request, slug: str):
+        """Returns the balance of a wallet, with ``?at=`` in the past."""
+        at = request.query_params.get('at')
+        if at is None:
+            # One indexed read, the cached wallet may hold a stale balance.
+            balance = get_object_or_404(
+                Wallet.objects.with_balance()
+                .values_list('total_balance', flat=True),
+                slug=slug
+            )
+            return Response({'slug': slug, 'balance': balance})
+        wallet = get_wallet('slug', slug)
+        try:
+            at = parse_datetime(at)
+        except ValueError:
+            at = None
+        if at is None:
+            data = {'at': 'Enter a valid ISO 8601 date and time.'}
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+        if timezone.is_naive(at):
+            at = timezone.make_aware(at)
+        return Response({'slug': wallet.slug, 'at': at.isoformat(),
+                         'balance': wallet.balance_at(at)})
+
+    @staticmethod
+    @api_view(['GET', ])
+    def get_stats(request, slug: str):
+        """Returns totals of a wallet per ``?bucket=day|month``.
+
+        Only daily rollups are read, optionally limited to days between
+        ``?from=`` and ``?to=`` (inclusive, ISO 8601 dates).
+        """
+        wallet = get_wallet('slug', slug)
+        rollups = wallet.rollups.all()
+        errors = {}
+        for param, lookup in (('from', 'day__gte'), ('to', 'day__lte')):
+            value = request.query_params.get(param)
+            if value is None:
+                continue
+            try:
+                day = parse_date(value)
+            except ValueError:
+                day = None
+            if day is None:
+                errors[param] = 'Enter a valid ISO 8601 date.'
+            else:
+                rollups = rollups.filter(**{lookup: day})
+        bucket = request.query_params.get('bucket', 'day')
+        if bucket not in rollups.BUCKETS:
+            errors['bucket'] = 'Choose one of: {}.'.format(
+                ', '.join(rollups.BUCKETS)
+            )
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'slug': wallet.slug, 'bucket': bucket,
+                         'stats': rollups.stats(bucket)})
+
+
+@api_view(['GET', ])
+def get_cache_stats(request):
+    """Returns hit/miss counters of the wallet cache in this process."""
+    return Response(cache_stats())
+
+
+def get_metrics(request):
+    """Returns request metrics of this process for Prometheus.
+
+    Metrics are recorded by ``money.metrics.MetricsMiddleware``.
+    """
+    return HttpResponse(metrics_registry.render(),
+                        content_type='text/plain; version=0.0.4')
+
 
 class TransactionView(APIView):
     """Views for operating ``Transaction`` model.
@@ -64,45 +511,80 @@ class TransactionView(APIView):
         * GET (get): list all transactions
         * GET (get_by_wallet): list all transaction of a specific wallet
         * POST: create a transaction
-        * DELETE: delete a transaction (if it possible)
+        * POST (post_bulk): create a batch of transactions
+        * POST (post_transfer): move money between two wallets
+        * DELETE: delete a transaction (if it possible), in the
+          append-only ledger mode reverse it by a compensating entry
 
         Fields `wallet` and `transaction_type` are required,
         other fields have default values.
+        POST requests with an ``Idempotency-Key`` header are run once,
+        retries with the key replay the first response.
+        Listings are filtered by `from`, `to`, `transaction_type`,
+        `min_amount` and `max_amount`, ordered by (`data`, `id`) or
+        ``?ordering=`` and paginated with `page_size` and `cursor` query
+        parameters (see ``Link`` header), ``?stream=ndjson`` streams the
+        whole listing instead. Listings of a wallet carry an ``ETag`` of
+        the wallet version, ``If-None-Match`` with it gets 304.
     """
 
     def get(self, request):
-        transactions = Transaction.objects.all()
-        serializer = TransactionGetSerializer(transactions, many=True)
-        return Response(serializer.data)
+        return list_transactions(request, Transaction.objects.all(),
+                                 ArchivedTransaction.objects.all())
 
     @staticmethod
     @api_view(['GET', ])
     def get_by_wallet(request, wallet_slug: str):
         if request.method == 'GET':
-            wallet = get_object_or_404(Wallet, slug=wallet_slug)
-            transactions = Transaction.objects.filter(wallet=wallet)
-            serializer = TransactionGetSerializer(transactions, many=True)
-            return Response(serializer.data)
+            # The version is read from the database, other processes
+            # don't invalidate the wallet cache of this one; an unchanged
+            # listing costs this one indexed read.
+            wallet_id, version = get_object_or_404(
+                Wallet.objects.with_version()
+                .values_list('pk', 'total_version'),
+                slug=wallet_slug
+            )
+            transactions = Transaction.objects.filter(wallet_id=wallet_id)
+            archived = ArchivedTransaction.objects.filter(wallet_id=wallet_id)
+            return conditional(
+                request, listing_etag(request, wallet_id, version),
+                lambda: list_transactions(request, transactions, archived)
+            )
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
-    @transaction_decorators.atomic
     def post(self, request):
-        wallet = get_object_or_404(Wallet, name=request.data['wallet'])
-        transaction = Transaction(wallet=wallet)
-        serializer = TransactionCreateUpdateSerializer(transaction,
-                                                       data=request.data)
-        if serializer.is_valid():
-            transaction = Transaction(**serializer.validated_data)
-            transaction.wallet = wallet
-            transaction, success = transaction.provide_transaction()
-            if success:
-                serializer.save()
-                return Response(status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        status_code, data, headers = run_idempotent(
+            request, request.data,
+            lambda: create_transaction_response(request.data)
+        )
+        return Response(data, status=status_code, headers=headers)
+
+    @staticmethod
+    @api_view(['POST', ])
+    def post_bulk(request):
+        status_code, data, headers = run_idempotent(
+            request, request.data,
+            lambda: create_transactions_bulk(request.data)
+        )
+        return Response(data, status=status_code, headers=headers)
+
+    @staticmethod
+    @api_view(['POST', ])
+    def post_transfer(request):
+        status_code, data, headers = run_idempotent(
+            request, request.data, lambda: create_transfer(request.data)
+        )
+        return Response(data, status=status_code, headers=headers)
 
     def delete(self, request, id: int):
-        transaction = get_object_or_404(Transaction, id=id)
+        transaction = get_object_or_404(
+            Transaction.objects.select_related('wallet'), id=id
+        )
         try:
+            if Transaction.is_append_only():
+                reversal = transaction.reverse()
+                return Response({'reversal': reversal.id},
+                                status=status.HTTP_200_OK)
             transaction.delete()
         except utils.IntegrityError:
             data = {'details': 'The transaction cannot be deleted.'}
@@ -1,5 +1,14 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
 
 
 class MoneyConfig(AppConfig):
     name = 'money'
+
+    def ready(self):
+        from money import signals  # noqa: F401
+        from money.db import check_connections, configure_connection
+
+        connection_created.connect(configure_connection)
+        request_started.connect(check_connections)
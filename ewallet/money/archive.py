@@ -0,0 +1,61 @@
+"""Module with archival of old transactions.
+
+Transactions older than a cutoff are moved from ``Transaction`` to
+``ArchivedTransaction`` in chunks, one database transaction per chunk,
+so the hot table and its indexes stay small. Balance snapshots are
+taken at the cutoff first and only transactions covered by snapshots
+are moved, so balances at a moment are computed without the archive
+for moments after it. ``Wallet.balance`` and rollups don't depend on
+where transactions are stored.
+"""
+from django.db import transaction
+from django.db.models import Max
+
+from money.models import (
+    ArchivedTransaction,
+    Transaction,
+    WalletBalanceSnapshot,
+)
+
+
+FIELDS = ('id', 'wallet_id', 'transaction_type', 'data', 'amount',
+          'comment', 'reversal_of_id')
+
+
+def archive_transactions(before, chunk_size: int = 2000) -> dict:
+    """Moves transactions dated up to `before` to the archive.
+
+    A transaction reversed later than that stays in place, so a reversal
+    always lives in the same table as the transaction it reverses.
+    Returns the number of moved transactions and the effective cutoff.
+    """
+    WalletBalanceSnapshot.objects.take(until=before)
+    covered = WalletBalanceSnapshot.objects.aggregate(
+        covered=Max('data')
+    )['covered']
+    if covered is None:
+        return {'archived': 0, 'until': None}
+    until = min(before, covered)
+    candidates = Transaction.objects.filter(data__lte=until) \
+        .exclude(reversal__data__gt=until)
+
+    archived = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                candidates.order_by('id').values_list(*FIELDS)[:chunk_size]
+            )
+            if not rows:
+                break
+            ids = [row[0] for row in rows]
+            # Reversals may have later ids than the chunk, move them along.
+            rows += candidates.filter(reversal_of__in=ids) \
+                .exclude(pk__in=ids).values_list(*FIELDS)
+            ArchivedTransaction.objects.bulk_create(
+                ArchivedTransaction(**dict(zip(FIELDS, row))) for row in rows
+            )
+            Transaction.objects.filter(
+                pk__in=[row[0] for row in rows]
+            ).delete()
+        archived += len(rows)
+    return {'archived': archived, 'until': until}
@@ -0,0 +1,85 @@
+"""Module with a read-through cache of wallets.
+
+Wallets are cached by id, name and slug lookups are cached as pointers
+to the id. Entries are dropped on ``Wallet`` saves, deletes and
+resharding, right away and once more after commit, so a concurrent read
+can't cache the state being replaced for long. Other processes don't
+drop the entries of a process-local backend, so the cache resolves
+names and slugs only; balances are always read from the database and
+balance changes leave the entries alone. The cache backend is
+``MONEY_CACHE_ALIAS``.
+"""
+import hashlib
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import Http404
+
+
+CACHE_ALIAS = getattr(settings, 'MONEY_CACHE_ALIAS', 'default')
+TIMEOUT = getattr(settings, 'MONEY_CACHE_TIMEOUT', 300)
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def wallet_key(pk: int) -> str:
+    return 'money:wallet:{}'.format(pk)
+
+
+def lookup_key(field: str, value: str) -> str:
+    digest = hashlib.sha1(str(value).encode()).hexdigest()
+    return 'money:wallet:{}:{}'.format(field, digest)
+
+
+def _count(name: str, event: str):
+    with _stats_lock:
+        _stats['{}_{}'.format(name, event)] += 1
+
+
+def stats() -> dict:
+    """Returns hit/miss counters of this process."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def get_wallet(field: str, value: str):
+    """Returns a wallet by a unique `field` or raises ``Http404``."""
+    from money.models import Wallet
+
+    cache = get_cache()
+    pk = cache.get(lookup_key(field, value))
+    if pk is not None:
+        wallet = cache.get(wallet_key(pk))
+        # Lookups are not dropped on renames, so check they still match.
+        if wallet is not None and getattr(wallet, field) == value:
+            _count('wallet', 'hits')
+            return wallet
+    _count('wallet', 'misses')
+    try:
+        wallet = Wallet.objects.get(**{field: value})
+    except Wallet.DoesNotExist:
+        raise Http404('No Wallet matches the given query.')
+    cache.set_many({lookup_key(field, value): wallet.pk,
+                    wallet_key(wallet.pk): wallet}, TIMEOUT)
+    return wallet
+
+
+def _invalidate(keys: list):
+    def invalidate():
+        get_cache().delete_many(keys)
+
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+def invalidate_wallet(pk: int):
+    """Drops cached data of a wallet, now and after commit."""
+    _invalidate([wallet_key(pk)])
@@ -0,0 +1,32 @@
+"""Module with database connection setup of the money app.
+
+SQLite connections get the ``MONEY_SQLITE_PRAGMAS`` when they are opened,
+e.g. WAL journal so readers don't block the writer and a busy timeout so
+writers wait for the lock instead of failing with "database is locked".
+Persistent connections (``CONN_MAX_AGE``) of databases with
+``CONN_HEALTH_CHECKS`` are pinged when a request starts and reopened if
+the server has dropped them.
+"""
+from django.conf import settings
+from django.db import connections
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Applies ``MONEY_SQLITE_PRAGMAS`` to a new SQLite connection."""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'MONEY_SQLITE_PRAGMAS', {})
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
+
+
+def check_connections(**kwargs):
+    """Closes persistent connections that are no longer usable."""
+    for connection in connections.all():
+        if (connection.connection is None
+                or connection.in_atomic_block
+                or not connection.settings_dict.get('CONN_HEALTH_CHECKS')):
+            continue
+        if not connection.is_usable():
+            connection.close()
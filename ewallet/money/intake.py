@@ -0,0 +1,139 @@
+"""Module with group commit of new transactions.
+
+With ``MONEY_GROUP_COMMIT`` transactions created by the API are put on
+an in-process queue instead of being committed one by one. A writer
+thread takes up to ``MONEY_GROUP_COMMIT_MAX_BATCH`` of them, waiting at
+most ``MONEY_GROUP_COMMIT_LINGER`` seconds for a batch to fill, and
+provides the whole batch with ``Transaction.objects.provide_bulk`` in a
+single commit. Every request waits on a future for its own result, so
+it still answers after its transaction is committed, or gives up after
+``MONEY_GROUP_COMMIT_TIMEOUT`` seconds. A failed batch is provided again
+item by item, so one bad transaction fails only its own request.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import connection
+
+from money.models import Transaction
+
+
+class GroupCommitQueue:
+    """Queue of transactions committed in batches by a writer thread."""
+
+    def __init__(self, max_batch: int = 100, linger: float = 0.002):
+        self.max_batch = max_batch
+        self.linger = linger
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def submit(self, transaction: Transaction) -> Future:
+        """Queues `transaction`, the future resolves to its success."""
+        future = Future()
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self.run, name='money-group-commit', daemon=True
+                )
+                self.thread.start()
+            self.queue.put((transaction, future))
+        return future
+
+    def stop(self):
+        """Commits the queued transactions and stops the writer thread."""
+        with self.lock:
+            thread, self.thread = self.thread, None
+            if thread is not None:
+                self.queue.put(None)
+        if thread is not None:
+            thread.join()
+
+    def run(self):
+        try:
+            stopped = False
+            while not stopped:
+                batch, stopped = self.take()
+                if batch:
+                    self.commit(batch)
+        finally:
+            connection.close()
+
+    def take(self) -> (list, bool):
+        """Waits for an item and takes a batch of the following ones.
+
+        Returns the batch and whether the queue has been stopped.
+        """
+        batch = []
+        item = self.queue.get()
+        deadline = time.monotonic() + self.linger
+        while item is not None:
+            batch.append(item)
+            if len(batch) >= self.max_batch:
+                break
+            try:
+                item = self.queue.get(
+                    timeout=max(0, deadline - time.monotonic())
+                )
+            except queue.Empty:
+                break
+        return batch, item is None
+
+    def commit(self, batch: list):
+        """Provides the transactions of `batch` not given up on yet."""
+        self.provide([(transaction, future) for transaction, future in batch
+                      if future.set_running_or_notify_cancel()])
+
+    def provide(self, batch: list):
+        transactions = [transaction for transaction, future in batch]
+        try:
+            accepted = Transaction.objects.provide_bulk(transactions)
+        except Exception as error:
+            # The connection may be broken, the next attempt reconnects.
+            connection.close()
+            if len(batch) == 1:
+                batch[0][1].set_exception(error)
+                return
+            for item in batch:
+                self.provide([item])
+            return
+        for (transaction, future), success in zip(batch, accepted):
+            future.set_result(success)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return getattr(settings, 'MONEY_GROUP_COMMIT', False)
+
+
+def timeout() -> float:
+    """Seconds a request waits for the commit of its transaction."""
+    return getattr(settings, 'MONEY_GROUP_COMMIT_TIMEOUT', 5.0)
+
+
+def submit(transaction: Transaction) -> Future:
+    """Queues `transaction` on the queue of the process."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = GroupCommitQueue(
+                max_batch=getattr(settings, 'MONEY_GROUP_COMMIT_MAX_BATCH',
+                                  100),
+                linger=getattr(settings, 'MONEY_GROUP_COMMIT_LINGER', 0.002),
+            )
+        return _queue.submit(transaction)
+
+
+def reset():
+    """Drains and drops the queue, the next one reads the settings."""
+    global _queue
+    with _queue_lock:
+        current, _queue = _queue, None
+    if current is not None:
+        current.stop()
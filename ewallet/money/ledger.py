@@ -0,0 +1,178 @@
+"""Module with export and import of the ledger as CSV or NDJSON.
+
+Both directions stream: export reads transactions with
+``.iterator(chunk_size=...)`` and writes a row at a time, import reads a
+row at a time and inserts chunks with ``bulk_create``, so memory doesn't
+grow with the file size. Wallets are referenced by name and created on
+import if missing. Rows keep their ids, so reversals keep their links;
+import into a database with other transactions of the same ids fails.
+An import is atomic: a failed one leaves neither rows nor balances.
+"""
+import csv
+import gzip
+import heapq
+import json
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
+from django.utils.text import slugify
+
+from money.models import (
+    ArchivedTransaction,
+    Transaction,
+    Wallet,
+    WalletBalanceShard,
+    WalletBalanceSnapshot,
+    WalletDailyRollup,
+)
+
+
+FIELDS = ('id', 'wallet', 'transaction_type', 'data', 'amount', 'comment',
+          'reversal_of')
+FORMATS = ('csv', 'ndjson')
+
+
+def open_file(path: str, mode: str):
+    """Opens a text file, gzip-compressed if `path` ends with ``.gz``."""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8', newline='')
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def guess_format(path: str) -> str:
+    name = path[:-3] if path.endswith('.gz') else path
+    extension = name.rsplit('.', 1)[-1]
+    return extension if extension in FORMATS else 'ndjson'
+
+
+def export_ledger(file, format: str = 'ndjson',
+                  chunk_size: int = 2000) -> int:
+    """Writes all transactions to `file` in id order, returns the count.
+
+    Archived transactions are merged in, the file holds the full ledger.
+    """
+    rows = heapq.merge(*(
+        model.objects.order_by('id').values_list(
+            'id', 'wallet__name', 'transaction_type', 'data', 'amount',
+            'comment', 'reversal_of'
+        ).iterator(chunk_size=chunk_size)
+        for model in (ArchivedTransaction, Transaction)
+    ))
+    if format == 'csv':
+        writer = csv.writer(file)
+        writer.writerow(FIELDS)
+        write = writer.writerow
+    else:
+        def write(row):
+            file.write(json.dumps(dict(zip(FIELDS, row))) + '\n')
+    count = 0
+    for row in rows:
+        row = list(row)
+        row[3] = row[3].isoformat()
+        write(row)
+        count += 1
+    return count
+
+
+def read_rows(file, format: str):
+    """Yields dicts of `FIELDS` read from `file`."""
+    if format == 'csv':
+        for row in csv.DictReader(file):
+            row['reversal_of'] = row['reversal_of'] or None
+            yield row
+        return
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def import_ledger(file, format: str = 'ndjson',
+                  chunk_size: int = 2000) -> int:
+    """Inserts the transactions of `file` atomically, returns the count.
+
+    Balances of the touched wallets are recomputed from their ledger
+    once at the end, as well as their snapshots and daily rollups. The
+    id sequence is moved past the imported ids.
+    """
+    wallet_ids = {}
+    count = 0
+    chunk = []
+    with transaction.atomic():
+        for row in read_rows(file, format):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                count += insert_chunk(chunk, wallet_ids)
+                chunk = []
+        if chunk:
+            count += insert_chunk(chunk, wallet_ids)
+        reset_sequences()
+
+        ids = sorted(wallet_ids.values())
+        for offset in range(0, len(ids), chunk_size):
+            recompute_balances(ids[offset:offset + chunk_size])
+    return count
+
+
+def reset_sequences():
+    """Sets the transaction id sequence after the highest id, if any."""
+    statements = connection.ops.sequence_reset_sql(no_style(), [Transaction])
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def insert_chunk(rows: list, wallet_ids: dict) -> int:
+    names = {row['wallet'] for row in rows} - set(wallet_ids)
+    if names:
+        Wallet.objects.bulk_create(
+            [Wallet(name=name, slug=slugify(name, allow_unicode=True))
+             for name in names],
+            ignore_conflicts=True
+        )
+        wallet_ids.update(
+            Wallet.objects.filter(name__in=names).values_list('name', 'pk')
+        )
+        missing = names - set(wallet_ids)
+        if missing:
+            raise ValueError('Wallets with slugs of other wallets: {}.'
+                             .format(', '.join(sorted(missing))))
+    Transaction.objects.bulk_create([
+        Transaction(
+            id=int(row['id']), wallet_id=wallet_ids[row['wallet']],
+            transaction_type=row['transaction_type'],
+            data=parse_datetime(row['data']), amount=int(row['amount']),
+            comment=row['comment'],
+            reversal_of_id=(int(row['reversal_of'])
+                            if row['reversal_of'] is not None else None),
+        )
+        for row in rows
+    ])
+    return len(rows)
+
+
+def recompute_balances(wallet_ids: list):
+    """Sets balances of `wallet_ids` to their ledger with one UPDATE.
+
+    Their snapshots and daily rollups are rebuilt from the ledger too.
+    """
+    ledger, archived = (
+        model.objects.filter(wallet=OuterRef('pk')).order_by()
+        .values('wallet').annotate(
+            total=Sum(model.objects.signed_amount())
+        ).values('total')
+        for model in (Transaction, ArchivedTransaction)
+    )
+    with transaction.atomic():
+        WalletBalanceShard.objects.filter(wallet_id__in=wallet_ids).update(
+            balance=0, version=F('version') + 1
+        )
+        Wallet.objects.filter(pk__in=wallet_ids).update(
+            balance=Coalesce(Subquery(ledger), 0)
+            + Coalesce(Subquery(archived), 0),
+            version=F('version') + 1,
+        )
+        WalletBalanceSnapshot.objects.rebuild(wallet_ids)
+        WalletDailyRollup.objects.rebuild(wallet_ids)
@@ -0,0 +1,31 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from money.archive import archive_transactions
+
+
+class Command(BaseCommand):
+    help = ('Moves transactions older than an age to the archive table, '
+            'taking balance snapshots first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            default=getattr(settings, 'MONEY_ARCHIVE_AFTER_DAYS', 365),
+            help='Age of the transactions to archive.'
+        )
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Transactions moved in one database '
+                                 'transaction.')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - datetime.timedelta(days=options['days'])
+        report = archive_transactions(before,
+                                      chunk_size=options['chunk_size'])
+        until = report['until']
+        self.stdout.write('Archived {} transactions up to {}.'.format(
+            report['archived'], until.isoformat() if until else '-'
+        ))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from money.models import Wallet, WalletDailyRollup
+
+
+class Command(BaseCommand):
+    help = 'Builds daily rollups of wallets from the transaction history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=100,
+            help='Wallets rebuilt in one database transaction.'
+        )
+
+    def handle(self, *args, **options):
+        wallet_ids = list(
+            Wallet.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        chunk_size = options['chunk_size']
+        rollups = 0
+        for offset in range(0, len(wallet_ids), chunk_size):
+            rollups += WalletDailyRollup.objects.rebuild(
+                wallet_ids[offset:offset + chunk_size]
+            )
+        self.stdout.write('Built {} rollups of {} wallets.'.format(
+            rollups, len(wallet_ids)
+        ))
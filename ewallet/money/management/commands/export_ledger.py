@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from money.ledger import FORMATS, export_ledger, guess_format, open_file
+
+
+class Command(BaseCommand):
+    help = 'Streams all transactions to a CSV or NDJSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Output file, gzipped if *.gz.')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Defaults to the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows fetched from the database at once.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        started = time.perf_counter()
+        with open_file(path, 'w') as file:
+            count = export_ledger(
+                file, options['format'] or guess_format(path),
+                chunk_size=options['chunk_size']
+            )
+        seconds = time.perf_counter() - started
+        self.stdout.write(
+            'Exported {} transactions in {:.3f} s ({:.0f} rows/sec).'.format(
+                count, seconds, count / seconds if seconds else 0
+            )
+        )
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import utils
+
+from money.ledger import FORMATS, guess_format, import_ledger, open_file
+
+
+class Command(BaseCommand):
+    help = ('Imports transactions from a CSV or NDJSON file and recomputes '
+            'balances of their wallets.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Input file, gzipped if *.gz.')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Defaults to the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows inserted with one bulk_create.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        started = time.perf_counter()
+        try:
+            with open_file(path, 'r') as file:
+                count = import_ledger(
+                    file, options['format'] or guess_format(path),
+                    chunk_size=options['chunk_size']
+                )
+        except (KeyError, ValueError, utils.IntegrityError) as error:
+            raise CommandError('Import failed: {!r}'.format(error))
+        seconds = time.perf_counter() - started
+        self.stdout.write(
+            'Imported {} transactions in {:.3f} s ({:.0f} rows/sec).'.format(
+                count, seconds, count / seconds if seconds else 0
+            )
+        )
@@ -0,0 +1,66 @@
+import itertools
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from money.ledger import open_file
+from money.models import Wallet
+
+
+MAX_LENGTH = Wallet._meta.get_field('name').max_length
+
+
+class Command(BaseCommand):
+    help = ('Creates wallets in bulk from a file of names, one per line, '
+            'or with generated names.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?',
+                            help='File of names, gzipped if *.gz.')
+        parser.add_argument('--count', type=int,
+                            help='Create this many wallets with '
+                                 'generated names instead.')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Wallets inserted with one bulk_create.')
+
+    def handle(self, *args, **options):
+        if (options['path'] is None) == (options['count'] is None):
+            raise CommandError('Pass either a path or --count.')
+        started = time.perf_counter()
+        if options['path'] is None:
+            self.provision(itertools.repeat('', options['count']), options)
+        else:
+            with open_file(options['path'], 'r') as file:
+                self.provision(
+                    (line.rstrip('\r\n') for line in file if line.strip()),
+                    options
+                )
+        seconds = time.perf_counter() - started
+        self.stdout.write(
+            'Created {} wallets, {} conflicts in {:.3f} s '
+            '({:.0f} wallets/sec).'.format(
+                self.created, self.conflicts, seconds,
+                self.created / seconds if seconds else 0
+            )
+        )
+
+    def provision(self, names, options):
+        self.created = self.conflicts = 0
+        chunk_size = options['chunk_size']
+        while True:
+            chunk = list(itertools.islice(names, chunk_size))
+            if not chunk:
+                break
+            for name in chunk:
+                if len(name) > MAX_LENGTH:
+                    raise CommandError('Name is longer than {}: {}'.format(
+                        MAX_LENGTH, name
+                    ))
+            for name, slug, created in Wallet.objects.provision(
+                chunk, chunk_size=chunk_size
+            ):
+                if created:
+                    self.created += 1
+                    continue
+                self.conflicts += 1
+                self.stderr.write('Conflict: {} ({}).'.format(name, slug))
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from money.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Deletes idempotency keys older than their time to live.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ttl', type=int,
+            default=getattr(settings, 'MONEY_IDEMPOTENCY_TTL', 86400),
+            help='Time to live of a key in seconds.'
+        )
+        parser.add_argument('--chunk-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        expired = IdempotencyKey.objects.expired(options['ttl'])
+        deleted = 0
+        while True:
+            pks = list(expired.values_list('pk', flat=True)
+                       [:options['chunk_size']])
+            if not pks:
+                break
+            deleted += IdempotencyKey.objects.filter(pk__in=pks).delete()[0]
+        self.stdout.write('Deleted {} idempotency keys.'.format(deleted))
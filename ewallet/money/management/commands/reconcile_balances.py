@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from money.reconciliation import reconcile_balances
+
+
+class Command(BaseCommand):
+    help = 'Verifies wallet balances against the sum of their transactions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Wallets per aggregate query.')
+        parser.add_argument('--repair', action='store_true',
+                            help='Set mismatched balances to the ledger sum.')
+        parser.add_argument('--fail-on-mismatch', action='store_true',
+                            help='Exit with an error if mismatches remain.')
+
+    def handle(self, *args, **options):
+        def on_mismatch(mismatch):
+            self.stdout.write(
+                'Wallet {}: balance {}, ledger {}{}'.format(
+                    mismatch.wallet_id, mismatch.balance, mismatch.ledger,
+                    ' (repaired)' if options['repair'] else ''
+                )
+            )
+
+        report = reconcile_balances(chunk_size=options['chunk_size'],
+                                    repair=options['repair'],
+                                    on_mismatch=on_mismatch)
+        self.stdout.write(
+            'Checked {wallets} wallets and {transactions} transactions '
+            'in {seconds} s ({rows_per_sec} rows/sec): {mismatches} '
+            'mismatches, {repaired} repaired.'.format(**report)
+        )
+        if options['fail_on_mismatch'] \
+                and report['mismatches'] > report['repaired']:
+            raise CommandError('Wallet balances do not match the ledger.')
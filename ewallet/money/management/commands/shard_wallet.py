@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from money.models import Wallet
+
+
+class Command(BaseCommand):
+    help = ('Splits credits of a hot wallet over balance shards, '
+            '0 shards folds them back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('slug')
+        parser.add_argument('--shards', type=int, default=16,
+                            help='Number of shard rows of the wallet.')
+
+    def handle(self, *args, **options):
+        if not 0 <= options['shards'] <= 1000:
+            raise CommandError('Shards must be between 0 and 1000.')
+        try:
+            wallet = Wallet.objects.get(slug=options['slug'])
+        except Wallet.DoesNotExist:
+            raise CommandError('No wallet {}.'.format(options['slug']))
+        Wallet.objects.shard(wallet.pk, options['shards'])
+        self.stdout.write('Wallet {} has {} shards.'.format(
+            wallet.slug, options['shards']
+        ))
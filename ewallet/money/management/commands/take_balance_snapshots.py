@@ -0,0 +1,27 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from money.models import WalletBalanceSnapshot
+
+
+class Command(BaseCommand):
+    help = 'Takes balance snapshots of wallets changed since the last run.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lag', type=int,
+            default=getattr(settings, 'MONEY_SNAPSHOT_LAG', 60),
+            help='Seconds to stay behind now, so transactions still being '
+                 'committed are not skipped.'
+        )
+
+    def handle(self, *args, **options):
+        until = timezone.now() - datetime.timedelta(seconds=options['lag'])
+        count = WalletBalanceSnapshot.objects.take(until=until,
+                                                   lag=options['lag'])
+        self.stdout.write('Taken {} snapshots at {}.'.format(
+            count, until.isoformat()
+        ))
@@ -0,0 +1,158 @@
+"""Module with request metrics in the Prometheus text format.
+
+``MetricsMiddleware`` records per endpoint (URL route and method) a
+latency histogram, a histogram of SQL queries per request, the number
+of queries and the time spent in the database. Queries are counted with
+``connection.execute_wrapper`` on the connections of the request thread,
+so under ASGI reads that async views run in a thread pool are not
+counted. Metrics live in the process, like the cache stats, and are
+exposed by the ``metrics`` endpoint. With ``MONEY_SERVER_TIMING`` the
+timings are also sent in a ``Server-Timing`` response header.
+"""
+import contextlib
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Cumulative histogram with fixed upper `buckets` and +Inf."""
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name: str, labels: str):
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield '{}_bucket{{{},le="{}"}} {}'.format(name, labels, bound,
+                                                      total)
+        yield '{}_sum{{{}}} {}'.format(name, labels, self.sum)
+        yield '{}_count{{{}}} {}'.format(name, labels, self.count)
+
+
+class Registry:
+    """Thread-safe store of the request metrics of the process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.queries = defaultdict(lambda: Histogram(QUERY_BUCKETS))
+        self.db_seconds = defaultdict(float)
+        self.responses = defaultdict(int)
+
+    def observe(self, method: str, endpoint: str, status_code: int,
+                seconds: float, queries: int, db_seconds: float):
+        key = (method, endpoint)
+        with self.lock:
+            self.latency[key].observe(seconds)
+            self.queries[key].observe(queries)
+            self.db_seconds[key] += db_seconds
+            self.responses[key + (status_code,)] += 1
+
+    def render(self) -> str:
+        lines = []
+        with self.lock:
+            lines += [
+                '# HELP ewallet_http_requests_total Responses by status.',
+                '# TYPE ewallet_http_requests_total counter',
+            ]
+            for (method, endpoint, code), count in self.responses.items():
+                lines.append(
+                    'ewallet_http_requests_total{{{},status="{}"}} {}'
+                    .format(self.labels(method, endpoint), code, count)
+                )
+            for name, help_text, histograms in (
+                ('ewallet_http_request_duration_seconds',
+                 'Latency of requests.', self.latency),
+                ('ewallet_db_queries_per_request',
+                 'SQL queries issued by a request.', self.queries),
+            ):
+                lines += ['# HELP {} {}'.format(name, help_text),
+                          '# TYPE {} histogram'.format(name)]
+                for key, histogram in histograms.items():
+                    lines += histogram.samples(name, self.labels(*key))
+            lines += [
+                '# HELP ewallet_db_query_duration_seconds_total Time spent '
+                'in SQL queries.',
+                '# TYPE ewallet_db_query_duration_seconds_total counter',
+            ]
+            for key, seconds in self.db_seconds.items():
+                lines.append(
+                    'ewallet_db_query_duration_seconds_total{{{}}} {}'
+                    .format(self.labels(*key), seconds)
+                )
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def labels(method: str, endpoint: str) -> str:
+        endpoint = endpoint.replace('\\', '\\\\').replace('"', '\\"')
+        return 'method="{}",endpoint="{}"'.format(method, endpoint)
+
+
+registry = Registry()
+
+
+class QueryRecorder:
+    """``execute_wrapper`` counting queries and their total time."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """Records latency and SQL queries of every request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'MONEY_SERVER_TIMING', False)
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        seconds = time.perf_counter() - started
+
+        match = request.resolver_match
+        endpoint = '/' + match.route if match is not None else 'unmatched'
+        registry.observe(request.method, endpoint, response.status_code,
+                         seconds, recorder.count, recorder.seconds)
+        if self.server_timing:
+            response['Server-Timing'] = (
+                'db;dur={:.3f};desc="{} queries", app;dur={:.3f}'.format(
+                    recorder.seconds * 1000, recorder.count, seconds * 1000
+                )
+            )
+        return response
@@ -1,22 +1,413 @@
+import datetime
+import itertools
+import json
+import random
 import uuid
+from collections import defaultdict
 
-from django.db import models, utils
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection, models, transaction, utils
+from django.db.models import Case, F, OuterRef, Q, Subquery, Sum, When
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
 from django.utils.text import slugify
 
+from money.cache import invalidate_wallet
+
+
+class WalletQuerySet(models.QuerySet):
+
+    # Every balance change also bumps the `version` of the wallet in the
+    # same UPDATE. `shards` is the `balance_shards` of the wallet: credits
+    # of a sharded wallet land on its shards, debits fall back to folding
+    # the shards into `balance` when it is not sufficient on its own.
+
+    def credit(self, pk: int, amount: int, shards: int = 0) -> bool:
+        """Adds `amount` to a wallet `balance` with a single UPDATE."""
+        if shards and WalletBalanceShard.objects.credit(pk, shards, amount):
+            return True
+        return self.filter(pk=pk).update(
+            balance=F('balance') + amount, version=F('version') + 1
+        ) > 0
+
+    def debit(self, pk: int, amount: int, shards: int = 0) -> bool:
+        """Subtracts `amount` from a wallet `balance` if it is sufficient.
+
+        The balance check and the write are one conditional UPDATE
+        (``... SET balance = balance - X WHERE balance >= X``), so
+        concurrent debits can neither overdraw a wallet nor lose updates.
+        """
+        return self.settle(pk, -amount, amount, shards)
+
+    def settle(self, pk: int, delta: int, reserve: int,
+               shards: int = 0) -> bool:
+        """Adds `delta` to a wallet `balance` if it is at least `reserve`."""
+        if shards and not reserve and delta >= 0:
+            return self.credit(pk, delta, shards)
+
+        def apply():
+            return self.filter(pk=pk, balance__gte=reserve).update(
+                balance=F('balance') + delta, version=F('version') + 1
+            ) > 0
+
+        if apply():
+            return True
+        return bool(shards) and self.fold(pk) > 0 and apply()
+
+    def fold(self, pk: int) -> int:
+        """Moves balances of the shards of a wallet to its `balance`.
+
+        The shard rows are locked, so no concurrent credit is lost.
+        Returns the moved amount.
+        """
+        with transaction.atomic():
+            shards = WalletBalanceShard.objects.select_for_update() \
+                .filter(wallet_id=pk)
+            amount = sum(shards.values_list('balance', flat=True))
+            if amount:
+                shards.update(balance=0, version=F('version') + 1)
+                self.filter(pk=pk).update(
+                    balance=F('balance') + amount, version=F('version') + 1
+                )
+        return amount
+
+    def shard(self, pk: int, shards: int):
+        """Splits credits of a hot wallet over `shards` counter rows.
+
+        Credits of a busy wallet then don't queue up on its single row.
+        Existing shards are folded first, 0 shards turns sharding off.
+        """
+        with transaction.atomic():
+            list(self.select_for_update().filter(pk=pk).values_list('pk'))
+            self.fold(pk)
+            removed = WalletBalanceShard.objects.filter(wallet_id=pk)
+            # Keep the sum of versions growing for the listing ETags.
+            versions = removed.aggregate(total=Sum('version'))['total']
+            removed.delete()
+            WalletBalanceShard.objects.bulk_create(
+                WalletBalanceShard(wallet_id=pk, index=index)
+                for index in range(shards)
+            )
+            self.filter(pk=pk).update(
+                balance_shards=shards,
+                version=F('version') + (versions or 0) + 1,
+            )
+        # Cached wallets route credits by their `balance_shards`.
+        invalidate_wallet(pk)
+
+    def provision(self, names: list, chunk_size: int = 500) -> list:
+        """Creates wallets named `names` with ``bulk_create``.
+
+        Names and slugs are computed like ``Wallet.save`` does, collisions
+        within `names` or with ``RESERVED_SLUGS`` are found in Python and
+        with existing wallets by one query per chunk, the other wallets
+        are inserted. Returns
+        ``(name, slug, created)`` per name.
+        """
+        results = []
+        names_seen, slugs_seen = set(), set()
+        for name in names:
+            name = name or Wallet.default_name()
+            slug = slugify(name, allow_unicode=True)
+            fresh = name not in names_seen and slug not in slugs_seen \
+                and slug not in RESERVED_SLUGS
+            names_seen.add(name)
+            slugs_seen.add(slug)
+            results.append([name, slug, fresh])
+
+        for offset in range(0, len(results), chunk_size):
+            chunk = results[offset:offset + chunk_size]
+            while True:
+                fresh = [result for result in chunk if result[2]]
+                taken = self.filter(
+                    Q(name__in=[name for name, _, _ in fresh])
+                    | Q(slug__in=[slug for _, slug, _ in fresh])
+                ).values_list('name', 'slug')
+                names_taken = {name for name, _ in taken}
+                slugs_taken = {slug for _, slug in taken}
+                for result in fresh:
+                    result[2] = result[0] not in names_taken \
+                        and result[1] not in slugs_taken
+                try:
+                    with transaction.atomic():
+                        self.bulk_create(
+                            Wallet(name=name, slug=slug)
+                            for name, slug, created in chunk if created
+                        )
+                    break
+                except utils.IntegrityError:
+                    # A wallet has been created concurrently, check again.
+                    continue
+        return [tuple(result) for result in results]
+
+    def with_balance(self):
+        """Annotates `total_balance`, `balance` with the shard balances.
+
+        Both are read by one statement, so the sum is consistent.
+        """
+        shards = WalletBalanceShard.objects.filter(wallet=OuterRef('pk')) \
+            .order_by().values('wallet').annotate(total=Sum('balance')) \
+            .values('total')
+        return self.annotate(total_balance=Case(
+            When(balance_shards=0, then=F('balance')),
+            default=F('balance') + Coalesce(Subquery(shards), 0),
+            output_field=models.BigIntegerField(),
+        ))
+
+    def with_version(self):
+        """Annotates `total_version`, `version` with the shard versions."""
+        shards = WalletBalanceShard.objects.filter(wallet=OuterRef('pk')) \
+            .order_by().values('wallet').annotate(total=Sum('version')) \
+            .values('total')
+        return self.annotate(total_version=Case(
+            When(balance_shards=0, then=F('version')),
+            default=F('version') + Coalesce(Subquery(shards), 0),
+            output_field=models.BigIntegerField(),
+        ))
+
+    def listing_version(self) -> str:
+        """Returns a version of the wallets, changed by any change of them.
+
+        Creates raise the count and the highest id (ids are not reused),
+        deletes lower the count, other changes raise the sum of versions.
+        It is read from the database, so it is the same in every process.
+        """
+        versions = self.with_version().aggregate(
+            count=models.Count('pk'), last=models.Max('pk'),
+            total=Sum('total_version'),
+        )
+        return '{count}:{last}:{total}'.format(**versions)
+
+    def bump(self, pk: int) -> bool:
+        """Bumps the `version` of a wallet changed other than by balance."""
+        return self.filter(pk=pk).update(version=F('version') + 1) > 0
+
+
+# Fixed paths of ``money.api.urls`` next to wallet slugs, such as
+# ``wallets/bulk`` and ``transactions/transfer``.
+RESERVED_SLUGS = frozenset(['bulk', 'transfer'])
+
+
+def validate_wallet_name(name: str):
+    """Rejects names whose slug is taken by a fixed path of the API."""
+    if slugify(name, allow_unicode=True) in RESERVED_SLUGS:
+        raise ValidationError('This name is reserved.')
+
 
 class Wallet(models.Model):
-    name = models.CharField(max_length=100, blank=True, unique=True)
+    name = models.CharField(max_length=100, blank=True, unique=True,
+                            validators=[validate_wallet_name])
     slug = models.SlugField(max_length=150, unique=True, blank=True)
     balance = models.PositiveIntegerField(default=0, editable=False)
+    # Bumped on every change of the wallet or its transactions, backs
+    # ETags of the wallet resources.
+    version = models.PositiveBigIntegerField(default=0, editable=False)
+    # Number of ``WalletBalanceShard`` rows taking credits of a hot
+    # wallet, its balance is `balance` plus theirs.
+    balance_shards = models.PositiveSmallIntegerField(default=0,
+                                                      editable=False)
+
+    objects = WalletQuerySet.as_manager()
+
+    @staticmethod
+    def default_name() -> str:
+        return 'Wallet {}'.format(uuid.uuid4())
 
     def save(self, *args, **kwargs):
-        if self.name == '':
-            self.name = 'Wallet {}'.format(uuid.uuid4())
+        update_fields = kwargs.get('update_fields')
+        # Saves of other fields, e.g. ``update_fields=['balance']``, leave
+        # the name and the slug alone.
+        if update_fields is None or {'name', 'slug'} & set(update_fields):
+            if self.name == '':
+                self.name = self.default_name()
+            slug = slugify(self.name, allow_unicode=True)
+            if slug in RESERVED_SLUGS:
+                raise utils.IntegrityError(
+                    'The slug "{}" is reserved.'.format(slug)
+                )
+            if not self.slug or self.slug != slug:
+                self.slug = slug
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        if update_fields is None:
+            # `balance`, `version` and `balance_shards` are only changed by
+            # ``WalletQuerySet`` updates, an instance may hold stale values.
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name
+                not in ('balance', 'version', 'balance_shards')
+            ]
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            Wallet.objects.bump(self.pk)
+
+    def delete(self, *args, **kwargs):
+        """Deletes the wallet, with its transactions by cascade.
 
-        slug = slugify(self.name, allow_unicode=True)
-        if not self.slug or self.slug != slug:
-            self.slug = slug
-        return super().save(*args, **kwargs)
+        An append-only ledger keeps its rows, so there only wallets
+        without transactions can be deleted.
+        """
+        if Transaction.is_append_only() and (
+            self.transaction_set.exists()
+            or self.archived_transactions.exists()
+        ):
+            raise utils.IntegrityError(
+                'The ledger is append-only, the wallet has transactions.'
+            )
+        return super().delete(*args, **kwargs)
+
+    def total_balance(self) -> int:
+        """Returns the stored balance, with shards of a sharded wallet."""
+        return Wallet.objects.with_balance().values_list(
+            'total_balance', flat=True
+        ).get(pk=self.pk)
+
+    def current_version(self) -> int:
+        """Returns the stored `version` plus the versions of the shards."""
+        return Wallet.objects.with_version().values_list(
+            'total_version', flat=True
+        ).get(pk=self.pk)
+
+    def balance_at(self, at) -> int:
+        """Returns the balance of the wallet at the moment `at`.
+
+        Only transactions after the nearest snapshot are summed up, the
+        archived ones only if the archive reaches past the snapshot.
+        """
+        snapshot = self.snapshots.filter(data__lte=at).order_by('-data') \
+            .first()
+        balance = 0
+        transactions = self.transaction_set.filter(data__lte=at)
+        archived = self.archived_transactions.filter(data__lte=at)
+        if snapshot is not None:
+            balance = snapshot.balance
+            transactions = transactions.filter(data__gt=snapshot.data)
+            archived = archived.filter(data__gt=snapshot.data)
+        balance += transactions.balance_change()
+        boundary = self.archived_transactions.boundary()
+        if boundary is not None \
+                and (snapshot is None or boundary > snapshot.data):
+            balance += archived.balance_change()
+        return balance
+
+
+class TransactionQuerySet(models.QuerySet):
+
+    @staticmethod
+    def signed_amount():
+        """Returns an expression of `amount` as a change of a balance."""
+        return Case(
+            When(transaction_type=Transaction.TYPE_OUTCOME,
+                 then=-F('amount')),
+            default=F('amount'),
+            output_field=models.IntegerField(),
+        )
+
+    def balance_change(self) -> int:
+        """Returns the total change of a balance by the transactions."""
+        total = self.aggregate(total=Sum(self.signed_amount()))['total']
+        return total or 0
+
+    def balance_changes(self) -> dict:
+        """Returns the change of a balance by the transactions per wallet."""
+        return dict(
+            self.order_by().values_list('wallet')
+            .annotate(total=Sum(self.signed_amount()))
+        )
+
+    def provide_bulk(self, transactions: list) -> list:
+        """Provides transactions with one UPDATE per wallet, flags success."""
+        indexes_by_wallet = defaultdict(list)
+        for index, transaction_ in enumerate(transactions):
+            indexes_by_wallet[transaction_.wallet_id].append(index)
+        accepted = [False] * len(transactions)
+
+        with transaction.atomic():
+            # Wallets are updated in ascending id order like ``transfer``
+            # locks them, so concurrent batches don't deadlock.
+            for wallet_id in sorted(indexes_by_wallet):
+                indexes = indexes_by_wallet[wallet_id]
+                wallet = transactions[indexes[0]].wallet
+                # A guess of the balance, confirmed below on a rejection;
+                # the row of a sharded wallet holds only a part of it.
+                start = wallet.balance
+                if wallet.balance_shards:
+                    start = wallet.total_balance()
+                confirmed = False
+                while True:
+                    balance = lowest = start
+                    for index in indexes:
+                        delta = transactions[index].signed_amount
+                        accepted[index] = balance + delta >= 0
+                        if accepted[index]:
+                            balance += delta
+                            lowest = min(lowest, balance)
+                    final = confirmed \
+                        or all(accepted[index] for index in indexes)
+                    if final and (
+                        not any(accepted[index] for index in indexes)
+                        or Wallet.objects.settle(
+                            wallet_id, balance - start, start - lowest,
+                            wallet.balance_shards
+                        )
+                    ):
+                        break
+                    # The guess was stale or the balance has been changed
+                    # concurrently, read the stored one.
+                    start = Wallet.objects.with_balance().values_list(
+                        'total_balance', flat=True
+                    ).get(pk=wallet_id)
+                    confirmed = True
+                wallet.balance = balance
+            created = self.bulk_create(
+                [transaction_ for transaction_, success
+                 in zip(transactions, accepted) if success]
+            )
+            WalletDailyRollup.objects.add(created)
+        return accepted
+
+    def transfer(self, source: 'Wallet', target: 'Wallet', amount: int,
+                 comment: str = '') -> tuple:
+        """Moves `amount` from `source` to `target` wallet atomically.
+
+        Both wallets are locked in ascending id order before any change,
+        so opposing transfers queue up instead of deadlocking. Databases
+        without ``SELECT ... FOR UPDATE`` (SQLite) take the locks with the
+        UPDATEs themselves, a read first would fail to upgrade to a write.
+        The debit and the credit are committed together with an outcome
+        transaction of `source` and an income transaction of `target`.
+        Returns the pair of transactions or ``None`` if `source` balance
+        is insufficient.
+        """
+        with transaction.atomic():
+            if connection.features.has_select_for_update:
+                list(
+                    Wallet.objects.select_for_update()
+                    .filter(pk__in=[source.pk, target.pk])
+                    .order_by('pk').values_list('pk', flat=True)
+                )
+            if source.pk > target.pk:
+                Wallet.objects.credit(target.pk, amount,
+                                      target.balance_shards)
+            if not Wallet.objects.debit(source.pk, amount,
+                                        source.balance_shards):
+                transaction.set_rollback(True)
+                return None
+            if source.pk < target.pk:
+                Wallet.objects.credit(target.pk, amount,
+                                      target.balance_shards)
+            pair = (
+                Transaction(wallet=source, amount=amount, comment=comment,
+                            transaction_type=Transaction.TYPE_OUTCOME),
+                Transaction(wallet=target, amount=amount, comment=comment,
+                            transaction_type=Transaction.TYPE_INCOME),
+            )
+            for transaction_ in pair:
+                transaction_.save()
+        source.balance -= amount
+        target.balance += amount
+        return pair
 
 
 class Transaction(models.Model):
@@ -27,42 +418,484 @@ class Transaction(models.Model):
         (TYPE_OUTCOME, 'Withdrawal'),
     )
     wallet = models.ForeignKey(
-        Wallet, on_delete=models.CASCADE, editable=False
+        Wallet, on_delete=models.CASCADE, editable=False, db_index=False
     )
     transaction_type = models.CharField(
         max_length=10, choices=TYPE_CHOICES, blank=False, default=None
     )
-    data = models.DateTimeField(auto_now_add=True, editable=False)
+    # A default rather than ``auto_now_add``, so imported rows keep
+    # their dates through ``bulk_create``.
+    data = models.DateTimeField(default=timezone.now, editable=False)
     amount = models.PositiveIntegerField(default=0)
     comment = models.TextField(max_length=2500, blank=True)
+    reversal_of = models.OneToOneField(
+        'self', on_delete=models.RESTRICT, null=True, blank=True,
+        editable=False, related_name='reversal'
+    )
+
+    objects = TransactionQuerySet.as_manager()
+
+    class Meta:
+        # Listings are read in (data, id) or (amount, id) order, globally
+        # or per wallet, both ways; other filters are checked on the rows
+        # of a bounded page. The wallet indexes also serve plain wallet
+        # lookups and cascades.
+        indexes = [
+            models.Index(fields=['data', 'id'],
+                         name='transaction_data_id_idx'),
+            models.Index(fields=['wallet', 'data', 'id'],
+                         name='transaction_wallet_data_idx'),
+            models.Index(fields=['transaction_type', 'data'],
+                         name='transaction_type_data_idx'),
+            models.Index(fields=['amount', 'id'],
+                         name='transaction_amount_id_idx'),
+            models.Index(fields=['wallet', 'amount', 'id'],
+                         name='transaction_wallet_amount_idx'),
+        ]
+
+    @property
+    def signed_amount(self) -> int:
+        """Returns `amount` as a change of a wallet `balance`."""
+        if self.transaction_type == self.TYPE_OUTCOME:
+            return -self.amount
+        return self.amount
 
     def provide_transaction(self) -> ('Transaction', bool):
-        """Changes a wallet `balance` considering transactions `amount`."""
+        """Changes a wallet `balance` considering transactions `amount`.
+
+        The balance is changed in the database, not in Python, so the
+        in-memory `wallet.balance` is only adjusted by the applied amount
+        and may lag behind concurrent writers.
+        """
         if not (self.wallet or self.transaction_type or self.amount):
             return self, False
+        shards = self.wallet.balance_shards
         if self.transaction_type == self.TYPE_INCOME:
-            self.wallet.balance += self.amount
-            self.wallet.save(update_fields=['balance'])
-        elif self.transaction_type == self.TYPE_OUTCOME \
-                and self.wallet.balance >= self.amount:
-            self.wallet.balance -= self.amount
-            self.wallet.save(update_fields=['balance'])
+            success = Wallet.objects.credit(self.wallet_id, self.amount,
+                                            shards)
+            delta = self.amount
+        elif self.transaction_type == self.TYPE_OUTCOME:
+            success = Wallet.objects.debit(self.wallet_id, self.amount,
+                                           shards)
+            delta = -self.amount
         else:
             return self, False
-        return self, True
+        if success:
+            self.wallet.balance += delta
+        return self, success
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            if adding:
+                WalletDailyRollup.objects.add([self])
+
+    @staticmethod
+    def is_append_only() -> bool:
+        """Whether transactions are reversed instead of deleted.
+
+        Read on every call, so ``MONEY_APPEND_ONLY_LEDGER`` can be
+        switched without a restart of the module.
+        """
+        return getattr(settings, 'MONEY_APPEND_ONLY_LEDGER', False)
+
+    def reverse(self) -> 'Transaction':
+        """Cancels the transaction by a compensating reversal entry.
+
+        The reversal has the opposite type and the same amount and is
+        provided like a new transaction, so the balance, rollups and the
+        ledger sum stay consistent while no row is updated or deleted.
+        The unique `reversal_of` link lets a transaction be reversed only
+        once. Raises ``IntegrityError`` if the transaction is a reversal
+        itself, already reversed or the balance is insufficient.
+        """
+        if self.reversal_of_id is not None:
+            raise utils.IntegrityError('A reversal cannot be reversed.')
+        transaction_type = (self.TYPE_OUTCOME
+                            if self.transaction_type == self.TYPE_INCOME
+                            else self.TYPE_INCOME)
+        reversal = Transaction(
+            wallet=self.wallet, transaction_type=transaction_type,
+            amount=self.amount, reversal_of=self,
+            comment='Reversal of transaction {}.'.format(self.pk)
+        )
+        with transaction.atomic():
+            reversal, success = reversal.provide_transaction()
+            if not success:
+                raise utils.IntegrityError
+            reversal.save()
+        return reversal
 
     def is_deletion_possible(self) -> bool:
-        """Checks possibility of rollback of the transaction."""
+        """Checks possibility of rollback of the transaction.
+
+        The check uses the in-memory wallet state, ``delete`` repeats it
+        atomically in the database.
+        """
         if not (self.wallet or self.transaction_type or self.amount):
             return False
         if self.transaction_type == self.TYPE_INCOME:
-            return self.wallet.balance >= self.amount
+            # Shards of a sharded wallet are not loaded.
+            return bool(self.wallet.balance_shards) \
+                or self.wallet.balance >= self.amount
         return True
 
     def delete(self, *args, **kwargs):
-        if self.is_deletion_possible():
-            self.wallet.balance -= self.amount
-            self.wallet.save(update_fields=['balance'])
-        else:
+        if self.is_append_only():
+            raise utils.IntegrityError(
+                'The ledger is append-only, reverse the transaction.'
+            )
+        if not self.is_deletion_possible():
             raise utils.IntegrityError
-        return super().delete(*args, **kwargs)
+        shards = self.wallet.balance_shards
+        with transaction.atomic():
+            if self.transaction_type == self.TYPE_INCOME:
+                success = Wallet.objects.debit(self.wallet_id, self.amount,
+                                               shards)
+                delta = -self.amount
+            else:
+                success = Wallet.objects.credit(self.wallet_id, self.amount,
+                                                shards)
+                delta = self.amount
+            if not success:
+                raise utils.IntegrityError
+            self.wallet.balance += delta
+            WalletBalanceSnapshot.objects.filter(
+                wallet_id=self.wallet_id, data__gte=self.data
+            ).update(balance=F('balance') + delta)
+            WalletDailyRollup.objects.add([self], sign=-1)
+            return super().delete(*args, **kwargs)
+
+
+class ArchivedTransactionQuerySet(models.QuerySet):
+
+    signed_amount = staticmethod(TransactionQuerySet.signed_amount)
+    balance_change = TransactionQuerySet.balance_change
+    balance_changes = TransactionQuerySet.balance_changes
+
+    def boundary(self):
+        """Returns the date of the newest archived transaction or ``None``.
+
+        Readers of the history query the archive only if the requested
+        range reaches back to this date.
+        """
+        return self.order_by('-data').values_list('data', flat=True).first()
+
+
+class ArchivedTransaction(models.Model):
+    """Transaction moved out of the ``Transaction`` table by archival.
+
+    Rows keep their ids and fields, so listings read both tables alike.
+    A reversal is archived together with the transaction it reverses,
+    their link stays within one table.
+    """
+    wallet = models.ForeignKey(
+        Wallet, on_delete=models.CASCADE, editable=False, db_index=False,
+        related_name='archived_transactions'
+    )
+    transaction_type = models.CharField(max_length=10,
+                                        choices=Transaction.TYPE_CHOICES)
+    data = models.DateTimeField()
+    amount = models.PositiveIntegerField()
+    comment = models.TextField(max_length=2500, blank=True)
+    reversal_of = models.OneToOneField(
+        'self', on_delete=models.DO_NOTHING, null=True, blank=True,
+        db_constraint=False, related_name='reversal'
+    )
+
+    objects = ArchivedTransactionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['data', 'id'],
+                         name='archived_data_id_idx'),
+            models.Index(fields=['wallet', 'data', 'id'],
+                         name='archived_wallet_data_idx'),
+        ]
+
+
+class WalletBalanceShardQuerySet(models.QuerySet):
+
+    def credit(self, wallet_id: int, shards: int, amount: int) -> bool:
+        """Adds `amount` to a random one of `shards` shards of a wallet.
+
+        Returns ``False`` if the wallet has no such shard (any more).
+        """
+        if not self.filter(
+            wallet_id=wallet_id, index=random.randrange(shards)
+        ).update(balance=F('balance') + amount, version=F('version') + 1):
+            return False
+        return True
+
+
+class WalletBalanceShard(models.Model):
+    """Part of the balance of a hot wallet taking a share of its credits.
+
+    Concurrent credits of the wallet update one of its shard rows at
+    random instead of all waiting for the lock of the wallet row.
+    """
+    wallet = models.ForeignKey(
+        Wallet, on_delete=models.CASCADE, related_name='shards'
+    )
+    index = models.PositiveSmallIntegerField()
+    balance = models.PositiveBigIntegerField(default=0)
+    version = models.PositiveBigIntegerField(default=0)
+
+    objects = WalletBalanceShardQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['wallet', 'index'],
+                                    name='unique_wallet_shard'),
+        ]
+
+
+class WalletBalanceSnapshotQuerySet(models.QuerySet):
+
+    def take(self, until=None, lag: int = None) -> int:
+        """Takes snapshots of wallets changed since the last snapshots.
+
+        Snapshots are taken for all wallets at the same moment, so only
+        transactions between the last snapshot and `until` are summed up
+        and added to the previous snapshot of each wallet. `data` of a
+        transaction is set before it commits, so `until` stays `lag`
+        seconds (``MONEY_SNAPSHOT_LAG``) behind now and no transaction
+        still being committed falls behind the last snapshot. Returns the
+        number of taken snapshots.
+        """
+        if lag is None:
+            lag = getattr(settings, 'MONEY_SNAPSHOT_LAG', 60)
+        latest = timezone.now() - datetime.timedelta(seconds=lag)
+        until = min(until or latest, latest)
+        transactions = Transaction.objects.filter(data__lte=until)
+        since = self.aggregate(since=models.Max('data'))['since']
+        if since is not None:
+            if since >= until:
+                return 0
+            transactions = transactions.filter(data__gt=since)
+
+        with transaction.atomic():
+            changes = transactions.balance_changes()
+            previous = self.filter(wallet=OuterRef('pk')).order_by('-data')
+            wallet_ids = list(changes)
+            balances = {}
+            for offset in range(0, len(wallet_ids), 500):
+                balances.update(
+                    Wallet.objects.filter(
+                        pk__in=wallet_ids[offset:offset + 500]
+                    ).annotate(
+                        last=Subquery(previous.values('balance')[:1])
+                    ).values_list('pk', 'last')
+                )
+            snapshots = self.bulk_create(
+                WalletBalanceSnapshot(
+                    wallet_id=wallet_id, data=until,
+                    balance=(balances.get(wallet_id) or 0) + change
+                )
+                for wallet_id, change in changes.items()
+                if wallet_id in balances
+            )
+        return len(snapshots)
+
+    def rebuild(self, wallet_ids: list) -> int:
+        """Recomputes the snapshots of `wallet_ids` from their transactions.
+
+        Archived transactions are included, so rows added before existing
+        snapshots, e.g. imported ones, are folded into them. Returns the
+        number of updated snapshots.
+        """
+        ledger, archived = (
+            model.objects.filter(wallet=OuterRef('wallet'),
+                                 data__lte=OuterRef('data'))
+            .order_by().values('wallet')
+            .annotate(total=Sum(model.objects.signed_amount()))
+            .values('total')
+            for model in (Transaction, ArchivedTransaction)
+        )
+        return self.filter(wallet_id__in=wallet_ids).update(
+            balance=Coalesce(Subquery(ledger), 0)
+            + Coalesce(Subquery(archived), 0)
+        )
+
+
+class WalletBalanceSnapshot(models.Model):
+    """Balance of a wallet including all transactions up to `data`."""
+    wallet = models.ForeignKey(
+        Wallet, on_delete=models.CASCADE, related_name='snapshots'
+    )
+    data = models.DateTimeField()
+    balance = models.BigIntegerField()
+
+    objects = WalletBalanceSnapshotQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['wallet', 'data'],
+                                    name='unique_wallet_snapshot'),
+        ]
+
+
+class WalletDailyRollupQuerySet(models.QuerySet):
+    BUCKETS = {'day': F('day'), 'month': TruncMonth('day')}
+
+    @staticmethod
+    def day_of(data) -> datetime.date:
+        if timezone.is_aware(data):
+            return timezone.localdate(data)
+        return data.date()
+
+    def add(self, transactions, sign: int = 1) -> None:
+        """Adds (`sign` -1: subtracts) `transactions` to their day rollups."""
+        changes = defaultdict(lambda: [0, 0, 0, 0])
+        for transaction_ in transactions:
+            change = changes[transaction_.wallet_id,
+                             self.day_of(transaction_.data)]
+            if transaction_.transaction_type == Transaction.TYPE_INCOME:
+                change[0] += sign * transaction_.amount
+                change[1] += sign
+            else:
+                change[2] += sign * transaction_.amount
+                change[3] += sign
+
+        # Sorted, so concurrent calls lock the rows in the same order.
+        for (wallet_id, day), change in sorted(changes.items()):
+            totals = dict(zip(
+                ('income', 'income_count', 'outcome', 'outcome_count'),
+                change
+            ))
+            rollup = self.filter(wallet_id=wallet_id, day=day)
+            values = {name: F(name) + value for name, value in totals.items()}
+            # Without a rollup the day predates the backfill, there is
+            # nothing to subtract from, a rebuild sums the day up.
+            if rollup.update(**values) or sign < 0:
+                continue
+            try:
+                with transaction.atomic():
+                    self.create(wallet_id=wallet_id, day=day, **totals)
+            except utils.IntegrityError:
+                # The rollup has been inserted concurrently.
+                rollup.update(**values)
+
+    def rebuild(self, wallet_ids: list) -> int:
+        """Recomputes the rollups of `wallet_ids` from their transactions.
+
+        Archived transactions are included, a day may span both tables.
+
+        Wallets are locked for the time of the rebuild, so transactions
+        provided concurrently wait for it. Returns the number of rollups.
+        """
+        with transaction.atomic():
+            list(Wallet.objects.select_for_update().filter(pk__in=wallet_ids)
+                 .order_by('pk').values_list('pk', flat=True))
+            self.filter(wallet_id__in=wallet_ids).delete()
+            rollups = {}
+            rows = itertools.chain.from_iterable(
+                model.objects.filter(wallet_id__in=wallet_ids).order_by()
+                .values_list('wallet', 'data__date', 'transaction_type')
+                .annotate(total=Sum('amount'), count=models.Count('id'))
+                for model in (Transaction, ArchivedTransaction)
+            )
+            for wallet_id, day, transaction_type, total, count in rows:
+                rollup = rollups.setdefault(
+                    (wallet_id, day),
+                    WalletDailyRollup(wallet_id=wallet_id, day=day)
+                )
+                if transaction_type == Transaction.TYPE_INCOME:
+                    rollup.income += total
+                    rollup.income_count += count
+                else:
+                    rollup.outcome += total
+                    rollup.outcome_count += count
+            return len(self.bulk_create(rollups.values()))
+
+    def stats(self, bucket: str = 'day') -> list:
+        """Returns totals per `bucket` (``day`` or ``month``) in order."""
+        rows = self.annotate(period=self.BUCKETS[bucket]).order_by('period') \
+            .values_list('period').annotate(
+                Sum('income'), Sum('income_count'),
+                Sum('outcome'), Sum('outcome_count'),
+            )
+        names = ('period', 'income', 'income_count', 'outcome',
+                 'outcome_count')
+        return [dict(zip(names, row)) for row in rows]
+
+
+class WalletDailyRollup(models.Model):
+    """Totals of income and outcome transactions of a wallet in a day.
+
+    Days are taken in the current time zone.
+    """
+    wallet = models.ForeignKey(
+        Wallet, on_delete=models.CASCADE, related_name='rollups'
+    )
+    day = models.DateField()
+    income = models.BigIntegerField(default=0)
+    income_count = models.IntegerField(default=0)
+    outcome = models.BigIntegerField(default=0)
+    outcome_count = models.IntegerField(default=0)
+
+    objects = WalletDailyRollupQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['wallet', 'day'],
+                                    name='unique_wallet_rollup'),
+        ]
+
+
+class IdempotencyKeyQuerySet(models.QuerySet):
+
+    def expired(self, ttl: int):
+        cutoff = timezone.now() - datetime.timedelta(seconds=ttl)
+        return self.filter(created__lt=cutoff)
+
+    def execute(self, key: str, fingerprint: str, action,
+                ttl: int = 86400) -> (int, object, bool):
+        """Runs `action` once per `key` and returns its stored result.
+
+        `action` returns a status code and JSON-serializable data. The key
+        is inserted in the same database transaction as the work of
+        `action`, so a concurrent duplicate waits on the unique index and
+        then replays the committed result instead of running again.
+        Keys older than `ttl` seconds are treated as unused. Returns the
+        status code, data and whether the result is a replay; a key reused
+        for another request (`fingerprint`) gives status 422.
+        """
+        for _ in range(2):
+            with transaction.atomic():
+                try:
+                    with transaction.atomic():
+                        record = self.create(key=key, fingerprint=fingerprint)
+                except utils.IntegrityError:
+                    pass
+                else:
+                    status_code, data = action()
+                    record.status_code = status_code
+                    record.response = json.dumps(data)
+                    record.save(update_fields=['status_code', 'response'])
+                    return status_code, data, False
+            record = self.filter(key=key).first()
+            if record is None:
+                continue
+            if self.expired(ttl).filter(pk=record.pk).delete()[0]:
+                continue
+            if record.fingerprint != fingerprint:
+                data = {'details': 'The Idempotency-Key is already used '
+                                   'for another request.'}
+                return 422, data, False
+            return record.status_code, json.loads(record.response), True
+        raise utils.IntegrityError(
+            'Idempotency key {} is being recreated concurrently.'.format(key)
+        )
+
+
+class IdempotencyKey(models.Model):
+    """Result of a request made with an ``Idempotency-Key`` header."""
+    key = models.CharField(max_length=255, unique=True)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    objects = IdempotencyKeyQuerySet.as_manager()
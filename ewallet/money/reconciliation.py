@@ -0,0 +1,103 @@
+"""Module with verification of wallet balances against the ledger."""
+import time
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from money.models import ArchivedTransaction, Transaction, Wallet
+
+
+Mismatch = namedtuple('Mismatch', ['wallet_id', 'balance', 'ledger'])
+
+
+def ledger_balances(wallet_ids) -> dict:
+    """Returns ``{wallet_id: (balance, rows)}`` computed from transactions.
+
+    The wallets are expected to be a contiguous id range, so the grouped
+    aggregate reads one range of the (wallet, data, id) index of the
+    transactions and one of the archived transactions.
+    """
+    balances = {}
+    for model in (Transaction, ArchivedTransaction):
+        rows = model.objects.filter(
+            wallet_id__gte=min(wallet_ids), wallet_id__lte=max(wallet_ids)
+        ).order_by().values_list('wallet').annotate(
+            total=Sum(model.objects.signed_amount()), rows=Count('id')
+        )
+        for wallet_id, total, count in rows:
+            balance, before = balances.get(wallet_id, (0, 0))
+            balances[wallet_id] = (balance + total, before + count)
+    return balances
+
+
+def repair_balance(wallet_id: int) -> Mismatch:
+    """Sets a wallet `balance` to the sum of its transactions.
+
+    The wallet row is locked first, so the ledger can't change between
+    the sum and the update on backends supporting ``SELECT FOR UPDATE``.
+    Shards of a sharded wallet are folded into `balance` first.
+    """
+    with transaction.atomic():
+        balance = Wallet.objects.select_for_update().values_list(
+            'balance', flat=True
+        ).get(pk=wallet_id)
+        balance += Wallet.objects.fold(wallet_id)
+        ledger = Transaction.objects.filter(
+            wallet_id=wallet_id
+        ).balance_change() + ArchivedTransaction.objects.filter(
+            wallet_id=wallet_id
+        ).balance_change()
+        if balance != ledger:
+            Wallet.objects.filter(pk=wallet_id).update(
+                balance=ledger, version=F('version') + 1
+            )
+    return Mismatch(wallet_id, balance, ledger)
+
+
+def reconcile_balances(chunk_size: int = 1000, repair: bool = False,
+                       on_mismatch=None) -> dict:
+    """Compares every wallet `balance` with the sum of its transactions.
+
+    Wallets are processed in id chunks with one grouped aggregate per
+    chunk, so memory depends on `chunk_size` and not on the table sizes.
+    Mismatches are passed to `on_mismatch` and, with `repair`, fixed by
+    ``repair_balance``. Returns counters of the run.
+    """
+    report = {'wallets': 0, 'transactions': 0, 'mismatches': 0,
+              'repaired': 0}
+    started = time.perf_counter()
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            wallets = list(
+                Wallet.objects.filter(pk__gt=last_id).order_by('pk')
+                .with_balance()
+                .values_list('pk', 'total_balance')[:chunk_size]
+            )
+            if not wallets:
+                break
+            ledger = ledger_balances([wallet_id for wallet_id, _ in wallets])
+        last_id = wallets[-1][0]
+        report['wallets'] += len(wallets)
+
+        for wallet_id, balance in wallets:
+            total, rows = ledger.get(wallet_id, (0, 0))
+            report['transactions'] += rows
+            if balance == total:
+                continue
+            mismatch = Mismatch(wallet_id, balance, total)
+            if repair:
+                mismatch = repair_balance(wallet_id)
+                if mismatch.balance == mismatch.ledger:
+                    continue
+                report['repaired'] += 1
+            report['mismatches'] += 1
+            if on_mismatch is not None:
+                on_mismatch(mismatch)
+
+    report['seconds'] = round(time.perf_counter() - started, 3)
+    report['rows_per_sec'] = round(
+        report['transactions'] / report['seconds'], 1
+    ) if report['seconds'] else 0.0
+    return report
@@ -0,0 +1,12 @@
+"""Module with signal receivers of the money app."""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from money.cache import invalidate_wallet
+from money.models import Wallet
+
+
+@receiver(post_save, sender=Wallet)
+@receiver(post_delete, sender=Wallet)
+def invalidate_wallet_cache(sender, instance, **kwargs):
+    invalidate_wallet(instance.pk)
@@ -0,0 +1,46 @@
+"""Module with helpers of the money tests."""
+import contextlib
+import os
+import sqlite3
+import tempfile
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import TransactionTestCase
+
+
+class FileDatabaseTestCase(TransactionTestCase):
+    """Runs its tests on a temporary file copy of an in-memory database.
+
+    In-memory SQLite locks whole tables between threads and never closes
+    its connections, so tests of concurrent threads or of connection
+    handling need a file. Other test databases are used as they are.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.memory_connection = None
+        if connection.vendor != 'sqlite' or not connection.is_in_memory_db():
+            return
+        cls.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(cls.directory.name, 'db.sqlite3')
+        memory = connections[DEFAULT_DB_ALIAS]
+        memory.ensure_connection()
+        with contextlib.closing(sqlite3.connect(path)) as target:
+            memory.connection.backup(target)
+        cls.memory_connection = memory
+        # Connections of every thread are opened with the new settings.
+        connections.databases[DEFAULT_DB_ALIAS] = {
+            **memory.settings_dict, 'NAME': path
+        }
+        del connections[DEFAULT_DB_ALIAS]
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.memory_connection is not None:
+            connections[DEFAULT_DB_ALIAS].close()
+            connections.databases[DEFAULT_DB_ALIAS] = \
+                cls.memory_connection.settings_dict
+            connections[DEFAULT_DB_ALIAS] = cls.memory_connection
+            cls.directory.cleanup()
+        super().tearDownClass()
@@ -1,8 +1,33 @@
-from django.test import TestCase
-from django.db import utils
+import datetime
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+
+from django.core.management import CommandError, call_command
+from django.http import Http404
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test import TransactionTestCase as DBTransactionTestCase
+from django.db import connection, transaction as db_transaction, utils
+from django.utils import timezone
 from django.utils.text import slugify
 
-from money.models import Wallet, Transaction
+from benchmarks.startup import boot
+from money import cache, intake
+from money.archive import archive_transactions
+from money.db import configure_connection
+from money.models import (
+    ArchivedTransaction,
+    Wallet,
+    Transaction,
+    WalletBalanceSnapshot,
+    WalletDailyRollup,
+)
+from money.reconciliation import reconcile_balances
+from money.testing import FileDatabaseTestCase
 
 
 FIRST_WALLET_NAME = 'wallet1'
@@ -43,6 +68,69 @@ class WalletTestCase(TestCase):
             wallet2.slug, slugify(SECOND_WALLET_NAME, allow_unicode=True)
         )
 
+    def test_reserved_slug(self):
+        with self.assertRaises(utils.IntegrityError):
+            Wallet.objects.create(name='Transfer')
+        results = Wallet.objects.provision(['bulk', 'Not bulk'])
+        self.assertEquals([created for _, _, created in results],
+                          [False, True])
+
+    def test_save_other_fields_keeps_slug(self):
+        wallet = Wallet.objects.get(name=FIRST_WALLET_NAME)
+        Wallet.objects.filter(pk=wallet.pk).update(slug='custom')
+        wallet.slug = 'custom'
+        wallet.save(update_fields=['balance'])
+        wallet.refresh_from_db()
+        self.assertEquals(wallet.slug, 'custom')
+
+    def test_provision(self):
+        # One SELECT and one INSERT, the savepoint adds two more.
+        with self.assertNumQueries(4):
+            results = Wallet.objects.provision(
+                ['New', FIRST_WALLET_NAME, 'new', 'New', 'Other', '']
+            )
+        self.assertEquals(
+            [(name, slug, created) for name, slug, created in results[:5]],
+            [('New', 'new', True), (FIRST_WALLET_NAME, 'wallet1', False),
+             ('new', 'new', False), ('New', 'new', False),
+             ('Other', 'other', True)]
+        )
+        self.assertTrue(results[5][2])
+        self.assertTrue(Wallet.objects.filter(name=results[5][0]).exists())
+        self.assertEquals(Wallet.objects.count(), 5)
+
+    def test_provision_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'names.txt')
+            with open(path, 'w') as file:
+                file.write('Alpha\nBeta\n\n{}\n'.format(FIRST_WALLET_NAME))
+            stderr = io.StringIO()
+            call_command('provision_wallets', path, chunk_size=1,
+                         stdout=io.StringIO(), stderr=stderr)
+        self.assertIn(FIRST_WALLET_NAME, stderr.getvalue())
+        call_command('provision_wallets', count=3, stdout=io.StringIO())
+        self.assertEquals(Wallet.objects.count(), 7)
+        with self.assertRaises(CommandError):
+            call_command('provision_wallets', stdout=io.StringIO())
+
+    def test_version(self):
+        wallet = Wallet.objects.get(name=FIRST_WALLET_NAME)
+        self.assertEquals(wallet.version, 0)
+        wallet.name = 'Renamed'
+        wallet.save()
+        Wallet.objects.credit(wallet.pk, 10)
+        Wallet.objects.debit(wallet.pk, 5)
+        Transaction.objects.provide_bulk([
+            Transaction(wallet=wallet, amount=0,
+                        transaction_type=Transaction.TYPE_INCOME)
+        ])
+        wallet.refresh_from_db()
+        self.assertEquals(wallet.version, 4)
+        # A failed debit changes nothing.
+        Wallet.objects.debit(wallet.pk, 100)
+        wallet.refresh_from_db()
+        self.assertEquals(wallet.version, 4)
+
 
 class TransactionTestCase(TestCase):
 
@@ -83,3 +171,816 @@ class TransactionTestCase(TestCase):
         transaction = Transaction(wallet=wallet)
         with self.assertRaises(utils.IntegrityError):
             transaction.save()
+
+    def test_save_keeps_balance(self):
+        stale = Wallet.objects.get(name=FIRST_WALLET_NAME)
+        Wallet.objects.credit(stale.pk, 10)
+        stale.name = 'wallet renamed'
+        stale.save()
+        wallet = Wallet.objects.get(pk=stale.pk)
+        self.assertEquals(wallet.name, 'wallet renamed')
+        self.assertEquals(wallet.balance, 10)
+
+
+class WalletCacheTestCase(TestCase):
+
+    def setUp(self):
+        cache.get_cache().clear()
+        self.wallet = Wallet.objects.create(name=FIRST_WALLET_NAME)
+
+    def test_hit(self):
+        cache.get_wallet('name', FIRST_WALLET_NAME)
+        cache.get_wallet('slug', self.wallet.slug)
+        before = cache.stats()
+        with self.assertNumQueries(0):
+            cache.get_wallet('slug', self.wallet.slug)
+            wallet = cache.get_wallet('name', FIRST_WALLET_NAME)
+        self.assertEquals(wallet.pk, self.wallet.pk)
+        self.assertEquals(cache.stats()['wallet_hits'],
+                          before.get('wallet_hits', 0) + 2)
+
+    def test_missing(self):
+        with self.assertRaises(Http404):
+            cache.get_wallet('name', SECOND_WALLET_NAME)
+
+    def test_balance_mutation(self):
+        cache.get_wallet('name', FIRST_WALLET_NAME)
+        Wallet.objects.credit(self.wallet.pk, 10)
+        Wallet.objects.debit(self.wallet.pk, 5)
+        # Balances are read from the database, the entry stays.
+        with self.assertNumQueries(0):
+            cache.get_wallet('name', FIRST_WALLET_NAME)
+        self.assertEquals(self.wallet.total_balance(), 5)
+
+    def test_shard(self):
+        cache.get_wallet('name', FIRST_WALLET_NAME)
+        Wallet.objects.shard(self.wallet.pk, 2)
+        self.assertEquals(
+            cache.get_wallet('name', FIRST_WALLET_NAME).balance_shards, 2
+        )
+
+    def test_rename(self):
+        cache.get_wallet('name', FIRST_WALLET_NAME)
+        self.wallet.name = SECOND_WALLET_NAME
+        self.wallet.save()
+        cache.get_wallet('name', SECOND_WALLET_NAME)
+        with self.assertRaises(Http404):
+            cache.get_wallet('name', FIRST_WALLET_NAME)
+
+    def test_delete(self):
+        cache.get_wallet('slug', self.wallet.slug)
+        Wallet.objects.all().delete()
+        with self.assertRaises(Http404):
+            cache.get_wallet('slug', self.wallet.slug)
+
+
+class BalanceMutationTestCase(TestCase):
+
+    def setUp(self):
+        self.wallet = Wallet.objects.create(name=FIRST_WALLET_NAME)
+        Wallet.objects.filter(pk=self.wallet.pk).update(balance=100)
+        self.wallet.refresh_from_db()
+
+    def test_credit(self):
+        self.assertTrue(Wallet.objects.credit(self.wallet.pk, 50))
+        self.wallet.refresh_from_db()
+        self.assertEquals(self.wallet.balance, 150)
+
+    def test_debit(self):
+        self.assertTrue(Wallet.objects.debit(self.wallet.pk, 100))
+        self.wallet.refresh_from_db()
+        self.assertEquals(self.wallet.balance, 0)
+
+    def test_debit_insufficient(self):
+        self.assertFalse(Wallet.objects.debit(self.wallet.pk, 101))
+        self.wallet.refresh_from_db()
+        self.assertEquals(self.wallet.balance, 100)
+
+    def test_outcome_uses_database_balance(self):
+        stale = Wallet.objects.get(pk=self.wallet.pk)
+        Wallet.objects.debit(self.wallet.pk, 60)
+        transaction = Transaction(
+            wallet=stale, transaction_type=Transaction.TYPE_OUTCOME,
+            amount=60
+        )
+        transaction, success = transaction.provide_transaction()
+        self.assertFalse(success)
+        self.wallet.refresh_from_db()
+        self.assertEquals(self.wallet.balance, 40)
+
+    def test_delete_outcome_refunds(self):
+        transaction = Transaction(
+            wallet=self.wallet, transaction_type=Transaction.TYPE_OUTCOME,
+            amount=30
+        )
+        transaction, success = transaction.provide_transaction()
+        self.assertTrue(success)
+        transaction.save()
+        transaction.delete()
+        self.wallet.refresh_from_db()
+        self.assertEquals(self.wallet.balance, 100)
+
+    def test_delete_income_insufficient(self):
+        transaction = Transaction.objects.create(
+            wallet=self.wallet, transaction_type=Transaction.TYPE_INCOME,
+            amount=100
+        )
+        Wallet.objects.debit(self.wallet.pk, 50)
+        with self.assertRaises(utils.IntegrityError):
+            transaction.delete()
+        self.assertTrue(Transaction.objects.filter(pk=transaction.pk).exists())
+
+
+class ShardedWalletTestCase(TestCase):
+
+    def setUp(self):
+        self.wallet = Wallet.objects.create(name=FIRST_WALLET_NAME)
+        self.provide(Transaction.TYPE_INCOME, 10)
+        Wallet.objects.shard(self.wallet.pk, 4)
+        self.wallet.refresh_from_db()
+
+    def provide(self, transaction_type, amount):
+        transaction, success = Transaction(
+            wallet=self.wallet, transaction_type=transaction_type,
+            amount=amount
+        ).provide_transaction()
+        if success:
+            transaction.save()
+        return success
+
+    def test_credit_lands_on_shards(self):
+        for _ in range(20):
+            self.assertTrue(self.provide(Transaction.TYPE_INCOME, 5))
+        self.assertEquals(
+            Wallet.objects.values_list('balance', flat=True)
+            .get(pk=self.wallet.pk), 10
+        )
+        self.assertEquals(self.wallet.total_balance(), 110)
+        self.assertEquals(
+            Wallet.objects.with_balance().get(pk=self.wallet.pk)
+            .total_balance, 110
+        )
+
+    def test_debit_folds_shards(self):
+        self.provide(Transaction.TYPE_INCOME, 50)
+        self.assertTrue(self.provide(Transaction.TYPE_OUTCOME, 60))
+        self.assertFalse(self.provide(Transaction.TYPE_OUTCOME, 1))
+        self.assertEquals(self.wallet.total_balance(), 0)
+        self.assertEquals(reconcile_balances()['mismatches'], 0)
+
+    def test_bulk(self):
+        accepted = Transaction.objects.provide_bulk([
+            Transaction(wallet=self.wallet, amount=amount,
+                        transaction_type=transaction_type)
+            for transaction_type, amount in [
+                (Transaction.TYPE_INCOME, 30),
+                (Transaction.TYPE_OUTCOME, 35),
+                (Transaction.TYPE_OUTCOME, 10),
+            ]
+        ])
+        self.assertEquals(accepted, [True, True, False])
+        self.assertEquals(self.wallet.total_balance(), 5)
+
+    def test_bulk_debit_of_shards(self):
+        self.provide(Transaction.TYPE_INCOME, 100)
+        # Loaded like the bulk endpoint does, the row holds only 10.
+        wallet = Wallet.objects.get(pk=self.wallet.pk)
+        accepted = Transaction.objects.provide_bulk([
+            Transaction(wallet=wallet, amount=50,
+                        transaction_type=Transaction.TYPE_OUTCOME)
+        ])
+        self.assertEquals(accepted, [True])
+        self.assertEquals(self.wallet.total_balance(), 60)
+        self.assertEquals(reconcile_balances()['mismatches'], 0)
+
+    def test_unshard(self):
+        self.provide(Transaction.TYPE_INCOME, 50)
+        version = self.wallet.current_version()
+        Wallet.objects.shard(self.wallet.pk, 0)
+        self.wallet.refresh_from_db()
+        self.assertEquals(self.wallet.balance, 60)
+        self.assertFalse(self.wallet.shards.exists())
+        self.assertGreater(self.wallet.current_version(), version)
+        # A stale instance falls back to the wallet row.
+        self.wallet.balance_shards = 4
+        self.assertTrue(self.provide(Transaction.TYPE_INCOME, 5))
+        self.wallet.refresh_from_db()
+        self.assertEquals(self.wallet.balance, 65)
+
+
+class TransferTestCase(TestCase):
+
+    def setUp(self):
+        self.source = Wallet.objects.create(name=FIRST_WALLET_NAME)
+        self.target = Wallet.objects.create(name=SECOND_WALLET_NAME)
+        Wallet.objects.credit(self.source.pk, 100)
+        self.source.refresh_from_db()
+
+    def test_transfer(self):
+        outcome, income = Transaction.objects.transfer(
+            self.source, self.target, 60, 'rent'
+        )
+        self.assertEquals(outcome.transaction_type, Transaction.TYPE_OUTCOME)
+        self.assertEquals(income.transaction_type, Transaction.TYPE_INCOME)
+        self.assertEquals(Transaction.objects.count(), 2)
+        self.assertEquals(self.source.balance, 40)
+        self.assertEquals(self.target.balance, 60)
+        self.source.refresh_from_db()
+        self.target.refresh_from_db()
+        self.assertEquals(self.source.balance, 40)
+        self.assertEquals(self.target.balance, 60)
+
+    def test_transfer_insufficient(self):
+        self.assertIsNone(
+            Transaction.objects.transfer(self.source, self.target, 101)
+        )
+        self.assertEquals(Transaction.objects.count(), 0)
+        self.target.refresh_from_db()
+        self.assertEquals(self.target.balance, 0)
+
+
+@override_settings(MONEY_APPEND_ONLY_LEDGER=True)
+class ReversalTestCase(TestCase):
+
+    def setUp(self):
+        self.wallet = Wallet.objects.create(name=FIRST_WALLET_NAME)
+        transaction = Transaction(
+            wallet=self.wallet, transaction_type=Transaction.TYPE_INCOME,
+            amount=100
+        )
+        self.transaction, success = transaction.provide_transaction()
+        self.transaction.save()
+
+    def test_reverse(self):
+        reversal = self.transaction.reverse()
+        self.assertEquals(reversal.transaction_type, Transaction.TYPE_OUTCOME)
+        self.assertEquals(reversal.reversal_of, self.transaction)
+        self.assertEquals(Transaction.objects.count(), 2)
+        self.wallet.refresh_from_db()
+        self.assertEquals(self.wallet.balance, 0)
+        self.assertEquals(self.wallet.transaction_set.balance_change(), 0)
+
+    def test_reverse_once(self):
+        Wallet.objects.credit(self.wallet.pk, 100)
+        reversal = self.transaction.reverse()
+        with self.assertRaises(utils.IntegrityError):
+            Transaction.objects.get(pk=self.transaction.pk).reverse()
+        with self.assertRaises(utils.IntegrityError):
+            reversal.reverse()
+        self.wallet.refresh_from_db()
+        self.assertEquals(self.wallet.balance, 100)
+
+    def test_reverse_insufficient(self):
+        Wallet.objects.debit(self.wallet.pk, 1)
+        with self.assertRaises(utils.IntegrityError):
+            self.transaction.reverse()
+        self.assertEquals(Transaction.objects.count(), 1)
+
+    def test_delete_wallet(self):
+        self.transaction.reverse()
+        with self.assertRaises(utils.IntegrityError):
+            self.wallet.delete()
+        self.assertEquals(Transaction.objects.count(), 2)
+        # Reversal pairs still cascade once the ledger isn't append-only.
+        with override_settings(MONEY_APPEND_ONLY_LEDGER=False):
+            self.wallet.delete()
+        self.assertEquals(Transaction.objects.count(), 0)
+
+    def test_delete_forbidden(self):
+        with self.assertRaises(utils.IntegrityError):
+            self.transaction.delete()
+        self.assertTrue(
+            Transaction.objects.filter(pk=self.transaction.pk).exists()
+        )
+
+
+class WalletBalanceSnapshotTestCase(TestCase):
+
+    def setUp(self):
+        self.wallet = Wallet.objects.create(name=FIRST_WALLET_NAME)
+        self.start = timezone.now() - datetime.timedelta(days=10)
+        for day, transaction_type, amount in [
+            (1, Transaction.TYPE_INCOME, 100),
+            (2, Transaction.TYPE_OUTCOME, 30),
+            (4, Transaction.TYPE_INCOME, 50),
+            (6, Transaction.TYPE_OUTCOME, 20),
+        ]:
+            transaction = Transaction(
+                wallet=self.wallet, transaction_type=transaction_type,
+                amount=amount
+            )
+            transaction.provide_transaction()
+            transaction.save()
+            Transaction.objects.filter(pk=transaction.pk).update(
+                data=self.day(day)
+            )
+
+    def day(self, number: int):
+        return self.start + datetime.timedelta(days=number)
+
+    def test_take(self):
+        self.assertEquals(WalletBalanceSnapshot.objects.take(self.day(3)), 1)
+        self.assertEquals(WalletBalanceSnapshot.objects.take(self.day(3)), 0)
+        self.assertEquals(WalletBalanceSnapshot.objects.take(self.day(5)), 1)
+        self.assertEquals(
+            list(self.wallet.snapshots.order_by('data')
+                 .values_list('balance', flat=True)),
+            [70, 120]
+        )
+
+    def test_take_stays_behind_now(self):
+        # Dated now, committed after the snapshots.
+        late = Transaction(wallet=self.wallet, amount=5,
+                           transaction_type=Transaction.TYPE_INCOME)
+        WalletBalanceSnapshot.objects.take(timezone.now())
+        late.provide_transaction()
+        late.save()
+        self.assertLess(self.wallet.snapshots.get().data, late.data)
+        self.assertEquals(self.wallet.balance_at(timezone.now()), 105)
+
+    def test_take_skips_unchanged_wallets(self):
+        Wallet.objects.create(name=SECOND_WALLET_NAME)
+        self.assertEquals(WalletBalanceSnapshot.objects.take(self.day(7)), 1)
+
+    def test_balance_at(self):
+        expected = [0, 100, 70, 70, 120, 120, 100]
+        for day, balance in enumerate(expected):
+            self.assertEquals(self.wallet.balance_at(self.day(day)), balance)
+        WalletBalanceSnapshot.objects.take(self.day(3))
+        WalletBalanceSnapshot.objects.take(self.day(5))
+        for day, balance in enumerate(expected):
+            self.assertEquals(self.wallet.balance_at(self.day(day)), balance)
+
+    def test_balance_at_reads_since_snapshot(self):
+        WalletBalanceSnapshot.objects.take(self.day(5))
+        Transaction.objects.filter(data__lte=self.day(5)).update(amount=0)
+        self.assertEquals(self.wallet.balance_at(self.day(7)), 100)
+
+    def test_delete_updates_snapshots(self):
+        WalletBalanceSnapshot.objects.take(self.day(3))
+        WalletBalanceSnapshot.objects.take(self.day(5))
+        Transaction.objects.get(amount=50).delete()
+        self.assertEquals(self.wallet.balance_at(self.day(3)), 70)
+        self.assertEquals(self.wallet.balance_at(self.day(5)), 70)
+        self.wallet.refresh_from_db()
+        self.assertEquals(self.wallet.balance_at(timezone.now()),
+                          self.wallet.balance)
+
+
+class WalletDailyRollupTestCase(TestCase):
+
+    def setUp(self):
+        self.wallet = Wallet.objects.create(name=FIRST_WALLET_NAME)
+        self.other_wallet = Wallet.objects.create(name=SECOND_WALLET_NAME)
+        for transaction_type, amount in [
+            (Transaction.TYPE_INCOME, 100),
+            (Transaction.TYPE_INCOME, 50),
+            (Transaction.TYPE_OUTCOME, 30),
+        ]:
+            transaction = Transaction(wallet=self.wallet, amount=amount,
+                                      transaction_type=transaction_type)
+            transaction, success = transaction.provide_transaction()
+            transaction.save()
+        self.today = timezone.localdate()
+
+    def totals(self, wallet) -> list:
+        return list(wallet.rollups.values_list(
+            'day', 'income', 'income_count', 'outcome', 'outcome_count'
+        ))
+
+    def test_provide(self):
+        self.assertEquals(self.totals(self.wallet),
+                          [(self.today, 150, 2, 30, 1)])
+
+    def test_delete(self):
+        Transaction.objects.filter(amount=50).get().delete()
+        self.assertEquals(self.totals(self.wallet),
+                          [(self.today, 100, 1, 30, 1)])
+
+    def test_delete_before_backfill(self):
+        WalletDailyRollup.objects.all().delete()
+        Transaction.objects.filter(amount=50).get().delete()
+        self.assertEquals(self.totals(self.wallet), [])
+
+    def test_bulk_and_transfer(self):
+        Transaction.objects.provide_bulk([
+            Transaction(wallet=self.other_wallet, amount=10,
+                        transaction_type=Transaction.TYPE_INCOME),
+        ])
+        Transaction.objects.transfer(self.wallet, self.other_wallet, 20)
+        self.assertEquals(self.totals(self.wallet),
+                          [(self.today, 150, 2, 50, 2)])
+        self.assertEquals(self.totals(self.other_wallet),
+                          [(self.today, 30, 2, 0, 0)])
+
+    def test_rebuild(self):
+        expected = self.totals(self.wallet)
+        WalletDailyRollup.objects.all().delete()
+        call_command('backfill_rollups', chunk_size=1, stdout=io.StringIO())
+        self.assertEquals(self.totals(self.wallet), expected)
+        self.assertEquals(self.totals(self.other_wallet), [])
+
+    def test_stats(self):
+        day = datetime.date(2021, 1, 31)
+        WalletDailyRollup.objects.bulk_create([
+            WalletDailyRollup(wallet=self.wallet, day=day, income=5,
+                              income_count=1),
+            WalletDailyRollup(wallet=self.wallet, day=day.replace(day=1),
+                              outcome=2, outcome_count=1),
+        ])
+        stats = self.wallet.rollups.filter(day__lt=self.today).stats('month')
+        self.assertEquals(stats, [{
+            'period': day.replace(day=1), 'income': 5, 'income_count': 1,
+            'outcome': 2, 'outcome_count': 1,
+        }])
+
+
+class ReconciliationTestCase(TestCase):
+
+    def setUp(self):
+        for name in [FIRST_WALLET_NAME, SECOND_WALLET_NAME, 'wallet3']:
+            wallet = Wallet.objects.create(name=name)
+            for transaction_type, amount in [
+                (Transaction.TYPE_INCOME, 100),
+                (Transaction.TYPE_OUTCOME, 40),
+            ]:
+                transaction = Transaction(
+                    wallet=wallet, transaction_type=transaction_type,
+                    amount=amount
+                )
+                transaction.provide_transaction()
+                transaction.save()
+        self.drifted = Wallet.objects.get(name=SECOND_WALLET_NAME)
+        Wallet.objects.filter(pk=self.drifted.pk).update(balance=75)
+
+    def test_reconcile(self):
+        mismatches = []
+        report = reconcile_balances(chunk_size=2,
+                                    on_mismatch=mismatches.append)
+        self.assertEquals(report['wallets'], 3)
+        self.assertEquals(report['transactions'], 6)
+        self.assertEquals(report['mismatches'], 1)
+        self.assertEquals(report['repaired'], 0)
+        self.assertEquals(mismatches[0].wallet_id, self.drifted.pk)
+        self.assertEquals(mismatches[0].balance, 75)
+        self.assertEquals(mismatches[0].ledger, 60)
+        self.drifted.refresh_from_db()
+        self.assertEquals(self.drifted.balance, 75)
+
+    def test_repair(self):
+        report = reconcile_balances(chunk_size=2, repair=True)
+        self.assertEquals(report['repaired'], 1)
+        self.drifted.refresh_from_db()
+        self.assertEquals(self.drifted.balance, 60)
+        self.assertEquals(reconcile_balances()['mismatches'], 0)
+
+    def test_command(self):
+        out = io.StringIO()
+        with self.assertRaises(CommandError):
+            call_command('reconcile_balances', '--fail-on-mismatch',
+                         stdout=out)
+        self.assertIn('balance 75, ledger 60', out.getvalue())
+        call_command('reconcile_balances', '--repair', '--fail-on-mismatch',
+                     stdout=out)
+        self.assertIn('1 repaired', out.getvalue())
+
+
+class ArchiveTestCase(TestCase):
+
+    def setUp(self):
+        self.wallet = Wallet.objects.create(name=FIRST_WALLET_NAME)
+        self.now = timezone.now()
+        self.old = self.now - datetime.timedelta(days=400)
+        self.income = self.provide(Transaction.TYPE_INCOME, 100, 3)
+        self.provide(Transaction.TYPE_OUTCOME, 30, 2)
+        # Reversed both long ago and recently.
+        self.provide(Transaction.TYPE_INCOME, 7, 3).reverse()
+        Transaction.objects.filter(amount=7).update(data=self.old)
+        self.reversed = self.provide(Transaction.TYPE_INCOME, 5, 3)
+        self.reversed.reverse()
+        self.provide(Transaction.TYPE_INCOME, 20, 0)
+
+    def provide(self, transaction_type, amount, months):
+        transaction, _ = Transaction(
+            wallet=self.wallet, transaction_type=transaction_type,
+            amount=amount
+        ).provide_transaction()
+        transaction.data = self.now - datetime.timedelta(days=130 * months)
+        transaction.save()
+        return transaction
+
+    def archive(self):
+        return archive_transactions(
+            self.now - datetime.timedelta(days=100), chunk_size=1
+        )
+
+    def test_archive(self):
+        report = self.archive()
+        self.assertEquals(report['archived'], 4)
+        self.assertEquals(
+            sorted(Transaction.objects.values_list('amount', flat=True)),
+            [5, 5, 20]
+        )
+        archived = ArchivedTransaction.objects.get(pk=self.income.pk)
+        self.assertEquals((archived.amount, archived.data),
+                          (100, self.income.data))
+        reversal = ArchivedTransaction.objects.get(reversal_of__amount=7)
+        self.assertEquals(reversal.transaction_type,
+                          Transaction.TYPE_OUTCOME)
+        self.assertEquals(self.archive()['archived'], 0)
+
+    def test_balances_stay(self):
+        moments = [self.now - datetime.timedelta(days=days)
+                   for days in (500, 300, 200, 50, -1)]
+        balances = [self.wallet.balance_at(at) for at in moments]
+
+        def rollups():
+            WalletDailyRollup.objects.rebuild([self.wallet.pk])
+            return list(self.wallet.rollups.order_by('day').values_list(
+                'day', 'income', 'outcome'
+            ))
+
+        before = rollups()
+        self.archive()
+        self.assertEquals(
+            [self.wallet.balance_at(at) for at in moments], balances
+        )
+        self.assertEquals(balances[-1], 90)
+        self.assertEquals(reconcile_balances()['mismatches'], 0)
+        self.assertEquals(rollups(), before)
+
+    def test_recent_balance_skips_archive(self):
+        self.archive()
+        with self.assertNumQueries(3):
+            # A snapshot, hot transactions after it and the archive date.
+            self.wallet.balance_at(self.now)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('archive_transactions', days=100, stdout=out)
+        self.assertIn('Archived 4 transactions', out.getvalue())
+
+
+class LedgerExportImportTestCase(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.wallet = Wallet.objects.create(name=FIRST_WALLET_NAME)
+        self.other_wallet = Wallet.objects.create(name='Кошелёк, "2"')
+        for wallet, transaction_type, amount, comment in [
+            (self.wallet, Transaction.TYPE_INCOME, 100, 'a,b\n"c"'),
+            (self.wallet, Transaction.TYPE_OUTCOME, 30, ''),
+            (self.other_wallet, Transaction.TYPE_INCOME, 5, ''),
+        ]:
+            transaction, success = Transaction(
+                wallet=wallet, transaction_type=transaction_type,
+                amount=amount, comment=comment
+            ).provide_transaction()
+            transaction.save()
+        Transaction.objects.get(amount=30).reverse()
+
+    def ledger(self) -> list:
+        return list(Transaction.objects.order_by('id').values_list(
+            'id', 'wallet__name', 'transaction_type', 'data', 'amount',
+            'comment', 'reversal_of'
+        ))
+
+    def test_round_trip(self):
+        expected = self.ledger()
+        for name in ('ledger.csv', 'ledger.ndjson.gz'):
+            path = os.path.join(self.directory.name, name)
+            call_command('export_ledger', path, stdout=io.StringIO())
+            Wallet.objects.all().delete()
+            call_command('import_ledger', path, chunk_size=2,
+                         stdout=io.StringIO())
+            self.assertEquals(self.ledger(), expected)
+            self.assertEquals(
+                dict(Wallet.objects.values_list('name', 'balance')),
+                {FIRST_WALLET_NAME: 100, 'Кошелёк, "2"': 5}
+            )
+            self.assertEquals(
+                Wallet.objects.get(name=FIRST_WALLET_NAME).rollups.get()
+                .outcome_count, 1
+            )
+
+    def test_import_conflict(self):
+        path = os.path.join(self.directory.name, 'ledger.ndjson')
+        call_command('export_ledger', path, stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            call_command('import_ledger', path, stdout=io.StringIO())
+
+    def write_ledger(self, rows: list) -> str:
+        path = os.path.join(self.directory.name, 'rows.ndjson')
+        with open(path, 'w') as file:
+            for id, wallet, transaction_type, amount, data in rows:
+                file.write(json.dumps({
+                    'id': id, 'wallet': wallet,
+                    'transaction_type': transaction_type, 'amount': amount,
+                    'data': data.isoformat(), 'comment': '',
+                    'reversal_of': None,
+                }) + '\n')
+        return path
+
+    def test_failed_import_is_rolled_back(self):
+        now = timezone.now()
+        path = self.write_ledger([
+            (1000, 'imported', Transaction.TYPE_INCOME, 10, now),
+            (1001, 'imported', Transaction.TYPE_INCOME, 20, now),
+            (1002, 'imported', Transaction.TYPE_INCOME, 30, now),
+            (self.wallet.transaction_set.first().pk, 'imported',
+             Transaction.TYPE_INCOME, 40, now),
+        ])
+        count = Transaction.objects.count()
+        with self.assertRaises(CommandError):
+            call_command('import_ledger', path, chunk_size=2,
+                         stdout=io.StringIO())
+        self.assertFalse(Wallet.objects.filter(name='imported').exists())
+        self.assertEquals(Transaction.objects.count(), count)
+
+    def test_ids_after_import(self):
+        path = self.write_ledger([
+            (1000, FIRST_WALLET_NAME, Transaction.TYPE_INCOME, 10,
+             timezone.now()),
+        ])
+        call_command('import_ledger', path, stdout=io.StringIO())
+        transaction = Transaction(wallet=self.wallet, amount=1,
+                                  transaction_type=Transaction.TYPE_INCOME)
+        transaction.save()
+        self.assertGreater(transaction.pk, 1000)
+
+    def test_backdated_import(self):
+        now = timezone.now()
+        WalletBalanceSnapshot.objects.take(until=now)
+        path = self.write_ledger([
+            (1000, FIRST_WALLET_NAME, Transaction.TYPE_INCOME, 10,
+             now - datetime.timedelta(days=1)),
+        ])
+        call_command('import_ledger', path, stdout=io.StringIO())
+        self.wallet.refresh_from_db()
+        self.assertEquals(self.wallet.balance, 110)
+        self.assertEquals(self.wallet.balance_at(now), 110)
+
+
+class ConnectionTestCase(TestCase):
+
+    @override_settings(MONEY_SQLITE_PRAGMAS={'busy_timeout': 1234})
+    def test_sqlite_pragmas(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Requires SQLite.')
+        configure_connection(sender=None, connection=connection)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEquals(cursor.fetchone()[0], 1234)
+
+
+class GroupCommitTestCase(DBTransactionTestCase):
+    """The writer thread commits, so data can't stay in a test transaction.
+    """
+
+    def setUp(self):
+        self.wallet = Wallet.objects.create(name=FIRST_WALLET_NAME)
+        self.queue = intake.GroupCommitQueue(max_batch=3, linger=0.05)
+        self.addCleanup(self.queue.stop)
+
+    def test_batches(self):
+        amounts = [(Transaction.TYPE_INCOME, 10),
+                   (Transaction.TYPE_OUTCOME, 15),
+                   (Transaction.TYPE_OUTCOME, 5),
+                   (Transaction.TYPE_INCOME, 1),
+                   (Transaction.TYPE_OUTCOME, 7)]
+        futures = [
+            self.queue.submit(Transaction(
+                wallet=self.wallet, transaction_type=transaction_type,
+                amount=amount
+            ))
+            for transaction_type, amount in amounts
+        ]
+        self.assertEquals([future.result(timeout=5) for future in futures],
+                          [True, False, True, True, False])
+        self.wallet.refresh_from_db()
+        self.assertEquals(self.wallet.balance, 6)
+        self.assertEquals(self.wallet.transaction_set.count(), 3)
+
+    def test_stop(self):
+        future = self.queue.submit(Transaction(
+            wallet=self.wallet, transaction_type=Transaction.TYPE_INCOME,
+            amount=1
+        ))
+        self.queue.stop()
+        self.assertTrue(future.done())
+        self.assertIsNone(self.queue.thread)
+
+    def test_error(self):
+        wallet = Wallet.objects.get(pk=self.wallet.pk)
+        self.wallet.delete()
+        future = self.queue.submit(Transaction(
+            wallet=wallet, transaction_type=Transaction.TYPE_INCOME, amount=1
+        ))
+        with self.assertRaises(Wallet.DoesNotExist):
+            future.result(timeout=5)
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_error_of_one_item(self):
+        deleted = Wallet.objects.create(name=SECOND_WALLET_NAME)
+        Wallet.objects.get(pk=deleted.pk).delete()
+        futures = [
+            self.queue.submit(Transaction(
+                wallet=wallet, transaction_type=Transaction.TYPE_INCOME,
+                amount=1
+            ))
+            for wallet in (deleted, self.wallet)
+        ]
+        with self.assertRaises(Wallet.DoesNotExist):
+            futures[0].result(timeout=5)
+        self.assertTrue(futures[1].result(timeout=5))
+        self.wallet.refresh_from_db()
+        self.assertEquals(self.wallet.balance, 1)
+
+    def test_cancelled(self):
+        future = Future()
+        future.cancel()
+        self.queue.commit([(Transaction(
+            wallet=self.wallet, transaction_type=Transaction.TYPE_INCOME,
+            amount=1
+        ), future)])
+        self.assertFalse(Transaction.objects.exists())
+
+
+class BalanceConcurrencyTestCase(FileDatabaseTestCase):
+    """Stress test of concurrent balance mutations."""
+    THREADS = 8
+    OPERATIONS = 50
+
+    def setUp(self):
+        self.wallet = Wallet.objects.create(name=FIRST_WALLET_NAME)
+
+    def _worker(self, transaction_type, errors):
+        try:
+            for _ in range(self.OPERATIONS):
+                transaction = Transaction(
+                    wallet=Wallet.objects.get(pk=self.wallet.pk),
+                    transaction_type=transaction_type, amount=1
+                )
+                for attempt in range(10):
+                    try:
+                        with db_transaction.atomic():
+                            transaction, success = \
+                                transaction.provide_transaction()
+                            if success:
+                                transaction.save()
+                        break
+                    except utils.OperationalError:
+                        time.sleep(0.01 * attempt)
+                else:
+                    errors.append(transaction_type)
+        finally:
+            connection.close()
+
+    def test_no_lost_updates(self):
+        errors = []
+        threads = [
+            threading.Thread(
+                target=self._worker,
+                args=(Transaction.TYPE_INCOME if i % 2 == 0
+                      else Transaction.TYPE_OUTCOME, errors)
+            )
+            for i in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEquals(errors, [])
+        self.wallet.refresh_from_db()
+        income = Transaction.objects.filter(
+            wallet=self.wallet, transaction_type=Transaction.TYPE_INCOME
+        ).count()
+        outcome = Transaction.objects.filter(
+            wallet=self.wallet, transaction_type=Transaction.TYPE_OUTCOME
+        ).count()
+        self.assertEquals(income, self.THREADS // 2 * self.OPERATIONS)
+        self.assertEquals(self.wallet.balance, income - outcome)
+
+
+class StartupTestCase(SimpleTestCase):
+    """Boots a fresh worker with the lean API settings."""
+    # Generous for slow CI machines, a boot is ~0.5 s on a laptop.
+    BUDGET_MS = 5000
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.result = boot('ewallet.settings_api')
+
+    def test_first_request_within_budget(self):
+        self.assertEquals(self.result['status'], 200)
+        self.assertLess(self.result['process_ms'], self.BUDGET_MS)
+
+    def test_unused_machinery_not_loaded(self):
+        for module in ('django.contrib.contenttypes',
+                       'django.db.migrations',
+                       'django.middleware.clickjacking',
+                       'rest_framework.authentication'):
+            self.assertNotIn(module, self.result['modules'])